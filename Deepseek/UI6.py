@@ -8,17 +8,16 @@ import polars as pl
 from pathlib import Path
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton, 
                               QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, 
-                              QStackedWidget, QFileDialog, QTableWidget, 
+                              QStackedWidget, QFileDialog, QTableWidget, QTableView, 
                               QDateEdit, QMessageBox, QTableWidgetItem, QCalendarWidget,
                               QFormLayout, QDialog, QTabWidget, QGroupBox)
-from PySide6.QtCore import Qt, QDate
+from PySide6.QtCore import Qt, QDate, QAbstractTableModel, QModelIndex, Signal
 from PySide6.QtGui import QDropEvent, QDragEnterEvent, QPainterPath, QRegion, QTransform, QColor
 from PySide6.QtWidgets import QPlainTextEdit, QHeaderView, QGraphicsDropShadowEffect
 from PySide6.QtGui import QDoubleValidator
 from io import StringIO  # Import StringIO for text conversion
 # Add these imports at the top
 from openpyxl import Workbook, load_workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
 
 
 # Add these helper functions here, before any class definitions
@@ -32,70 +31,145 @@ def get_cell_value(value):
         return value
     return str(value)
 
-def populate_table_with_types(table_widget, df):
-    """Populate QTableWidget while preserving data types"""
-    if df is None or df.empty:
-        table_widget.setRowCount(0)
-        table_widget.setColumnCount(0)
-        return
-    
-    table_widget.setRowCount(len(df))
-    table_widget.setColumnCount(len(df.columns))
-    table_widget.setHorizontalHeaderLabels(df.columns)
-    
-    for row in range(len(df)):
-        for col in range(len(df.columns)):
-            value = df.iloc[row, col]
-            item = QTableWidgetItem()
-            
-            # Set alignment based on data type
-            if isinstance(value, (int, float)):
-                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
-                if pd.isna(value):  # Handle NaN/NA for numeric columns
-                    item.setText("")
+def parse_cell(text, dtype):
+    """Convert edited text to a value of the column's polars dtype (blank is null)"""
+    text = text.strip()
+    if not text:
+        return None
+    if dtype in (pl.String, pl.Null):
+        return text
+    if dtype == pl.Object:
+        # A column mixing numbers and text: typed numbers stay numbers, as in Excel
+        for parse in (int, float):
+            try:
+                value = parse(text.replace(",", ""))
+            except ValueError:
+                continue
+            if value == value and value not in (float("inf"), float("-inf")):
+                return value
+        return text
+    if dtype == pl.Boolean:
+        if text.lower() in ("true", "yes", "1"):
+            return True
+        if text.lower() in ("false", "no", "0"):
+            return False
+        raise ValueError(f"'{text}' is not true or false")
+    if dtype == pl.Date:
+        return pl.Series([text]).str.to_date()[0]
+    if dtype == pl.Datetime:
+        return pl.Series([text]).str.to_datetime().cast(dtype)[0]
+    # Numbers: strict cast, so '1.5' is rejected by an integer column instead of being truncated
+    return pl.Series([text.replace(",", "")]).cast(dtype)[0]
+
+class FrameTableModel(QAbstractTableModel):
+    """Table model over a polars DataFrame, replacing per-cell QTableWidgetItems.
+
+    Cells are read from the frame only when the view paints them. Edits are
+    parsed to the column's dtype and kept as deltas in self.edits, keyed by
+    (row, column); to_polars() applies them to the edited columns only, so
+    the other columns are shared with the original frame, not copied.
+    """
+    edit_rejected = Signal(str)
+
+    def __init__(self, frame=None, editable=True, parent=None):
+        super().__init__(parent)
+        self.editable = editable
+        self.set_frame(frame)
+
+    def set_frame(self, frame):
+        """Show a new frame (polars or pandas) and drop pending edits"""
+        if frame is None:
+            frame = pl.DataFrame()
+        elif isinstance(frame, pd.DataFrame):
+            frame = pl.from_pandas(frame)
+        self.beginResetModel()
+        self._frame = frame
+        self._columns = frame.get_columns()
+        self.edits = {}
+        self._edited_frame = frame
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._frame.height
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._frame.width
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._frame.columns[section]
+        return section + 1
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if self.editable:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def value(self, row, column):
+        if (row, column) in self.edits:
+            return self.edits[(row, column)]
+        return self._columns[column][row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            value = self.value(index.row(), index.column())
+            if value is None or (isinstance(value, float) and value != value):
+                return ""
+            # Numbers go to the view as numbers so it formats them; editors always get text
+            if role == Qt.DisplayRole and isinstance(value, (int, float)) and not isinstance(value, bool):
+                return value
+            return str(value)
+        if role == Qt.TextAlignmentRole:
+            if self._columns[index.column()].dtype.is_numeric():
+                return int(Qt.AlignRight | Qt.AlignVCenter)
+            return int(Qt.AlignLeft | Qt.AlignVCenter)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        column = self._columns[index.column()]
+        try:
+            value = parse_cell(str(value), column.dtype)
+        except Exception:
+            self.edit_rejected.emit(f"'{value}' is not a valid {column.dtype} value for {column.name}")
+            return False
+        self.edits[(index.row(), index.column())] = value
+        self._edited_frame = None
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def to_polars(self):
+        """The frame with all edits applied"""
+        if self._edited_frame is None:
+            by_column = {}
+            for (row, column), value in self.edits.items():
+                by_column.setdefault(column, {})[row] = value
+            columns = list(self._columns)
+            for column, values in by_column.items():
+                series = columns[column]
+                if series.dtype in (pl.Null, pl.Object):
+                    # An all-blank column takes the type of what was typed into it;
+                    # object columns can't be scattered into
+                    data = series.to_list()
+                    for row, value in values.items():
+                        data[row] = value
+                    if series.dtype == pl.Object:
+                        columns[column] = pl.Series(series.name, data, dtype=pl.Object)
+                    else:
+                        columns[column] = pl.Series(series.name, data, strict=False)
                 else:
-                    item.setData(Qt.DisplayRole, value)  # This preserves numeric type
-            else:
-                item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
-                item.setText("" if pd.isna(value) else str(value))
-            
-            table_widget.setItem(row, col, item)
-    
-    table_widget.resizeColumnsToContents()
+                    columns[column] = series.clone().scatter(list(values), list(values.values()))
+            self._edited_frame = pl.DataFrame(columns)
+        return self._edited_frame
 
-def extract_table_data(table_widget):
-    """Extract data from QTableWidget while preserving types"""
-    data = []
-    headers = []
-    
-    # Get headers
-    for col in range(table_widget.columnCount()):
-        headers.append(table_widget.horizontalHeaderItem(col).text())
-    
-    # Get data with types
-    for row in range(table_widget.rowCount()):
-        row_data = []
-        for col in range(table_widget.columnCount()):
-            item = table_widget.item(row, col)
-            if item is None or not item.text():
-                row_data.append("")  # Preserve blank cells
-            else:
-                # Try to convert to number if possible
-                text = item.text()
-                try:
-                    # Check if it's an integer
-                    if text.isdigit():
-                        row_data.append(int(text))
-                    # Check if it's a float
-                    elif text.replace(".", "", 1).isdigit():
-                        row_data.append(float(text))
-                    else:
-                        row_data.append(text)
-                except ValueError:
-                    row_data.append(text)
-        data.append(row_data)
-    
-    return pd.DataFrame(data, columns=headers)
+    def to_pandas(self):
+        return self.to_polars().to_pandas()
 
 
 class TitleBar(QWidget):
@@ -681,7 +755,9 @@ class XIPVTableDialog(QDialog):
         
         # Preview area
         preview_label = QLabel("Data Preview:")
-        self.preview_table = QTableWidget()
+        self.preview_table = QTableView()
+        self.preview_model = FrameTableModel(editable=False)
+        self.preview_table.setModel(self.preview_model)
         
         # Connect paste event
         self.data_text.textChanged.connect(self.update_preview)
@@ -715,16 +791,8 @@ class XIPVTableDialog(QDialog):
                 # Try to parse the text as a DataFrame
                 df = pd.read_csv(text_io, sep="\t")
 
-                # Update preview table
-                self.preview_table.setRowCount(min(5, len(df)))
-                self.preview_table.setColumnCount(len(df.columns))
-                self.preview_table.setHorizontalHeaderLabels(df.columns)
-
-                # Fill preview data (first 5 rows)
-                for i in range(min(5, len(df))):
-                    for j in range(len(df.columns)):
-                        item = QTableWidgetItem(str(df.iloc[i, j]))
-                        self.preview_table.setItem(i, j, item)
+                # Update preview table (first 5 rows)
+                self.preview_model.set_frame(pl.from_pandas(df.head(5)))
 
                 # Resize columns to content
                 self.preview_table.resizeColumnsToContents()
@@ -733,14 +801,12 @@ class XIPVTableDialog(QDialog):
                 self.table_data = text
             except Exception as e:
                 # Handle parsing failures
-                self.preview_table.setRowCount(0)
-                self.preview_table.setColumnCount(0)
+                self.preview_model.set_frame(None)
                 self.table_data = None
                 print(f"Error parsing data: {e}")
         else:
             # Clear preview if no text
-            self.preview_table.setRowCount(0)
-            self.preview_table.setColumnCount(0)
+            self.preview_model.set_frame(None)
             self.table_data = None
 
 
@@ -799,9 +865,13 @@ class XIPVRemainingTablesDialog(QDialog):
         tab_layout.addWidget(import_button)
         
         # Table widget to display/edit data
-        table_widget = QTableWidget()
+        table_widget = QTableView()
+        table_model = FrameTableModel()
+        table_widget.setModel(table_model)
         self.populate_table_widget(table_widget, table_data)
-        table_widget.itemChanged.connect(lambda: self.handle_table_edit(table_num-1, table_widget))
+        table_model.dataChanged.connect(lambda: self.handle_table_edit(table_num-1, table_model))
+        table_model.edit_rejected.connect(
+            lambda message: QMessageBox.warning(self, "Edit Error", f"Invalid input: {message}"))
         
         tab_layout.addWidget(QLabel("Default Data (editable):"))
         tab_layout.addWidget(table_widget)
@@ -838,15 +908,9 @@ class XIPVRemainingTablesDialog(QDialog):
     #     table_widget.resizeColumnsToContents()
     
     def populate_table_widget(self, table_widget, table_data):
-        """Populate a QTableWidget with data from a polars DataFrame"""
-        if table_data is None or table_data.is_empty():
-            table_widget.setRowCount(0)
-            table_widget.setColumnCount(0)
-            return
-        
-        # Convert polars to pandas for easier handling
-        pandas_df = table_data.to_pandas()
-        populate_table_with_types(table_widget, pandas_df)
+        """Show a polars DataFrame in the table view"""
+        table_widget.model().set_frame(table_data)
+        table_widget.resizeColumnsToContents()
 
     def import_new_data(self, table_index):
         """Import new data for a table"""
@@ -904,17 +968,11 @@ class XIPVRemainingTablesDialog(QDialog):
     #     except Exception as e:
     #         print(f"Error updating table data: {str(e)}")
 
-    def handle_table_edit(self, table_index, table_widget):
-        """Handle edits to the table widget preserving types"""
+    def handle_table_edit(self, table_index, table_model):
+        """Handle edits to the table view preserving types"""
         try:
-            # Extract data preserving types
-            pandas_df = extract_table_data(table_widget)
-            
-            # Convert to polars
-            pl_df = pl.from_pandas(pandas_df)
-            
-            # Update the table
-            self.tables[table_index] = pl_df
+            # Edits are already typed; only the edited columns are rebuilt
+            self.tables[table_index] = table_model.to_polars()
             
             # Mark as modified
             self.modified_tables.add(table_index)
@@ -1518,7 +1576,9 @@ class XReservesTableDialog(QDialog):
         
         # Preview area
         preview_label = QLabel("Data Preview:")
-        self.preview_table = QTableWidget()
+        self.preview_table = QTableView()
+        self.preview_model = FrameTableModel(editable=False)
+        self.preview_table.setModel(self.preview_model)
         
         # Connect paste event
         self.data_text.textChanged.connect(self.update_preview)
@@ -1552,16 +1612,8 @@ class XReservesTableDialog(QDialog):
                 # Try to parse the text as a DataFrame
                 df = pd.read_csv(text_io, sep="\t")
 
-                # Update preview table
-                self.preview_table.setRowCount(min(5, len(df)))
-                self.preview_table.setColumnCount(len(df.columns))
-                self.preview_table.setHorizontalHeaderLabels(df.columns)
-
-                # Fill preview data (first 5 rows)
-                for i in range(min(5, len(df))):
-                    for j in range(len(df.columns)):
-                        item = QTableWidgetItem(str(df.iloc[i, j]))
-                        self.preview_table.setItem(i, j, item)
+                # Update preview table (first 5 rows)
+                self.preview_model.set_frame(pl.from_pandas(df.head(5)))
 
                 # Resize columns to content
                 self.preview_table.resizeColumnsToContents()
@@ -1570,14 +1622,12 @@ class XReservesTableDialog(QDialog):
                 self.table_data = text
             except Exception as e:
                 # Handle parsing failures
-                self.preview_table.setRowCount(0)
-                self.preview_table.setColumnCount(0)
+                self.preview_model.set_frame(None)
                 self.table_data = None
                 print(f"Error parsing data: {e}")
         else:
             # Clear preview if no text
-            self.preview_table.setRowCount(0)
-            self.preview_table.setColumnCount(0)
+            self.preview_model.set_frame(None)
             self.table_data = None
 
 # Class for remaining XReserves tables dialog (similar to XIPV)
@@ -1634,9 +1684,13 @@ class XReservesRemainingTablesDialog(QDialog):
         tab_layout.addWidget(import_button)
         
         # Table widget to display/edit data
-        table_widget = QTableWidget()
+        table_widget = QTableView()
+        table_model = FrameTableModel()
+        table_widget.setModel(table_model)
         self.populate_table_widget(table_widget, table_data)
-        table_widget.itemChanged.connect(lambda: self.handle_table_edit(table_num-3, table_widget))  # Adjusted index calculation
+        table_model.dataChanged.connect(lambda: self.handle_table_edit(table_num-3, table_model))  # Adjusted index calculation
+        table_model.edit_rejected.connect(
+            lambda message: QMessageBox.warning(self, "Edit Error", f"Invalid input: {message}"))
         
         tab_layout.addWidget(QLabel("Default Data (editable):"))
         tab_layout.addWidget(table_widget)
@@ -1673,15 +1727,9 @@ class XReservesRemainingTablesDialog(QDialog):
     #     table_widget.resizeColumnsToContents()
     
     def populate_table_widget(self, table_widget, table_data):
-        """Populate a QTableWidget with data from a polars DataFrame"""
-        if table_data is None or table_data.is_empty():
-            table_widget.setRowCount(0)
-            table_widget.setColumnCount(0)
-            return
-        
-        # Convert polars to pandas for easier handling
-        pandas_df = table_data.to_pandas()
-        populate_table_with_types(table_widget, pandas_df)
+        """Show a polars DataFrame in the table view"""
+        table_widget.model().set_frame(table_data)
+        table_widget.resizeColumnsToContents()
 
 
     def import_new_data(self, table_index):
@@ -1740,17 +1788,11 @@ class XReservesRemainingTablesDialog(QDialog):
     #     except Exception as e:
     #         print(f"Error updating table data: {str(e)}")
 
-    def handle_table_edit(self, table_index, table_widget):
-        """Handle edits to the table widget preserving types"""
+    def handle_table_edit(self, table_index, table_model):
+        """Handle edits to the table view preserving types"""
         try:
-            # Extract data preserving types
-            pandas_df = extract_table_data(table_widget)
-            
-            # Convert to polars
-            pl_df = pl.from_pandas(pandas_df)
-            
-            # Update the table
-            self.tables[table_index] = pl_df
+            # Edits are already typed; only the edited columns are rebuilt
+            self.tables[table_index] = table_model.to_polars()
             
             # Mark as modified
             self.modified_tables.add(table_index)
@@ -2046,9 +2088,11 @@ class CCYSegregationWindow(FramelessWindow):
         self.table_input.textChanged.connect(self.update_preview)
         
         # Preview table
-        self.preview_table = QTableWidget()
+        self.preview_table = QTableView()
+        self.preview_model = FrameTableModel(editable=False)
+        self.preview_table.setModel(self.preview_model)
         self.preview_table.setMaximumHeight(150)
-        self.preview_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.preview_table.setEditTriggers(QTableView.NoEditTriggers)
         
         # Process button
         self.process_btn = QPushButton("Process")
@@ -2068,24 +2112,14 @@ class CCYSegregationWindow(FramelessWindow):
             # Parse clipboard data
             df = pd.read_csv(StringIO(self.table_input.toPlainText()), sep='\t')
             
-            # Update preview table
-            self.preview_table.setRowCount(min(5, len(df)))
-            self.preview_table.setColumnCount(len(df.columns))
-            self.preview_table.setHorizontalHeaderLabels(df.columns)
-            
-            # Fill data
-            for i in range(min(5, len(df))):
-                for j in range(len(df.columns)):
-                    self.preview_table.setItem(i, j, 
-                        QTableWidgetItem(str(df.iloc[i, j])))
+            # Update preview table (first 5 rows)
+            self.preview_model.set_frame(pl.from_pandas(df.head(5)))
             
             # Resize columns
             self.preview_table.resizeColumnsToContents()
             
         except Exception as e:
-            self.preview_table.clear()
-            self.preview_table.setRowCount(0)
-            self.preview_table.setColumnCount(0)
+            self.preview_model.set_frame(None)
     
     
     def browse_file(self, file_num):
@@ -2158,15 +2192,20 @@ class CurrencyPairWindow(FramelessWindow):
         # Table tabs
         self.tabs = QTabWidget()
         self.table_widgets = []
+        self.table_models = []
         
         for i in range(2):
             tab = QWidget()
             layout = QVBoxLayout(tab)
             
-            # Table widget
-            table = QTableWidget()
-            table.setEditTriggers(QTableWidget.AllEditTriggers)
-            table.cellChanged.connect(lambda row, col, idx=i: self.table_updated(row, col, idx))
+            # Table view
+            table = QTableView()
+            table.setEditTriggers(QTableView.AllEditTriggers)
+            model = FrameTableModel()
+            table.setModel(model)
+            model.dataChanged.connect(lambda *_, idx=i: self.table_updated(idx))
+            model.edit_rejected.connect(
+                lambda message: QMessageBox.warning(self, "Edit Error", f"Invalid input: {message}"))
             
             # Buttons
             btn_layout = QHBoxLayout()
@@ -2181,6 +2220,7 @@ class CurrencyPairWindow(FramelessWindow):
             layout.addWidget(table)
             layout.addLayout(btn_layout)
             self.table_widgets.append(table)
+            self.table_models.append(model)
             self.tabs.addTab(tab, f"Table {i+1}")
         
         main_layout.addWidget(self.tabs)
@@ -2214,7 +2254,21 @@ class CurrencyPairWindow(FramelessWindow):
             for row in sheet.iter_rows(values_only=True):
                 data.append(list(row))
             
-            df = pd.DataFrame(data[1:], columns=data[0]) if data else pd.DataFrame()
+            if data:
+                headers = [str(name) if name is not None else f"Column {i+1}" for i, name in enumerate(data[0])]
+                columns = []
+                for i, name in enumerate(headers):
+                    values = [row[i] for row in data[1:]]
+                    kinds = {isinstance(value, str) for value in values if value is not None}
+                    if len(kinds) > 1:
+                        # Numbers and text in one column: keep each cell's own type so
+                        # saving writes the numbers back as numbers
+                        columns.append(pl.Series(name, values, dtype=pl.Object))
+                    else:
+                        columns.append(pl.Series(name, values, strict=False))
+                df = pl.DataFrame(columns)
+            else:
+                df = pl.DataFrame()
             self.table_data[table_idx] = df
             self.populate_table(table_idx)
         except Exception as e:
@@ -2222,39 +2276,14 @@ class CurrencyPairWindow(FramelessWindow):
 
     # Inside CurrencyPairWindow class
     def populate_table(self, table_idx):
-        """Populate QTableWidget with data preserving types"""
-        table = self.table_widgets[table_idx]
-        df = self.table_data[table_idx]
-        
-        table.blockSignals(True)
-        table.clear()
-        populate_table_with_types(table, df)
-        table.blockSignals(False)
+        """Show the table's polars DataFrame; reloading drops unsaved edits"""
+        self.table_models[table_idx].set_frame(self.table_data[table_idx])
+        self.table_widgets[table_idx].resizeColumnsToContents()
 
     # Inside CurrencyPairWindow class
-    def table_updated(self, row, col, table_idx):
-        """Handle table edits preserving data types"""
-        try:
-            item = self.table_widgets[table_idx].item(row, col)
-            if item is None or not item.text():
-                value = ""
-            else:
-                text = item.text()
-                try:
-                    # Attempt to convert to number if possible
-                    if text.isdigit():
-                        value = int(text)
-                    elif text.replace(".", "", 1).isdigit():
-                        value = float(text)
-                    else:
-                        value = text
-                except ValueError:
-                    value = text
-            
-            col_name = self.table_data[table_idx].columns[col]
-            self.table_data[table_idx].at[row, col_name] = value
-        except Exception as e:
-            QMessageBox.warning(self, "Edit Error", f"Invalid input: {str(e)}")
+    def table_updated(self, table_idx):
+        """Keep table_data in step with edits; the model has already typed them"""
+        self.table_data[table_idx] = self.table_models[table_idx].to_polars()
 
     def save_table(self, table_idx):
         """Save table back to Excel"""
@@ -2265,8 +2294,10 @@ class CurrencyPairWindow(FramelessWindow):
             
             # Write new data
             df = self.table_data[table_idx]
-            for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-                sheet.append(row)
+            if df.width:
+                sheet.append(df.columns)
+            for row in df.iter_rows():
+                sheet.append(list(row))
             
             wb.save(self.default_excel)
             QMessageBox.information(self, "Success", f"Table {table_idx+1} saved successfully")
@@ -8,7 +8,10 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                               QMessageBox, QFileDialog, QAbstractItemView, QProgressBar, QSystemTrayIcon, QMenu)
 from PySide6.QtCore import Qt, QTimer, QThread, Signal, QSettings, QDate
 from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon
-import pyadomd
+if os.environ.get('PROXYCUBE_MOCK'):
+    import mock_adomd as pyadomd  # offline runs against a synthetic cube
+else:
+    import pyadomd
 
 class CubeConnection:
     def __init__(self, server, database):
@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+from parallel import ParallelExtractor, date_slices
+from sinks import SQLiteSink, bump_data_version
+
+
+def snapshot_pattern(cube_name):
+    """Full extracts are saved as <cube>_<yyyymmdd>_<hhmm>.db; matches only this cube's."""
+    return re.compile(rf'^{re.escape(cube_name)}_\d{{8}}_\d{{4}}\.db$')
+
+
+class IncrementalStore:
+    """One persistent extract per (server, database, cube, column set).
+
+    Every date slice that has been loaded has a watermark with its row
+    count and a checksum of the cube's per-date measure totals. refresh()
+    asks the cube for those totals (a single, cheap aggregate query),
+    re-extracts only the slices that are new or whose checksum changed,
+    and replaces their rows in the store.
+    """
+
+    def __init__(self, store_dir, server, database, cube_name, columns, grain='month',
+                 table='CubeData'):
+        self.server = server
+        self.database = database
+        self.cube_name = cube_name
+        self.columns = list(columns)
+        self.grain = grain
+        self.table = table
+        self.source_key = self._source_key(server, database, cube_name, self.columns)
+        os.makedirs(store_dir, exist_ok=True)
+        self.path = os.path.join(store_dir, f"{cube_name}_{self.source_key}.db")
+        self._create_tables()
+
+    @staticmethod
+    def _source_key(server, database, cube_name, columns):
+        identity = '\x1f'.join([server.lower(), database.lower(), cube_name, *sorted(columns)])
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def store_path(cls, store_dir, server, database, cube_name, columns):
+        """Where the store for this source lives; unlike the constructor, creates nothing."""
+        return os.path.join(store_dir, f"{cube_name}_{cls._source_key(server, database, cube_name, columns)}.db")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _create_tables(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS _extract_watermarks (
+                    slice TEXT PRIMARY KEY,
+                    start_date TEXT NOT NULL,
+                    end_date TEXT NOT NULL,
+                    rows INTEGER NOT NULL,
+                    checksum TEXT,
+                    extracted_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS _extract_source (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            # Full extracts of this source; compact() never deletes a file that isn't listed here
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS _extract_snapshots (
+                    path TEXT PRIMARY KEY,
+                    recorded_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.executemany("INSERT OR REPLACE INTO _extract_source (key, value) VALUES (?, ?)", [
+                ('server', self.server), ('database', self.database),
+                ('cube', self.cube_name), ('columns', json.dumps(self.columns)),
+            ])
+            # Rows are tagged by slice, so a store keeps the grain it was first loaded with
+            conn.execute("INSERT OR IGNORE INTO _extract_source (key, value) VALUES ('grain', ?)",
+                         (self.grain,))
+            self.grain = conn.execute("SELECT value FROM _extract_source WHERE key = 'grain'").fetchone()[0]
+            conn.commit()
+        finally:
+            conn.close()
+
+    def watermarks(self):
+        conn = self._connect()
+        try:
+            return {
+                row[0]: {'start_date': row[1], 'end_date': row[2], 'rows': row[3], 'checksum': row[4]}
+                for row in conn.execute(
+                    "SELECT slice, start_date, end_date, rows, checksum FROM _extract_watermarks")
+            }
+        finally:
+            conn.close()
+
+    @property
+    def measures(self):
+        # get_columns lists dimensions by unique name ([Dim]) and measures by plain name
+        return [col for col in self.columns if not col.startswith('[')]
+
+    def fingerprint_mdx(self, start_date, end_date):
+        """Measure totals per date, plus the date key so rows can be grouped into slices."""
+        measures = ", ".join(f"[Measures].[{m}]" for m in self.measures) or "[Measures].DefaultMember"
+        return f"""
+            WITH MEMBER [Measures].[_DateKey] AS [Date].[Date].CurrentMember.Properties("KEY0")
+            SELECT {{ [Measures].[_DateKey], {measures} }} ON COLUMNS,
+            NON EMPTY {{ [Date].[Date].&[{start_date}] : [Date].[Date].&[{end_date}] }} ON ROWS
+            FROM [{self.cube_name}]
+        """
+
+    def slices(self, start_date, end_date):
+        """The store's slices covering the range, widened to whole periods."""
+        return date_slices(start_date, end_date, self.grain, align=True)
+
+    def fingerprints(self, cube_conn, start_date, end_date):
+        """Return {slice_key: checksum} for the slices covering the range."""
+        slices = self.slices(start_date, end_date)
+        cursor = cube_conn.conn.cursor()
+        cursor.execute(self.fingerprint_mdx(slices[0][0], slices[-1][1]))
+        names = [col[0] for col in cursor.description]
+        key_index = next(i for i, name in enumerate(names) if '_DateKey' in name)
+        by_date = {}
+        for row in cursor.fetchall():
+            date_key = str(row[key_index]).replace('-', '')[:8]
+            by_date[date_key] = [repr(value) for i, value in enumerate(row[key_index:]) if i]
+
+        checksums = {}
+        for slice_range in slices:
+            digest = hashlib.sha256()
+            for date_key in sorted(d for d in by_date if slice_range[0] <= d <= slice_range[1]):
+                digest.update(f"{date_key}|{'|'.join(by_date[date_key])}\n".encode('utf-8'))
+            checksums[ParallelExtractor.slice_key(slice_range)] = digest.hexdigest()
+        return checksums
+
+    def plan(self, checksums):
+        """Slice keys that are new or changed since their watermark."""
+        marks = self.watermarks()
+        return [key for key, checksum in checksums.items()
+                if key not in marks or marks[key]['checksum'] != checksum]
+
+    def _invalidate(self, keys):
+        # A run that dies halfway leaves these slices without a watermark, so the next run redoes them
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("DELETE FROM _extract_watermarks WHERE slice = ?",
+                                 [(key,) for key in keys])
+        finally:
+            conn.close()
+
+    def record_slices(self, completed, checksums):
+        """Watermark loaded slices: {slice_key: rows} with {slice_key: checksum}."""
+        conn = self._connect()
+        try:
+            with conn:
+                for key, rows in completed.items():
+                    start, end = key.split('-')
+                    if rows == 0:
+                        # The slice is empty in the cube now: drop whatever an earlier load left
+                        try:
+                            if conn.execute(f'DELETE FROM "{self.table}" WHERE _slice = ?', (key,)).rowcount:
+                                bump_data_version(conn)
+                        except sqlite3.OperationalError:
+                            pass
+                    conn.execute('''
+                        INSERT OR REPLACE INTO _extract_watermarks
+                            (slice, start_date, end_date, rows, checksum, extracted_at)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (key, start, end, rows, checksums.get(key), datetime.now().isoformat(sep=' ')))
+        finally:
+            conn.close()
+
+    def refresh(self, connection_factory, start_date, end_date, workers=4, progress=None,
+                should_stop=None):
+        """Bring the store up to date for the range; returns a summary dict."""
+        cube_conn = connection_factory()
+        try:
+            checksums = self.fingerprints(cube_conn, start_date, end_date)
+        finally:
+            cube_conn.disconnect()
+
+        keys = self.plan(checksums)
+        summary = {'slices': len(checksums), 'extracted': len(keys), 'rows': 0, 'path': self.path}
+        if not keys:
+            return summary
+        self._invalidate(keys)
+
+        sink = SQLiteSink(self.path, table=self.table, slice_column='_slice')
+        extractor = ParallelExtractor(
+            connection_factory, self.cube_name, self.columns, start_date, end_date, sink,
+            workers=workers, progress=progress, should_stop=should_stop, replace_slices=True,
+            slices=[tuple(key.split('-')) for key in keys]
+        )
+        try:
+            completed = extractor.run()
+        finally:
+            sink.close()
+        self.record_slices(completed, checksums)
+        summary['rows'] = sum(completed.values())
+        return summary
+
+    def record_snapshot(self, path):
+        """Register a finished full extract of this source so compact() may rotate it."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO _extract_snapshots (path) VALUES (?)",
+                             (os.path.abspath(path),))
+        finally:
+            conn.close()
+
+    def compact(self, snapshot_dir=None, keep=3):
+        """Delete all but the newest `keep` recorded full extracts in snapshot_dir, then reclaim free pages.
+
+        Only files registered with record_snapshot() and named exactly
+        <cube>_<yyyymmdd>_<hhmm>.db are candidates, so other cubes' extracts
+        and files the user saved by hand are never touched.
+        """
+        if keep < 1:
+            raise ValueError("compact() must keep at least one snapshot")
+        removed = []
+        conn = self._connect()
+        try:
+            if snapshot_dir:
+                pattern = snapshot_pattern(self.cube_name)
+                folder = os.path.abspath(snapshot_dir)
+                recorded = [path for (path,) in conn.execute("SELECT path FROM _extract_snapshots")]
+                gone = [path for path in recorded if not os.path.exists(path)]
+                snapshots = sorted(
+                    (path for path in recorded
+                     if path not in gone and os.path.dirname(path) == folder
+                     and pattern.match(os.path.basename(path)) and path != os.path.abspath(self.path)),
+                    key=os.path.basename
+                )
+                for path in snapshots[:-keep]:
+                    for suffix in ('', '-wal', '-shm'):
+                        if os.path.exists(path + suffix):
+                            os.remove(path + suffix)
+                    removed.append(path)
+                with conn:
+                    conn.executemany("DELETE FROM _extract_snapshots WHERE path = ?",
+                                     [(path,) for path in gone + removed])
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            # Replaced slices leave free pages behind; only rewrite the file when it is worth it
+            vacuumed = page_count > 0 and free_pages / page_count > 0.25
+            if vacuumed:
+                conn.execute("VACUUM")
+        finally:
+            conn.close()
+        return {'removed': removed, 'vacuumed': vacuumed}
@@ -0,0 +1,327 @@
+import sqlite3
+from datetime import date, datetime, timedelta
+
+from sinks import safe_column_name
+
+AGGREGATES = ('sum', 'avg', 'min', 'max', 'count')
+DATE_GRAINS = ('day', 'week', 'month', 'quarter', 'year')
+
+# A rollup at one grain can answer queries at these grains (None = no date grouping)
+ROLLUP_SERVES = {
+    'day': {None, 'day', 'week', 'month', 'quarter', 'year'},
+    'week': {None, 'week'},
+    'month': {None, 'month', 'quarter', 'year'},
+    'quarter': {None, 'quarter', 'year'},
+    'year': {None, 'year'},
+}
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    value = str(value)
+    return datetime.strptime(value[:10], '%Y-%m-%d' if '-' in value else '%Y%m%d').date()
+
+
+def period_start(day, grain):
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    if grain == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if grain == 'year':
+        return day.replace(month=1, day=1)
+    return day
+
+
+def period_end(day, grain):
+    if grain == 'week':
+        return period_start(day, grain) + timedelta(days=6)
+    if grain in ('month', 'quarter', 'year'):
+        months = {'month': 1, 'quarter': 3, 'year': 12}[grain]
+        start = period_start(day, grain)
+        month = start.month - 1 + months
+        return start.replace(year=start.year + month // 12, month=month % 12 + 1) - timedelta(days=1)
+    return day
+
+
+def bucket_sql(day, grain):
+    """SQL for the first day of the grain's period containing `day` (a YYYY-MM-DD expression)."""
+    if grain == 'day':
+        return day
+    if grain == 'week':
+        # Monday of the week, matching date_slices()
+        return f"date({day}, '-' || ((CAST(strftime('%w', {day}) AS INTEGER) + 6) % 7) || ' days')"
+    if grain == 'month':
+        return f"strftime('%Y-%m-01', {day})"
+    if grain == 'quarter':
+        return (f"strftime('%Y', {day}) || '-' || printf('%02d', "
+                f"(CAST(strftime('%m', {day}) AS INTEGER) - 1) / 3 * 3 + 1) || '-01'")
+    if grain == 'year':
+        return f"strftime('%Y-01-01', {day})"
+    raise ValueError(f"Unknown date grain: {grain}")
+
+
+class LocalCubeEngine:
+    """Answers measure/dimension queries from an extracted SQLite snapshot.
+
+    Numeric columns are measures, text columns are dimension attributes and
+    the DATE column drives date filters and grains. build_rollups() stores
+    per-grain aggregates (sum, count, min and max of every measure) that
+    query() uses whenever they cover the request exactly; rollups built
+    before the table last changed (by the _data_version counter that
+    SQLiteSink and IncrementalStore bump, and the table's max rowid) are
+    ignored.
+    """
+
+    def __init__(self, db_path, table='CubeData'):
+        self.db_path = db_path
+        self.table = table
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        info = self.conn.execute(f'PRAGMA table_info("{table}")').fetchall()
+        if not info:
+            raise ValueError(f"{db_path} has no {table} table")
+        self.date_column = None
+        self.measures = []
+        self.dimensions = []
+        for _, name, kind, *_ in info:
+            if name.startswith('_'):
+                continue  # bookkeeping such as _slice
+            kind = kind.upper()
+            if kind == 'DATE' and self.date_column is None:
+                self.date_column = name
+            elif kind in ('INTEGER', 'REAL'):
+                self.measures.append(name)
+            else:
+                self.dimensions.append(name)
+        self._compact_dates = self._detect_compact_dates()
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS _rollups (
+                grain TEXT PRIMARY KEY,
+                dimensions TEXT NOT NULL,
+                data_version TEXT,
+                built_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        if 'data_version' not in [row[1] for row in self.conn.execute("PRAGMA table_info(_rollups)")]:
+            # Written by a version that keyed rollups on max rowid alone; they get rebuilt
+            self.conn.execute("DROP TABLE _rollups")
+            self.conn.execute('''
+                CREATE TABLE _rollups (
+                    grain TEXT PRIMARY KEY,
+                    dimensions TEXT NOT NULL,
+                    data_version TEXT,
+                    built_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _detect_compact_dates(self):
+        if not self.date_column:
+            return False
+        row = self.conn.execute(
+            f'SELECT "{self.date_column}" FROM "{self.table}" WHERE "{self.date_column}" IS NOT NULL LIMIT 1'
+        ).fetchone()
+        return bool(row) and '-' not in str(row[0])
+
+    @property
+    def _day(self):
+        """SQL for the date column as YYYY-MM-DD, whichever form it was stored in."""
+        col = f'"{self.date_column}"'
+        if self._compact_dates:
+            return f"substr({col}, 1, 4) || '-' || substr({col}, 5, 2) || '-' || substr({col}, 7, 2)"
+        return f"substr({col}, 1, 10)"
+
+    def _resolve(self, names, available, kind):
+        resolved = []
+        for name in names:
+            safe = safe_column_name(name)
+            if safe not in available:
+                raise ValueError(f"Unknown {kind}: {name}")
+            resolved.append(safe)
+        return resolved
+
+    def _date_filter(self, period, start, end):
+        """WHERE terms for an inclusive date range, on a rollup period or the raw date column."""
+        where, params = [], []
+        if period is None and not self._compact_dates:
+            # Compare the stored ISO text directly so the date index can be used
+            period = f'"{self.date_column}"'
+            if end:
+                end = end + timedelta(days=1)
+            if start:
+                where.append(f'{period} >= ?')
+                params.append(start.isoformat())
+            if end:
+                where.append(f'{period} < ?')
+                params.append(end.isoformat())
+            return where, params
+        period = period or self._day
+        if start:
+            where.append(f'{period} >= ?')
+            params.append(start.isoformat())
+        if end:
+            where.append(f'{period} <= ?')
+            params.append(end.isoformat())
+        return where, params
+
+    def _data_version(self):
+        """Freshness key for rollups: the change counter plus the max rowid for files written without it."""
+        try:
+            version = self.conn.execute("SELECT version FROM _data_version").fetchone()
+        except sqlite3.OperationalError:
+            version = None
+        max_rowid = self.conn.execute(f'SELECT MAX(rowid) FROM "{self.table}"').fetchone()[0]
+        return f"{version[0] if version else 0}:{max_rowid}"
+
+    def build_rollups(self, grains=('day', 'month'), dimensions=None):
+        """Precompute aggregates per grain over the given (default: all) dimension attributes."""
+        if not self.date_column:
+            raise ValueError("Rollups need a date column")
+        dims = self._resolve(dimensions, self.dimensions, 'dimension') if dimensions else list(self.dimensions)
+        data_version = self._data_version()
+        for grain in grains:
+            bucket = bucket_sql(self._day, grain)
+            parts = []
+            for m in self.measures:
+                parts += [f'SUM("{m}") AS "sum_{m}"', f'COUNT("{m}") AS "count_{m}"',
+                          f'MIN("{m}") AS "min_{m}"', f'MAX("{m}") AS "max_{m}"']
+            group = ', '.join(['period', *(f'"{d}"' for d in dims)])
+            with self.conn:
+                self.conn.execute(f'DROP TABLE IF EXISTS "_rollup_{grain}"')
+                self.conn.execute(f'''
+                    CREATE TABLE "_rollup_{grain}" AS
+                    SELECT {bucket} AS period, {', '.join([*(f'"{d}"' for d in dims), *parts, 'COUNT(*) AS row_count'])}
+                    FROM "{self.table}"
+                    GROUP BY {group}
+                ''')
+                self.conn.execute(f'CREATE INDEX "idx_rollup_{grain}_period" ON "_rollup_{grain}" (period)')
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO _rollups (grain, dimensions, data_version) VALUES (?, ?, ?)",
+                    (grain, '\x1f'.join(dims), data_version)
+                )
+
+    def _rollup_for(self, grain, by, start, end):
+        """The coarsest fresh rollup that answers the query exactly, or None."""
+        data_version = self._data_version()
+        candidates = []
+        for rollup_grain, dims, built_version in self.conn.execute(
+                "SELECT grain, dimensions, data_version FROM _rollups"):
+            if built_version != data_version or grain not in ROLLUP_SERVES[rollup_grain]:
+                continue
+            if not set(by) <= set(dims.split('\x1f') if dims else []):
+                continue
+            # The date range has to consist of whole periods of the rollup
+            if start and period_start(start, rollup_grain) != start:
+                continue
+            if end and period_end(end, rollup_grain) != end:
+                continue
+            candidates.append(rollup_grain)
+        for rollup_grain in ('year', 'quarter', 'month', 'week', 'day'):
+            if rollup_grain in candidates:
+                return rollup_grain
+        return None
+
+    def _rows_sql(self, start_date, end_date, limit):
+        columns = [name for _, name, *_ in self.conn.execute(f'PRAGMA table_info("{self.table}")')
+                   if not name.startswith('_')]
+        start = _to_date(start_date) if start_date else None
+        end = _to_date(end_date) if end_date else None
+        where, params = self._date_filter(None, start, end) if self.date_column else ([], [])
+        quoted = ', '.join(f'"{col}"' for col in columns)
+        sql = f'SELECT {quoted} FROM "{self.table}"'
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return columns, sql, params
+
+    def rows(self, start_date=None, end_date=None, limit=None):
+        """Stored rows, without bookkeeping columns, for an inclusive yyyymmdd range."""
+        columns, sql, params = self._rows_sql(start_date, end_date, limit)
+        return columns, self.conn.execute(sql, params).fetchall()
+
+    def iter_rows(self, start_date=None, end_date=None, chunk_size=50000):
+        """Like rows(), but returns (columns, generator of row chunks) so memory stays bounded."""
+        columns, sql, params = self._rows_sql(start_date, end_date, None)
+        cursor = self.conn.execute(sql, params)
+
+        def chunks():
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+
+        return columns, chunks()
+
+    def count_rows(self, start_date=None, end_date=None):
+        start = _to_date(start_date) if start_date else None
+        end = _to_date(end_date) if end_date else None
+        where, params = self._date_filter(None, start, end) if self.date_column else ([], [])
+        sql = f'SELECT COUNT(*) FROM "{self.table}"'
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def query(self, measures=None, by=(), start_date=None, end_date=None, grain=None, agg='sum',
+              limit=None):
+        """Aggregate measures by dimension attributes and optionally a date grain.
+
+        Dates are yyyymmdd strings or dates; the range is inclusive. Returns
+        (columns, rows) like CubeConnection.execute_query.
+        """
+        if agg not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {agg}")
+        if grain is not None and grain not in DATE_GRAINS:
+            raise ValueError(f"Unknown date grain: {grain}")
+        if (grain or start_date or end_date) and not self.date_column:
+            raise ValueError("This snapshot has no date column")
+        measures = self._resolve(measures, self.measures, 'measure') if measures else list(self.measures)
+        by = self._resolve(by, self.dimensions, 'dimension')
+        start = _to_date(start_date) if start_date else None
+        end = _to_date(end_date) if end_date else None
+
+        rollup = self._rollup_for(grain, by, start, end) if self.date_column else None
+        if rollup:
+            source = f'"_rollup_{rollup}"'
+            # period is the first day of the rollup's period, so it re-buckets to coarser grains
+            period = 'period'
+            bucket = bucket_sql(period, grain) if grain else None
+            values = {
+                'sum': lambda m: f'SUM("sum_{m}")',
+                'count': lambda m: f'SUM("count_{m}")',
+                'min': lambda m: f'MIN("min_{m}")',
+                'max': lambda m: f'MAX("max_{m}")',
+                'avg': lambda m: f'CAST(SUM("sum_{m}") AS REAL) / NULLIF(SUM("count_{m}"), 0)',
+            }[agg]
+        else:
+            source = f'"{self.table}"'
+            period = self._day if self.date_column else None
+            bucket = bucket_sql(period, grain) if grain else None
+            values = lambda m: f'{agg.upper()}("{m}")'
+
+        select, group = [], []
+        if bucket:
+            select.append(f'{bucket} AS "{grain}"')
+            group.append('1')
+        for d in by:
+            select.append(f'"{d}"')
+            group.append(f'"{d}"')
+        select += [f'{values(m)} AS "{m}"' for m in measures]
+        where, params = self._date_filter(period if rollup else None, start, end)
+
+        sql = f"SELECT {', '.join(select)} FROM {source}"
+        if where:
+            sql += f" WHERE {' AND '.join(where)}"
+        if group:
+            sql += f" GROUP BY {', '.join(group)} ORDER BY {', '.join(group)}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        cursor = self.conn.execute(sql, params)
+        return [col[0] for col in cursor.description], cursor.fetchall()
+
@@ -0,0 +1,91 @@
+import json
+import os
+import re
+import sqlite3
+import time
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.proxycube', 'metadata.db')
+DEFAULT_TTL = 24 * 3600
+
+
+def connection_identity(conn_str):
+    """(server, catalog) from an MSOLAP connection string, lower-cased for use as a cache key."""
+    parts = {}
+    for part in conn_str.split(';'):
+        name, _, value = part.partition('=')
+        parts[re.sub(r'\s+', ' ', name.strip().lower())] = value.strip()
+    server = parts.get('data source') or parts.get('server') or ''
+    catalog = parts.get('initial catalog') or parts.get('database') or parts.get('catalog') or ''
+    return server.lower(), catalog.lower()
+
+
+class MetadataCache:
+    """Cube metadata on disk, keyed by (server, catalog, cube) and a kind.
+
+    A kind names one rowset, e.g. 'hierarchies', 'measures' or a page of
+    members. get() returns the cached value while it is younger than ttl
+    seconds and otherwise calls loader() and stores its (JSON-able)
+    result; loader errors are raised and never cached. invalidate() drops
+    entries so the next get() goes back to the server.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS metadata (
+                server TEXT NOT NULL,
+                catalog TEXT NOT NULL,
+                cube TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (server, catalog, cube, kind)
+            )
+        ''')
+        self.conn.commit()
+
+    @staticmethod
+    def key(server, catalog, cube):
+        return server.strip().lower(), catalog.strip().lower(), cube
+
+    def close(self):
+        self.conn.close()
+
+    def lookup(self, key, kind):
+        """The cached value, or None when it is missing or older than the TTL."""
+        row = self.conn.execute(
+            "SELECT value, fetched_at FROM metadata WHERE server = ? AND catalog = ? AND cube = ? AND kind = ?",
+            (*key, kind)
+        ).fetchone()
+        if row is None or (self.ttl is not None and time.time() - row[1] > self.ttl):
+            return None
+        return json.loads(row[0])
+
+    def store(self, key, kind, value):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata (server, catalog, cube, kind, value, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, kind, json.dumps(value), time.time())
+            )
+
+    def get(self, key, kind, loader, refresh=False):
+        if not refresh:
+            value = self.lookup(key, kind)
+            if value is not None:
+                return value
+        value = loader()
+        self.store(key, kind, value)
+        return value
+
+    def invalidate(self, key, kind_prefix=''):
+        """Drop a cube's entries, or only those whose kind starts with kind_prefix."""
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM metadata WHERE server = ? AND catalog = ? AND cube = ? AND kind LIKE ? ESCAPE '\\'",
+                (*key, kind_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+            )
@@ -0,0 +1,928 @@
+"""Offline stand-in for pyadomd and the ADOMD.NET client, backed by SQLite.
+
+A SyntheticCube is a small star schema (date, product and region
+dimensions around a sales fact table) plus the DMV rowsets the tools read.
+Pyadomd and AdomdConnection/AdomdCommand answer DMV queries and a subset of
+MDX SELECT against it, with configurable latency, so extraction code can be
+exercised and benchmarked without an SSAS server:
+
+    PROXYCUBE_MOCK=1 python temp.py              # default cube in the temp folder
+    PROXYCUBE_MOCK=/path/cube.db python temp.py  # a cube built with SyntheticCube
+
+Supported MDX: WITH MEMBER [Measures].[x] AS <arithmetic or
+[Hier].CurrentMember.Properties("KEY0"|"Caption") / .UniqueName /
+.Member_Caption>, SELECT [TOP n] with COLUMNS/ROWS axes (optionally NON
+EMPTY), sets built from braces, tuples, member keys (&[k]), ranges (a : b),
+.Members/.AllMembers/.Children, CrossJoin / *, NonEmpty, NonEmptyCrossJoin,
+Head, Subset, TopCount, Hierarchize and Distinct, FROM a cube or a subselect, and a WHERE slicer. Hierarchies placed
+on COLUMNS next to measures are flattened into the row axis, which is what
+the extractors expect from a flat result.
+"""
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+DEFAULT_LATENCY = float(os.environ.get('PROXYCUBE_MOCK_LATENCY', '0') or 0)
+
+Member = namedtuple('Member', 'hierarchy key caption')
+
+# hierarchy unique name -> (dimension, caption, dimension table, key column, caption column)
+HIERARCHIES = {
+    '[Date].[Date]': ('[Date]', 'Date', 'dim_date', 'date_key', 'date'),
+    '[Date].[Month]': ('[Date]', 'Month', 'dim_date', 'month_key', 'month'),
+    '[Date].[Year]': ('[Date]', 'Year', 'dim_date', 'year', 'year_caption'),
+    '[Product].[Product]': ('[Product]', 'Product', 'dim_product', 'product_key', 'product'),
+    '[Product].[Category]': ('[Product]', 'Category', 'dim_product', 'category_key', 'category'),
+    '[Region].[Region]': ('[Region]', 'Region', 'dim_region', 'region_key', 'region'),
+}
+DIMENSION_KEYS = {'[Date]': '[Date].[Date]', '[Product]': '[Product].[Product]', '[Region]': '[Region].[Region]'}
+MEASURES = {
+    'Sales Amount': 'SUM(f.sales_amount)',
+    'Quantity': 'SUM(f.quantity)',
+    'Cost': 'SUM(f.cost)',
+    'Order Count': 'COUNT(*)',
+}
+FACTS = '''
+    fact_sales f
+    JOIN dim_date dim_date ON dim_date.date_key = f.date_key
+    JOIN dim_product dim_product ON dim_product.product_key = f.product_key
+    JOIN dim_region dim_region ON dim_region.region_key = f.region_key
+'''
+
+
+class MockError(Exception):
+    pass
+
+
+class SyntheticCube:
+    """A generated star schema in a SQLite file; built once, reused afterwards."""
+
+    def __init__(self, path=None, cube_name='Sales', start_date='20230101', days=730,
+                 rows_per_day=200, products=50, regions=5, seed=0):
+        self.path = path or os.path.join(tempfile.gettempdir(), f"proxycube_mock_{cube_name}.db")
+        self.cube_name = cube_name
+        if not os.path.exists(self.path):
+            self.build(start_date, days, rows_per_day, products, regions, seed)
+        else:
+            conn = sqlite3.connect(self.path)
+            try:
+                self.cube_name = conn.execute("SELECT CUBE_NAME FROM dmv_MDSCHEMA_CUBES").fetchone()[0]
+            finally:
+                conn.close()
+
+    def build(self, start_date, days, rows_per_day, products, regions, seed):
+        rng = random.Random(seed)
+        tmp_path = self.path + '.building'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript('''
+                CREATE TABLE dim_date (date_key INTEGER PRIMARY KEY, date TEXT, month_key INTEGER,
+                                       month TEXT, year INTEGER, year_caption TEXT);
+                CREATE TABLE dim_product (product_key INTEGER PRIMARY KEY, product TEXT,
+                                          category_key INTEGER, category TEXT, list_price REAL);
+                CREATE TABLE dim_region (region_key INTEGER PRIMARY KEY, region TEXT);
+                CREATE TABLE fact_sales (date_key INTEGER, product_key INTEGER, region_key INTEGER,
+                                         sales_amount REAL, quantity INTEGER, cost REAL);
+            ''')
+            first = datetime.strptime(start_date, '%Y%m%d').date()
+            dates = [first + timedelta(days=i) for i in range(days)]
+            conn.executemany("INSERT INTO dim_date VALUES (?, ?, ?, ?, ?, ?)", [
+                (int(d.strftime('%Y%m%d')), d.isoformat(), int(d.strftime('%Y%m')),
+                 d.strftime('%Y-%m'), d.year, str(d.year)) for d in dates
+            ])
+            categories = max(1, products // 10)
+            conn.executemany("INSERT INTO dim_product VALUES (?, ?, ?, ?, ?)", [
+                (p, f"Product {p}", p % categories + 1, f"Category {p % categories + 1}",
+                 round(rng.uniform(5, 500), 2)) for p in range(1, products + 1)
+            ])
+            conn.executemany("INSERT INTO dim_region VALUES (?, ?)",
+                             [(r, f"Region {r}") for r in range(1, regions + 1)])
+            prices = dict(conn.execute("SELECT product_key, list_price FROM dim_product"))
+            for d in dates:
+                key = int(d.strftime('%Y%m%d'))
+                batch = []
+                for _ in range(rows_per_day):
+                    product = rng.randint(1, products)
+                    quantity = rng.randint(1, 20)
+                    amount = round(prices[product] * quantity, 2)
+                    batch.append((key, product, rng.randint(1, regions), amount, quantity,
+                                  round(amount * rng.uniform(0.4, 0.8), 2)))
+                conn.executemany("INSERT INTO fact_sales VALUES (?, ?, ?, ?, ?, ?)", batch)
+            conn.execute("CREATE INDEX idx_fact_date ON fact_sales (date_key)")
+            self._build_rowsets(conn)
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp_path, self.path)
+
+    def _build_rowsets(self, conn):
+        cube = self.cube_name
+        conn.executescript('''
+            CREATE TABLE dmv_MDSCHEMA_CUBES (CATALOG_NAME TEXT, CUBE_NAME TEXT, CUBE_TYPE TEXT,
+                                             CUBE_SOURCE INTEGER, LAST_DATA_UPDATE TEXT);
+            CREATE TABLE dmv_MDSCHEMA_DIMENSIONS (CUBE_NAME TEXT, DIMENSION_NAME TEXT,
+                                                  DIMENSION_UNIQUE_NAME TEXT, DIMENSION_CAPTION TEXT,
+                                                  DIMENSION_TYPE INTEGER);
+            CREATE TABLE dmv_MDSCHEMA_HIERARCHIES (CUBE_NAME TEXT, DIMENSION_UNIQUE_NAME TEXT,
+                                                   HIERARCHY_NAME TEXT, HIERARCHY_UNIQUE_NAME TEXT,
+                                                   HIERARCHY_CAPTION TEXT, HIERARCHY_ORIGIN INTEGER,
+                                                   HIERARCHY_CARDINALITY INTEGER);
+            CREATE TABLE dmv_MDSCHEMA_LEVELS (CUBE_NAME TEXT, DIMENSION_UNIQUE_NAME TEXT,
+                                              HIERARCHY_UNIQUE_NAME TEXT, LEVEL_NAME TEXT,
+                                              LEVEL_UNIQUE_NAME TEXT, LEVEL_NUMBER INTEGER,
+                                              LEVEL_CARDINALITY INTEGER);
+            CREATE TABLE dmv_MDSCHEMA_MEASURES (CUBE_NAME TEXT, MEASURE_NAME TEXT,
+                                                MEASURE_UNIQUE_NAME TEXT, MEASURE_CAPTION TEXT,
+                                                MEASUREGROUP_NAME TEXT, MEASURE_AGGREGATOR INTEGER);
+            CREATE TABLE dmv_MDSCHEMA_MEMBERS (CUBE_NAME TEXT, DIMENSION_UNIQUE_NAME TEXT,
+                                               HIERARCHY_UNIQUE_NAME TEXT, LEVEL_UNIQUE_NAME TEXT,
+                                               LEVEL_NUMBER INTEGER, MEMBER_ORDINAL INTEGER,
+                                               MEMBER_NAME TEXT, MEMBER_UNIQUE_NAME TEXT,
+                                               MEMBER_CAPTION TEXT, MEMBER_KEY TEXT);
+        ''')
+        conn.execute("INSERT INTO dmv_MDSCHEMA_CUBES VALUES ('Mock', ?, 'CUBE', 1, ?)",
+                     (cube, datetime.now().isoformat(sep=' ', timespec='seconds')))
+        conn.execute("INSERT INTO dmv_MDSCHEMA_DIMENSIONS VALUES (?, 'Measures', '[Measures]', 'Measures', 2)",
+                     (cube,))
+        for dim in DIMENSION_KEYS:
+            name = dim.strip('[]')
+            conn.execute("INSERT INTO dmv_MDSCHEMA_DIMENSIONS VALUES (?, ?, ?, ?, ?)",
+                         (cube, name, dim, name, 1 if name == 'Date' else 3))
+        for unique, (dim, caption, table, key_col, caption_col) in HIERARCHIES.items():
+            members = conn.execute(
+                f"SELECT DISTINCT {key_col}, {caption_col} FROM {table} ORDER BY {key_col}").fetchall()
+            level = f"{unique}.[{caption}]"
+            conn.execute("INSERT INTO dmv_MDSCHEMA_HIERARCHIES VALUES (?, ?, ?, ?, ?, 2, ?)",
+                         (cube, dim, caption, unique, caption, len(members)))
+            conn.execute("INSERT INTO dmv_MDSCHEMA_LEVELS VALUES (?, ?, ?, ?, ?, 1, ?)",
+                         (cube, dim, unique, caption, level, len(members)))
+            conn.executemany("INSERT INTO dmv_MDSCHEMA_MEMBERS VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)", [
+                (cube, dim, unique, level, ordinal, str(mcaption), f"{unique}.&[{key}]", str(mcaption), str(key))
+                for ordinal, (key, mcaption) in enumerate(members)
+            ])
+        conn.executemany("INSERT INTO dmv_MDSCHEMA_MEASURES VALUES (?, ?, ?, ?, 'Sales', ?)", [
+            (cube, name, f"[Measures].[{name}]", name, 2 if name == 'Order Count' else 1)
+            for name in MEASURES
+        ])
+        conn.execute("CREATE INDEX idx_members_hierarchy ON dmv_MDSCHEMA_MEMBERS (HIERARCHY_UNIQUE_NAME, MEMBER_ORDINAL)")
+
+
+_default_cube = None
+_default_lock = threading.Lock()
+
+
+def default_cube():
+    """The cube named by PROXYCUBE_MOCK (a .db path), or a generated one in the temp folder."""
+    global _default_cube
+    with _default_lock:
+        if _default_cube is None:
+            setting = os.environ.get('PROXYCUBE_MOCK', '')
+            _default_cube = SyntheticCube(setting if setting.endswith('.db') else None)
+        return _default_cube
+
+
+# ---------------------------------------------------------------- MDX parsing
+
+TOKEN = re.compile(r'''
+    \s+ | --[^\n]* | //[^\n]*
+  | (?P<wrapped>\[\[[^\[\]]+\]\](?!\]))
+  | (?P<bracket>\[(?:[^\]]|\]\])*\])
+  | (?P<string>"[^"]*"|'[^']*')
+  | (?P<number>\d+(?:\.\d+)?)
+  | (?P<word>[$A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>[{}(),.:*+\-/&])
+''', re.VERBOSE)
+
+
+def tokenize(text):
+    tokens, pos = [], 0
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if not match:
+            raise MockError(f"Unexpected character in MDX near: {text[pos:pos + 20]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'wrapped':
+            # The extractor brackets dimension unique names again ([[Product]]); SSAS would reject it
+            tokens.append(('name', match.group()[2:-2]))
+        elif kind == 'bracket':
+            tokens.append(('name', match.group()[1:-1].replace(']]', ']')))
+        elif kind == 'string':
+            tokens.append(('string', match.group()[1:-1]))
+        elif kind == 'number':
+            tokens.append(('number', match.group()))
+        elif kind == 'word':
+            tokens.append(('word', match.group()))
+        elif kind == 'op':
+            tokens.append(('op', match.group()))
+    return tokens
+
+
+class Parser:
+    """Recursive descent over the supported MDX subset, producing nested tuples."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token[0] == kind and (value is None or token[1].upper() == value.upper()):
+            self.pos += 1
+            return token
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            raise MockError(f"Expected {value or kind} but found {self.peek()[1]!r}")
+        return token
+
+    def query(self):
+        calculated = {}
+        if self.accept('word', 'WITH'):
+            while self.accept('word', 'MEMBER'):
+                path = self.path()
+                self.expect('word', 'AS')
+                calculated[path[-1][1]] = self.expression()
+        self.expect('word', 'SELECT')
+        top = None
+        if self.accept('word', 'TOP'):
+            top = int(self.expect('number')[1])
+        axes = {}
+        while True:
+            non_empty = bool(self.accept('word', 'NON'))
+            if non_empty:
+                self.expect('word', 'EMPTY')
+            axis_set = self.set_expression()
+            self.expect('word', 'ON')
+            axis = self.next()[1].upper()
+            axes[{'0': 'COLUMNS', '1': 'ROWS'}.get(axis, axis)] = (axis_set, non_empty)
+            if not self.accept('op', ','):
+                break
+        self.expect('word', 'FROM')
+        if self.accept('op', '('):
+            source = ('subselect', self.query())
+            self.expect('op', ')')
+        else:
+            source = ('cube', self.expect('name')[1])
+        where = None
+        if self.accept('word', 'WHERE'):
+            where = self.set_expression()
+        return {'with': calculated, 'top': top, 'axes': axes, 'from': source, 'where': where}
+
+    def path(self):
+        """[a].[b].&[c] segments as (is_key, name) pairs."""
+        segments = []
+        while True:
+            is_key = bool(self.accept('op', '&'))
+            segments.append((is_key, self.expect('name')[1]))
+            if self.peek() == ('op', '.') and self.peek(1)[0] == 'name' or \
+                    self.peek() == ('op', '.') and self.peek(1) == ('op', '&'):
+                self.next()
+                continue
+            return segments
+
+    def set_expression(self):
+        left = self.set_term()
+        while self.accept('op', '*'):
+            left = ('crossjoin', [left, self.set_term()])
+        return left
+
+    def set_term(self):
+        if self.accept('op', '{'):
+            items = []
+            if not self.accept('op', '}'):
+                items.append(self.set_expression())
+                while self.accept('op', ','):
+                    items.append(self.set_expression())
+                self.expect('op', '}')
+            return ('union', items)
+        if self.accept('op', '('):
+            items = [self.set_expression()]
+            while self.accept('op', ','):
+                items.append(self.set_expression())
+            self.expect('op', ')')
+            return items[0] if len(items) == 1 else ('crossjoin', items)
+        token = self.peek()
+        if token[0] == 'word' and self.peek(1) == ('op', '('):
+            name = self.next()[1].upper()
+            self.next()
+            args = []
+            if not self.accept('op', ')'):
+                while True:
+                    if self.peek()[0] == 'number':
+                        args.append(('number', float(self.next()[1])))
+                    else:
+                        args.append(self.set_expression())
+                    if self.accept('op', ')'):
+                        break
+                    self.expect('op', ',')
+            return ('function', name, args)
+        start = self.member_expression()
+        if self.accept('op', ':'):
+            return ('range', start, self.member_expression())
+        return start
+
+    def member_expression(self):
+        segments = self.path()
+        suffix = None
+        while self.peek() == ('op', '.') and self.peek(1)[0] == 'word':
+            self.next()
+            word = self.next()[1].upper()
+            if word == 'PROPERTIES':
+                self.expect('op', '(')
+                prop = self.expect('string')[1]
+                self.expect('op', ')')
+                suffix = (suffix, 'PROPERTIES', prop.upper())
+            else:
+                suffix = (suffix, word, None) if suffix else word
+        return ('path', segments, suffix)
+
+    def expression(self):
+        left = self.factor()
+        while self.peek()[0] == 'op' and self.peek()[1] in '+-':
+            op = self.next()[1]
+            left = ('binary', op, left, self.factor())
+        return left
+
+    def factor(self):
+        left = self.unary()
+        while self.peek()[0] == 'op' and self.peek()[1] in '*/':
+            op = self.next()[1]
+            left = ('binary', op, left, self.unary())
+        return left
+
+    def unary(self):
+        if self.accept('op', '('):
+            inner = self.expression()
+            self.expect('op', ')')
+            return inner
+        if self.accept('op', '-'):
+            return ('binary', '-', ('number', 0.0), self.unary())
+        token = self.peek()
+        if token[0] == 'number':
+            self.next()
+            return ('number', float(token[1]))
+        if token[0] == 'string':
+            self.next()
+            return ('string', token[1])
+        return self.member_expression()
+
+
+# ---------------------------------------------------------------- evaluation
+
+class Evaluator:
+    def __init__(self, conn, cube_name, stats=None):
+        self.conn = conn
+        self.cube_name = cube_name
+        # Work counters, the mock's stand-in for a server's query cost
+        self.stats = stats if stats is not None else {}
+        for counter in ('tuples', 'cells', 'scans'):
+            self.stats.setdefault(counter, 0)
+        self._members = {}
+        self.filters = {}
+        self.calculated = {}
+
+    def members(self, hierarchy):
+        if hierarchy not in self._members:
+            _, _, table, key_col, caption_col = HIERARCHIES[hierarchy]
+            self._members[hierarchy] = [
+                Member(hierarchy, key, str(caption)) for key, caption in self.conn.execute(
+                    f"SELECT DISTINCT {key_col}, {caption_col} FROM {table} ORDER BY {key_col}")
+            ]
+        return self._members[hierarchy]
+
+    def find_member(self, hierarchy, name, is_key):
+        for member in self.members(hierarchy):
+            if (str(member.key) if is_key else member.caption) == name:
+                return member
+        raise MockError(f"Member not found: {hierarchy}.{'&' if is_key else ''}[{name}]")
+
+    def resolve(self, node):
+        """A path expression as a list of tuples (measures are ('Measures', name) members)."""
+        _, segments, suffix = node
+        names = [name for _, name in segments]
+        if names[0].lower() == 'measures' and len(names) == 2:
+            if names[1] not in MEASURES and names[1] not in self.calculated:
+                raise MockError(f"Unknown measure: {names[1]}")
+            return [(Member('[Measures]', names[1], names[1]),)]
+        if len(names) == 1:
+            if names[0] in MEASURES or names[0] in self.calculated:
+                return [(Member('[Measures]', names[0], names[0]),)]
+            hierarchy = DIMENSION_KEYS.get(f"[{names[0]}]")
+            if hierarchy is None:
+                raise MockError(f"Unknown member or dimension: [{names[0]}]")
+            return [(m,) for m in self.members(hierarchy)]
+        hierarchy = f"[{names[0]}].[{names[1]}]"
+        if hierarchy not in HIERARCHIES:
+            raise MockError(f"Unknown hierarchy: {hierarchy}")
+        rest = segments[2:]
+        if rest and (rest[-1][0] or rest[-1][1] != names[1]) and rest[-1][1].lower() != 'all':
+            member = self.find_member(hierarchy, rest[-1][1], rest[-1][0])
+            if suffix in ('CHILDREN', 'MEMBERS'):
+                return []  # attribute members are leaves
+            return [(member,)]
+        return [(m,) for m in self.members(hierarchy)]
+
+    def evaluate(self, node):
+        kind = node[0]
+        if kind == 'path':
+            return self.resolve(node)
+        if kind == 'tuples':
+            return node[1]
+        if kind == 'union':
+            result = []
+            for item in node[1]:
+                result.extend(self.evaluate(item))
+            return result
+        if kind == 'crossjoin':
+            result = [()]
+            for item in node[1]:
+                result = [left + right for left in result for right in self.evaluate(item)]
+            self.stats['tuples'] += len(result)
+            return result
+        if kind == 'range':
+            return self.member_range(node[1], node[2])
+        if kind == 'function':
+            return self.function(node[1], node[2])
+        raise MockError(f"Unsupported set expression: {kind}")
+
+    def member_range(self, first, last):
+        bounds = []
+        for _, segments, _ in (first, last):
+            hierarchy = f"[{segments[0][1]}].[{segments[1][1]}]" if len(segments) > 2 else None
+            is_key, name = segments[-1]
+            if hierarchy not in HIERARCHIES:
+                raise MockError(f"Unsupported range endpoint: {name}")
+            bounds.append((hierarchy, is_key, name))
+        hierarchy = bounds[0][0]
+        members = self.members(hierarchy)
+        if all(is_key for _, is_key, _ in bounds):
+            # Compare keys, so a range may reach past the members that exist (like dates beyond the cube)
+            convert = type(members[0].key) if members else str
+            lo, hi = sorted(convert(name) for _, _, name in bounds)
+            return [(m,) for m in members if lo <= m.key <= hi]
+        first_member = self.find_member(hierarchy, bounds[0][2], bounds[0][1])
+        last_member = self.find_member(hierarchy, bounds[1][2], bounds[1][1])
+        lo, hi = sorted((members.index(first_member), members.index(last_member)))
+        return [(m,) for m in members[lo:hi + 1]]
+
+    def function(self, name, args):
+        if name in ('HIERARCHIZE', 'DISTINCT'):
+            tuples = self.evaluate(args[0])
+            seen, result = set(), []
+            for t in tuples:
+                if t not in seen:
+                    seen.add(t)
+                    result.append(t)
+            return result
+        if name == 'CROSSJOIN':
+            return self.evaluate(('crossjoin', args))
+        if name in ('NONEMPTY', 'NONEMPTYCROSSJOIN'):
+            sets = args if name == 'NONEMPTYCROSSJOIN' else args[:1]
+            if len(sets) == 1 and sets[0][0] == 'crossjoin':
+                sets = sets[0][1]
+            elif len(sets) == 1 and sets[0][:2] == ('function', 'CROSSJOIN'):
+                sets = sets[0][2]
+            return self.non_empty_product([self.evaluate(s) for s in sets])
+        if name == 'HEAD':
+            count = int(args[1][1]) if len(args) > 1 else 1
+            return self.evaluate(args[0])[:count]
+        if name == 'SUBSET':
+            tuples = self.evaluate(args[0])
+            start = int(args[1][1])
+            count = int(args[2][1]) if len(args) > 2 else len(tuples)
+            return tuples[start:start + count]
+        if name == 'TOPCOUNT':
+            tuples = self.evaluate(args[0])
+            count = int(args[1][1])
+            measure = self.evaluate(args[2])[0][0].key if len(args) > 2 else next(iter(MEASURES))
+            values = self.cells(tuples, [measure])
+            ranked = sorted(tuples, key=lambda t: values.get(self.key_of(t), [None])[0] or 0, reverse=True)
+            return ranked[:count]
+        raise MockError(f"Unsupported MDX function: {name}")
+
+    @staticmethod
+    def key_of(t):
+        return tuple(m.key for m in t if m.hierarchy != '[Measures]')
+
+    def _where(self, extra=None):
+        clauses, params = [], []
+        filters = dict(self.filters)
+        for hierarchy, keys in (extra or {}).items():
+            filters[hierarchy] = keys & filters[hierarchy] if hierarchy in filters else keys
+        for hierarchy, keys in filters.items():
+            _, _, table, key_col, _ = HIERARCHIES[hierarchy]
+            clauses.append(f"{table}.{key_col} IN ({','.join('?' * len(keys))})")
+            params.extend(sorted(keys))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def _restrict(self, hierarchies, keysets):
+        # Push the axis members into SQL unless they are (nearly) the whole hierarchy
+        return {hierarchy: keys for hierarchy, keys in zip(hierarchies, keysets)
+                if len(keys) < len(self.members(hierarchy))}
+
+    def cells(self, tuples, measures):
+        """{member keys: [values]} for the non-measure hierarchies of the tuples."""
+        plain = [tuple(m for m in t if m.hierarchy != '[Measures]') for t in tuples]
+        hierarchies = [m.hierarchy for m in plain[0]] if plain else []
+        keysets = [{t[i].key for t in plain} for i in range(len(hierarchies))]
+        self.stats['cells'] += len(tuples) * max(1, len([m for m in measures if m in MEASURES]))
+        return self._aggregate(hierarchies, keysets, measures)
+
+    def _aggregate(self, hierarchies, keysets, measures):
+        base = [m for m in measures if m in MEASURES] or ['Order Count']
+        keys = [f"{HIERARCHIES[h][2]}.{HIERARCHIES[h][3]}" for h in hierarchies]
+        where, params = self._where(self._restrict(hierarchies, keysets))
+        select = ', '.join(keys + [MEASURES[m] for m in base])
+        self.stats['scans'] += 1
+        sql = f"SELECT {select} FROM {FACTS}{where}"
+        if keys:
+            sql += f" GROUP BY {', '.join(keys)}"
+        result = {}
+        for row in self.conn.execute(sql, params):
+            values = dict(zip(base, row[len(keys):]))
+            result[tuple(row[:len(keys)])] = values
+        return {
+            key: [values.get(m) for m in measures] for key, values in result.items()
+        }
+
+    def non_empty(self, tuples):
+        if not tuples:
+            return []
+        existing = self.cells(tuples, ['Order Count'])
+        return [t for t in tuples if existing.get(self.key_of(t), [0])[0]]
+
+    def non_empty_product(self, parts):
+        """NonEmpty over the cross product of parts without building the product first.
+
+        The fact table is grouped by all the parts' hierarchies once, and only
+        combinations that exist are turned into tuples, as a server with
+        sparse storage would.
+        """
+        if any(not part for part in parts):
+            return []
+        if any(m.hierarchy == '[Measures]' for part in parts for m in part[0]):
+            return self.non_empty(self.evaluate(('crossjoin', [('tuples', part) for part in parts])))
+        hierarchies, keysets, positions = [], [], []
+        for part in parts:
+            width = len(part[0])
+            hierarchies += [m.hierarchy for m in part[0]]
+            keysets += [{t[i].key for t in part} for i in range(width)]
+            positions.append({self.key_of(t): (i, t) for i, t in enumerate(part)})
+        existing = self._aggregate(hierarchies, keysets, ['Order Count'])
+        self.stats['cells'] += len(existing)
+        result = []
+        for key, values in existing.items():
+            if not values[0]:
+                continue
+            picked, offset = [], 0
+            for part, lookup in zip(parts, positions):
+                width = len(part[0])
+                hit = lookup.get(key[offset:offset + width])
+                if hit is None:
+                    break
+                picked.append(hit)
+                offset += width
+            else:
+                result.append((tuple(i for i, _ in picked), sum((t for _, t in picked), ())))
+        result.sort(key=lambda item: item[0])
+        self.stats['tuples'] += len(result)
+        return [t for _, t in result]
+
+    def calculate(self, node, row_members, values):
+        kind = node[0]
+        if kind == 'number' or kind == 'string':
+            return node[1]
+        if kind == 'binary':
+            left = self.calculate(node[2], row_members, values)
+            right = self.calculate(node[3], row_members, values)
+            if left is None or right is None:
+                return None
+            if node[1] == '/':
+                return left / right if right else None
+            return {'+': left + right, '-': left - right, '*': left * right}[node[1]]
+        if kind == 'path':
+            _, segments, suffix = node
+            names = [name for _, name in segments]
+            if isinstance(suffix, tuple) and suffix[1] == 'PROPERTIES':
+                hierarchy = f"[{names[0]}].[{names[1]}]"
+                member = row_members.get(hierarchy)
+                if member is None:
+                    return None
+                return member.key if suffix[2].startswith('KEY') else member.caption
+            if suffix is not None:
+                # .CurrentMember, .CurrentMember.Name, .CurrentMember.Member_Caption, .CurrentMember.UniqueName
+                member = row_members.get(f"[{names[0]}].[{names[1]}]")
+                if member and isinstance(suffix, tuple) and suffix[1] in ('UNIQUENAME', 'UNIQUE_NAME'):
+                    return f"{member.hierarchy}.&[{member.key}]"
+                return member.caption if member else None
+            return values.get(names[-1])
+        raise MockError(f"Unsupported calculated member expression: {kind}")
+
+    def run(self, query):
+        self.calculated.update(query['with'])
+        source = query['from']
+        while source[0] == 'subselect':
+            # Subselect axes restrict their hierarchies, like a slicer that keeps totals visual
+            inner = source[1]
+            self.calculated.update(inner['with'])
+            for axis_set, _ in inner['axes'].values():
+                self.add_filter(self.evaluate(axis_set))
+            source = inner['from']
+        if source[1] != self.cube_name:
+            raise MockError(f"Cube not found: {source[1]}")
+        if query['where'] is not None:
+            self.add_filter(self.evaluate(query['where']))
+
+        columns_set, _ = query['axes'].get('COLUMNS', (('union', []), False))
+        rows_set, rows_non_empty = query['axes'].get('ROWS', (None, False))
+        column_tuples = self.evaluate(columns_set)
+        measures = [t[0].key for t in column_tuples if len(t) == 1 and t[0].hierarchy == '[Measures]']
+        attribute_sets = {}
+        for t in column_tuples:
+            for m in t:
+                if m.hierarchy != '[Measures]':
+                    attribute_sets.setdefault(m.hierarchy, []).append((m,))
+
+        row_tuples = self.evaluate(rows_set) if rows_set is not None else [()]
+        # COLUMNS may mix attributes and measures (the extractor relies on it); ROWS may not
+        if len({tuple(m.hierarchy for m in t) for t in row_tuples}) > 1:
+            raise MockError("Members belong to different hierarchies in the same set")
+        if any(m.hierarchy == '[Measures]' for t in row_tuples for m in t):
+            raise MockError("Measures on ROWS are not supported by the mock")
+        for tuples in attribute_sets.values():
+            row_tuples = [left + right for left in row_tuples for right in tuples]
+        self.stats['tuples'] += len(row_tuples)
+        hierarchies = [m.hierarchy for m in row_tuples[0]] if row_tuples else []
+
+        referenced = set()
+        for expr in self.calculated.values():
+            self.referenced_measures(expr, referenced)
+        needed = [m for m in MEASURES if m in measures or m in referenced]
+        if rows_non_empty and not needed:
+            needed = ['Order Count']
+        cells = self.cells(row_tuples, needed) if row_tuples and needed else {}
+        description = [f"{h}.[{HIERARCHIES[h][1]}].[MEMBER_CAPTION]" for h in hierarchies] + \
+                      [f"[Measures].[{m}]" for m in measures]
+        rows = []
+        for t in row_tuples:
+            key = self.key_of(t)
+            if rows_non_empty and key not in cells:
+                continue  # no fact rows for this tuple
+            values = dict(zip(needed, cells.get(key, [None] * len(needed))))
+            row_members = {m.hierarchy: m for m in t}
+            rows.append(tuple([m.caption for m in t] + [
+                self.calculate(self.calculated[m], row_members, values) if m in self.calculated
+                else values.get(m) for m in measures
+            ]))
+            if query['top'] and len(rows) >= query['top']:
+                break
+        return description, rows
+
+    def referenced_measures(self, node, found):
+        if node[0] == 'binary':
+            self.referenced_measures(node[2], found)
+            self.referenced_measures(node[3], found)
+        elif node[0] == 'path' and node[2] is None and node[1][-1][1] in MEASURES:
+            found.add(node[1][-1][1])
+
+    def add_filter(self, tuples):
+        by_hierarchy = {}
+        for t in tuples:
+            for m in t:
+                if m.hierarchy != '[Measures]':
+                    by_hierarchy.setdefault(m.hierarchy, set()).add(m.key)
+        for hierarchy, keys in by_hierarchy.items():
+            self.filters[hierarchy] = self.filters[hierarchy] & keys if hierarchy in self.filters else keys
+
+
+DMV = re.compile(r'\$system\.(\w+)', re.IGNORECASE)
+
+
+def run_query(conn, cube_name, text, stats=None):
+    """Execute DMV SQL or MDX; returns (column names, rows).
+
+    stats, if given, accumulates the evaluator's tuples/cells/scans counters.
+    """
+    if DMV.search(text):
+        cursor = conn.execute(DMV.sub(lambda m: f'"dmv_{m.group(1).upper()}"', text))
+        return [col[0] for col in cursor.description], cursor.fetchall()
+    parser = Parser(tokenize(text))
+    query = parser.query()
+    if parser.peek()[0] is not None:
+        raise MockError(f"Unexpected text after query: {parser.peek()[1]!r}")
+    return Evaluator(conn, cube_name, stats).run(query)
+
+
+# ---------------------------------------------------------------- pyadomd surface
+
+class Row(tuple):
+    """Result row that also allows attribute access by column name, as pyadomd rows do."""
+
+    def __new__(cls, values, names):
+        row = super().__new__(cls, values)
+        row._names = names
+        return row
+
+    def __getattr__(self, name):
+        for i, column in enumerate(self._names):
+            if column == name or column.endswith(f"[{name}]"):
+                return self[i]
+        raise AttributeError(name)
+
+
+Description = namedtuple('Description', 'name type_code display_size internal_size precision scale null_ok')
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.description = None
+        self._rows = []
+        self._pos = 0
+
+    def execute(self, query):
+        started = time.perf_counter()
+        names, rows = run_query(self.connection.db, self.connection.cube.cube_name, query,
+                                self.connection.stats)
+        self.connection.stats['queries'] += 1
+        remaining = self.connection.latency - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        self.description = [
+            Description(name, type(rows[0][i]).__name__ if rows else 'str', None, None, None, None, True)
+            for i, name in enumerate(names)
+        ]
+        self._names = names
+        self._rows = rows
+        self._pos = 0
+        return self
+
+    def _take(self, count):
+        chunk = self._rows[self._pos:self._pos + count]
+        self._pos += len(chunk)
+        self.connection.stats['rows'] += len(chunk)
+        if self.connection.row_latency and chunk:
+            time.sleep(self.connection.row_latency * len(chunk))
+        return [Row(row, self._names) for row in chunk]
+
+    def fetchone(self):
+        rows = self._take(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size=1):
+        return self._take(size)
+
+    def fetchall(self):
+        return self._take(len(self._rows) - self._pos)
+
+    def __iter__(self):
+        while True:
+            rows = self._take(1000)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Pyadomd:
+    """pyadomd.Pyadomd look-alike; the connection string is accepted and ignored.
+
+    latency is added to every execute() (server time), row_latency to every
+    fetched row (transfer time).
+    """
+
+    def __init__(self, conn_str='', cube=None, latency=None, row_latency=0.0):
+        self.conn_str = conn_str
+        self.cube = cube or default_cube()
+        self.latency = DEFAULT_LATENCY if latency is None else latency
+        self.row_latency = row_latency
+        self.db = None
+        self.stats = {'queries': 0, 'rows': 0, 'tuples': 0, 'cells': 0, 'scans': 0}
+
+    def open(self):
+        self.db = sqlite3.connect(self.cube.path, check_same_thread=False)
+        return self
+
+    def close(self):
+        if self.db:
+            self.db.close()
+            self.db = None
+
+    def cursor(self):
+        if self.db is None:
+            raise MockError("Connection is not open")
+        return Cursor(self)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------------------------------------------------- ADOMD.NET surface
+
+class SchemaColumn:
+    def __init__(self, name):
+        self.ColumnName = name
+
+
+class SchemaTable:
+    def __init__(self, names):
+        self.Columns = [SchemaColumn(name) for name in names]
+
+
+class AdomdDataReader:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._current = None
+        self.FieldCount = len(cursor.description)
+
+    def Read(self):
+        self._current = self._cursor.fetchone()
+        return self._current is not None
+
+    def GetName(self, i):
+        return self._cursor.description[i].name
+
+    def GetValue(self, i):
+        return self._current[i]
+
+    def GetString(self, i):
+        value = self._current[i]
+        return None if value is None else str(value)
+
+    def IsDBNull(self, i):
+        return self._current[i] is None
+
+    def __getitem__(self, i):
+        return self._current[i]
+
+    def GetSchemaTable(self):
+        return SchemaTable([d.name for d in self._cursor.description])
+
+    def Close(self):
+        self._cursor.close()
+
+
+class AdomdConnection:
+    def __init__(self, connection_string='', cube=None, latency=None):
+        self.ConnectionString = connection_string
+        self._conn = Pyadomd(connection_string, cube=cube, latency=latency)
+        self.State = 0
+
+    def Open(self):
+        self._conn.open()
+        self.State = 1
+
+    def Close(self):
+        self._conn.close()
+        self.State = 0
+
+    @property
+    def stats(self):
+        """Mock-only work counters (queries, rows, tuples, cells, scans)."""
+        return self._conn.stats
+
+
+class AdomdCommand:
+    def __init__(self, command_text='', connection=None):
+        self.CommandText = command_text
+        self.Connection = connection
+
+    def ExecuteReader(self):
+        return AdomdDataReader(self.Connection._conn.cursor().execute(self.CommandText))
+
+
+class AdomdParameter:
+    def __init__(self, name=None, value=None):
+        self.ParameterName = name
+        self.Value = value
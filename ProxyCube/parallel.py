@@ -0,0 +1,266 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+GRAINS = ('day', 'week', 'month')
+
+
+def extraction_mdx(cube_name, columns, start_date, end_date):
+    """The extractor's query: selected columns over a [Date].[Date] key range (yyyymmdd)."""
+    mdx_columns = ", ".join([f"[{col}]" for col in columns])
+    date_condition = f"[Date].[Date].&[{start_date}] : [Date].[Date].&[{end_date}]"
+    return f"""
+                SELECT {{ {mdx_columns} }} ON COLUMNS,
+                NON EMPTY {{ {date_condition} }} ON ROWS
+                FROM [{cube_name}]
+            """
+
+
+def _period_end(day, grain):
+    if grain == 'day':
+        return day
+    if grain == 'week':
+        return day + timedelta(days=6 - day.weekday())  # through Sunday
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def date_slices(start_date, end_date, grain='month', align=False):
+    """Split an inclusive yyyymmdd range into (start, end) slices of one day, week or month.
+
+    With align the first and last slices are widened to whole periods, so
+    overlapping ranges always produce the same slice keys.
+    """
+    if grain not in GRAINS:
+        raise ValueError(f"Unknown slice grain: {grain}")
+    current = datetime.strptime(start_date, '%Y%m%d').date()
+    last = datetime.strptime(end_date, '%Y%m%d').date()
+    if align:
+        if grain == 'week':
+            current -= timedelta(days=current.weekday())
+        elif grain == 'month':
+            current = current.replace(day=1)
+        last = _period_end(last, grain)
+    slices = []
+    while current <= last:
+        slice_end = min(_period_end(current, grain), last)
+        slices.append((current.strftime('%Y%m%d'), slice_end.strftime('%Y%m%d')))
+        current = slice_end + timedelta(days=1)
+    return slices
+
+
+class ConnectionPool:
+    """At most `size` open cube connections, created on demand by factory().
+
+    factory returns a connected object exposing .conn.cursor(), such as a
+    CubeConnection after connect(). A connection that failed is dropped
+    rather than returned to the pool.
+    """
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._slots = threading.Semaphore(size)
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self.factory()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._close(conn)
+        else:
+            self._idle.put(conn)
+        self._slots.release()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.disconnect()
+        except Exception:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+class ParallelExtractor:
+    """Extract a date range as independent slices on a bounded connection pool.
+
+    Worker threads each run one slice query at a time and push chunks into
+    a bounded queue; the thread calling run() is the only one that writes to
+    the sink, so a slow sink throttles the workers instead of filling memory.
+    Failed slices are retried with a delay. If a slice failed after some of
+    its rows were written, they are discarded first when the sink supports
+    it (SQLiteSink with slice_column); otherwise the slice is reported failed.
+    With replace_slices the sink's existing rows of a slice are discarded
+    before its first new rows arrive, which turns the load into an upsert.
+    With resume, slices the sink recorded as complete in an earlier run are
+    skipped and the rows of unfinished ones are discarded.
+
+    progress(event) receives dicts with 'slice', 'status' ('running',
+    'done', 'retry', 'failed'), 'rows', 'attempt', 'total_rows',
+    'slices_done' and 'slices_total'.
+    """
+
+    def __init__(self, connection_factory, cube_name, columns, start_date, end_date, sink,
+                 grain='month', workers=4, queue_size=16, chunk_size=50000, retries=3,
+                 retry_delay=2.0, progress=None, should_stop=None, slices=None,
+                 replace_slices=False, resume=False):
+        self.pool = ConnectionPool(connection_factory, workers)
+        self.cube_name = cube_name
+        self.columns = columns
+        self.sink = sink
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.progress = progress
+        self._user_stop = should_stop or (lambda: False)
+        self._abort = threading.Event()
+        self.slices = slices if slices is not None else date_slices(start_date, end_date, grain)
+        self.replace_slices = replace_slices
+        self.resume = resume
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Only a sink that tags rows with their slice can take back a partial slice
+        self._discardable = bool(getattr(sink, 'slice_column', None))
+
+    def should_stop(self):
+        return self._abort.is_set() or self._user_stop()
+
+    @staticmethod
+    def slice_key(slice_range):
+        return f"{slice_range[0]}-{slice_range[1]}"
+
+    def _put(self, message):
+        # Blocks while the writer is behind, but still notices a stop request
+        while True:
+            try:
+                self._queue.put(message, timeout=0.5)
+                return
+            except queue.Full:
+                if self.should_stop():
+                    return
+
+    def _extract_slice(self, slice_range):
+        key = self.slice_key(slice_range)
+        mdx = extraction_mdx(self.cube_name, self.columns, *slice_range)
+        for attempt in range(1, self.retries + 1):
+            if self.should_stop():
+                return
+            conn = None
+            sent = 0
+            try:
+                conn = self.pool.acquire()
+                cursor = conn.conn.cursor()
+                cursor.execute(mdx)
+                if cursor.description:
+                    self._put(('columns', key, attempt, [col[0] for col in cursor.description]))
+                while not self.should_stop():
+                    rows = cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+                    self._put(('rows', key, attempt, rows))
+                    sent += len(rows)
+                self.pool.release(conn)
+                if not self.should_stop():
+                    self._put(('done', key, attempt, sent))
+                return
+            except Exception as e:
+                if conn is not None:
+                    self.pool.release(conn, broken=True)
+                if attempt == self.retries or (sent and not self._discardable):
+                    self._put(('failed', key, attempt, str(e)))
+                    return
+                self._put(('retry', key, attempt, str(e)))
+                time.sleep(self.retry_delay * attempt)
+
+    def run(self):
+        """Extract every slice; returns {slice_key: rows} for the completed ones.
+
+        Raises RuntimeError listing the slices that failed for good.
+        """
+        total = len(self.slices)
+        keys = {self.slice_key(s) for s in self.slices}
+        completed = {}
+        if self.resume and self._discardable:
+            completed = {key: rows for key, rows in self.sink.completed_slices().items() if key in keys}
+        failed = {}
+        attempts = {}
+        total_rows = 0
+        opened = bool(self.sink.columns)
+
+        def report(key, status, rows=0, attempt=1, error=None):
+            if self.progress:
+                self.progress({
+                    'slice': key, 'status': status, 'rows': rows, 'attempt': attempt,
+                    'error': error, 'total_rows': total_rows,
+                    'slices_done': len(completed), 'slices_total': total,
+                })
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cube-slice')
+        futures = [executor.submit(self._extract_slice, s) for s in self.slices
+                   if self.slice_key(s) not in completed]
+        try:
+            while len(completed) + len(failed) < total:
+                try:
+                    kind, key, attempt, payload = self._queue.get(timeout=0.5)
+                except queue.Empty:
+                    if all(f.done() for f in futures) and self._queue.empty():
+                        break  # stopped, or workers exited early
+                    continue
+
+                if kind == 'columns' and not opened:
+                    self.sink.open(payload)
+                    opened = True
+                    if self.resume and self._discardable:
+                        self.sink.discard_incomplete()
+                # A new attempt drops what the failed one wrote; replace_slices drops the old load
+                restarted = attempt != attempts.get(key, attempt)
+                if self._discardable and (restarted or (self.replace_slices and key not in attempts)):
+                    self.sink.discard_slice(key)
+                attempts[key] = attempt
+
+                if kind == 'columns':
+                    report(key, 'running', attempt=attempt)
+                elif kind == 'rows':
+                    self.sink.write_batch(list(zip(*payload)), slice_key=key)
+                    total_rows += len(payload)
+                    report(key, 'running', len(payload), attempt)
+                elif kind == 'done':
+                    completed[key] = payload
+                    if self._discardable:
+                        self.sink.complete_slice(key, payload)
+                    else:
+                        self.sink.checkpoint()
+                    report(key, 'done', payload, attempt)
+                elif kind == 'retry':
+                    report(key, 'retry', attempt=attempt, error=payload)
+                elif kind == 'failed':
+                    failed[key] = payload
+                    if self._discardable:
+                        self.sink.discard_slice(key)
+                    report(key, 'failed', attempt=attempt, error=payload)
+        finally:
+            # Workers blocked on a full queue must not outlive a failed writer
+            self._abort.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.pool.close()
+
+        if failed:
+            details = '; '.join(f"{key}: {error}" for key, error in failed.items())
+            raise RuntimeError(f"{len(failed)} of {total} slices failed: {details}")
+        return completed
@@ -0,0 +1,249 @@
+import hashlib
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.proxycube', 'results.db')
+
+_TOKEN = re.compile(r'''
+    (?P<comment>--[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<name>\[(?:[^\]]|\]\])*\])
+  | (?P<string>"(?:[^"]|"")*"|'(?:[^']|'')*')
+  | (?P<word>[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?)
+  | (?P<space>\s+)
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+
+def _tokens(mdx):
+    for match in _TOKEN.finditer(mdx):
+        kind = match.lastgroup
+        if kind in ('comment', 'space'):
+            continue
+        value = match.group()
+        # Keywords and function names are case-insensitive; names, keys and strings are kept
+        yield kind, value.upper() if kind == 'word' else value
+
+
+def _canonical_slicer(tokens):
+    """Sort the members of a WHERE tuple; the slicer's order never changes the result."""
+    upper = [value for _, value in tokens]
+    if 'WHERE' not in upper:
+        return tokens
+    start = len(upper) - 1 - upper[::-1].index('WHERE')
+    body = tokens[start + 1:]
+    if len(body) < 2 or body[0][1] != '(' or body[-1][1] != ')':
+        return tokens
+    parts, depth, current = [], 0, []
+    for kind, value in body[1:-1]:
+        if value in '({':
+            depth += 1
+        elif value in ')}':
+            depth -= 1
+            if depth < 0:
+                return tokens  # the WHERE belongs to a subselect; leave it alone
+        if value == ',' and depth == 0:
+            parts.append(current)
+            current = []
+        else:
+            current.append((kind, value))
+    parts.append(current)
+    parts.sort(key=lambda part: ' '.join(value for _, value in part))
+    canonical = [('other', '(')]
+    for i, part in enumerate(parts):
+        if i:
+            canonical.append(('other', ','))
+        canonical += part
+    return tokens[:start + 1] + canonical + [('other', ')')]
+
+
+def normalize_mdx(mdx):
+    """Canonical text for an MDX statement, used as its cache key.
+
+    Comments and layout are dropped, keywords upper-cased, NON EMPTY and
+    the NonEmpty() function spelled one way and the members of the WHERE
+    tuple sorted. The order of axis sets is kept, because it is the order
+    of the result's columns and rows.
+    """
+    tokens = list(_tokens(mdx))
+    merged = []
+    for kind, value in tokens:
+        if value == 'EMPTY' and merged and merged[-1][1] == 'NON':
+            merged[-1] = ('word', 'NON EMPTY')
+        else:
+            merged.append((kind, value))
+    merged = _canonical_slicer(merged)
+    text = []
+    for kind, value in merged:
+        if text and (kind in ('word', 'name', 'string') and text[-1][0] in ('word', 'name', 'string')):
+            text.append(('space', ' '))
+        text.append((kind, value))
+    return ''.join(value for _, value in text)
+
+
+class ResultCache:
+    """Query results keyed by connection identity and normalized MDX.
+
+    Recent results are held in an in-memory LRU of at most memory_bytes
+    (measured as their compressed size); every result is also written to
+    an SQLite file that is trimmed to disk_bytes, least recently used
+    first. Entries older than ttl seconds are treated as missing.
+    stats() reports hits, misses and evictions.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ttl=3600, memory_bytes=64 * 1024 * 1024,
+                 disk_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.ttl = ttl
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> (identity, created_at, size, result)
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'memory_evictions': 0,
+                       'disk_evictions': 0}
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False) if path else None
+        if self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    identity TEXT NOT NULL,
+                    mdx TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            ''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_results_used ON results (used_at)")
+            self.conn.commit()
+
+    @staticmethod
+    def identity(server, catalog):
+        return f"{server.strip().lower()}|{catalog.strip().lower()}"
+
+    @staticmethod
+    def key(identity, mdx, max_rows=None):
+        text = f"{identity}\x1f{normalize_mdx(mdx)}\x1f{max_rows or ''}"
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def close(self):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key, identity, created_at, size, result):
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old:
+            self._memory_used -= old[2]
+        self._memory[key] = (identity, created_at, size, result)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, (_, _, evicted, _) = self._memory.popitem(last=False)
+            self._memory_used -= evicted
+            self._stats['memory_evictions'] += 1
+
+    def get(self, identity, mdx, max_rows=None):
+        """The cached (columns, rows), or None."""
+        key = self.key(identity, mdx, max_rows)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1]):
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return entry[3]
+            if entry:
+                self._memory.pop(key)
+                self._memory_used -= entry[2]
+
+            row = None
+            if self.conn:
+                row = self.conn.execute(
+                    "SELECT value, size, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None or self._expired(row[2]):
+                self._stats['misses'] += 1
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE results SET used_at = ? WHERE key = ?", (time.time(), key))
+            result = pickle.loads(zlib.decompress(row[0]))
+            self._remember(key, identity, row[2], row[1], result)
+            self._stats['disk_hits'] += 1
+            return result
+
+    def put(self, identity, mdx, columns, rows, max_rows=None):
+        key = self.key(identity, mdx, max_rows)
+        result = (list(columns), [tuple(row) for row in rows])
+        try:
+            blob = zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return  # values the driver hands back as foreign objects are simply not cached
+        now = time.time()
+        with self._lock:
+            self._remember(key, identity, now, len(blob), result)
+            if not self.conn or len(blob) > self.disk_bytes:
+                return
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO results (key, identity, mdx, value, size, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, identity, normalize_mdx(mdx), blob, len(blob), now, now)
+                )
+                self._trim_disk()
+
+    def _trim_disk(self):
+        used = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if used <= self.disk_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY used_at").fetchall():
+            self.conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            self._stats['disk_evictions'] += 1
+            used -= size
+            if used <= self.disk_bytes:
+                break
+
+    def get_or_run(self, identity, mdx, run, max_rows=None):
+        """Return the cached result or run() -> (columns, rows) and cache it (empty columns are not cached)."""
+        result = self.get(identity, mdx, max_rows)
+        if result is not None:
+            return result
+        columns, rows = run()
+        if columns:
+            self.put(identity, mdx, columns, rows, max_rows)
+        return columns, rows
+
+    def invalidate(self, identity=None):
+        """Drop every entry, or only those of one connection identity."""
+        with self._lock:
+            for key in [k for k, entry in self._memory.items() if identity is None or entry[0] == identity]:
+                self._memory_used -= self._memory.pop(key)[2]
+            if self.conn:
+                with self.conn:
+                    if identity is None:
+                        self.conn.execute("DELETE FROM results")
+                    else:
+                        self.conn.execute("DELETE FROM results WHERE identity = ?", (identity,))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['hits'] = stats['memory_hits'] + stats['disk_hits']
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_used
+            if self.conn:
+                stats['disk_entries'], stats['disk_bytes'] = self.conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+            return stats
@@ -0,0 +1,106 @@
+from parallel import ParallelExtractor, extraction_mdx
+from local_engine import LocalCubeEngine
+from sinks import SQLiteSink
+
+
+class HybridRouter:
+    """Answers (cube, columns, date range) requests from the local store first.
+
+    The store's slice watermarks say which dates are on disk. Only the
+    slices of the request without one are queried through
+    CubeConnection.execute_query; their rows are merged into the store and
+    checkpointed like any other slice, and the combined result is read back
+    from the store. Overlapping or repeated requests therefore never fetch
+    the same slice twice. Slices fetched here carry no checksum, so the
+    next incremental refresh re-validates them against the cube.
+    """
+
+    def __init__(self, store, cube_conn):
+        self.store = store
+        self.cube_conn = cube_conn
+        self.fetched = []
+
+    def coverage(self, start_date, end_date):
+        """Return (covered, missing) lists of slice ranges for the request."""
+        marks = self.store.watermarks()
+        covered, missing = [], []
+        for slice_range in self.store.slices(start_date, end_date):
+            key = ParallelExtractor.slice_key(slice_range)
+            (covered if key in marks else missing).append(slice_range)
+        return covered, missing
+
+    def _fetch(self, slice_range):
+        key = ParallelExtractor.slice_key(slice_range)
+        mdx = extraction_mdx(self.store.cube_name, self.store.columns, *slice_range)
+        columns, data = self.cube_conn.execute_query(mdx)
+        if not columns:
+            # execute_query reports failures as an empty result; never record those as covered
+            raise RuntimeError(f"Cube query failed for {key}")
+        sink = SQLiteSink(self.store.path, table=self.store.table, slice_column='_slice')
+        sink.open(columns)
+        try:
+            sink.discard_slice(key)
+            if data:
+                sink.write_batch(list(zip(*data)), slice_key=key)
+            sink.complete_slice(key, len(data))
+        finally:
+            sink.close()
+        self.store.record_slices({key: len(data)}, {})
+        self.fetched.append(key)
+        return len(data)
+
+    def fetch(self, start_date, end_date, limit=None, progress=None):
+        """Return (columns, rows) for the range, fetching missing slices first.
+
+        With a limit, missing slices are fetched in date order only until
+        the store can supply that many rows, so a preview stays cheap.
+        """
+        covered, missing = self.coverage(start_date, end_date)
+        for done, slice_range in enumerate(missing, 1):
+            if limit and len(self._local_rows(start_date, end_date, limit)[1]) >= limit:
+                break
+            rows = self._fetch(slice_range)
+            if progress:
+                progress(done, len(missing), ParallelExtractor.slice_key(slice_range), rows)
+        return self._local_rows(start_date, end_date, limit)
+
+    def stream(self, start_date, end_date, chunk_size=50000, progress=None, should_stop=None,
+               fetch_missing=True):
+        """Fetch the missing slices, then return (columns, total_rows, chunks).
+
+        chunks yields lists of rows read from the store with fetchmany, and
+        closes its connection once exhausted or closed. With
+        fetch_missing=False only what is already stored is read.
+        """
+        should_stop = should_stop or (lambda: False)
+        covered, missing = self.coverage(start_date, end_date) if fetch_missing else ([], [])
+        for done, slice_range in enumerate(missing, 1):
+            if should_stop():
+                return [], 0, iter(())
+            rows = self._fetch(slice_range)
+            if progress:
+                progress(done, len(missing), ParallelExtractor.slice_key(slice_range), rows)
+        try:
+            engine = LocalCubeEngine(self.store.path, self.store.table)
+        except ValueError:
+            return [], 0, iter(())
+        total = engine.count_rows(start_date, end_date)
+        columns, chunks = engine.iter_rows(start_date, end_date, chunk_size)
+
+        def read():
+            try:
+                yield from chunks
+            finally:
+                engine.close()
+
+        return columns, total, read()
+
+    def _local_rows(self, start_date, end_date, limit=None):
+        try:
+            engine = LocalCubeEngine(self.store.path, self.store.table)
+        except ValueError:
+            return [], []  # nothing has been stored yet
+        try:
+            return engine.rows(start_date, end_date, limit=limit)
+        finally:
+            engine.close()
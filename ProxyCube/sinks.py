@@ -0,0 +1,564 @@
+import csv
+import math
+import os
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is optional
+    pa = None
+    pq = None
+
+try:
+    import xlsxwriter
+except ImportError:  # Excel output is optional; xlsxwriter is the faster writer
+    xlsxwriter = None
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+
+def safe_column_name(col):
+    return col.replace(".", "_").replace(" ", "_")
+
+
+def bump_data_version(conn):
+    """Count one committed change to the extracted rows, in the caller's transaction.
+
+    LocalCubeEngine keys its rollups on this counter, so a slice replaced
+    by the same number of rows still makes them stale.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS _data_version (version INTEGER NOT NULL)")
+    if not conn.execute("UPDATE _data_version SET version = version + 1").rowcount:
+        conn.execute("INSERT INTO _data_version (version) VALUES (1)")
+
+
+def _looks_like_date(value):
+    if len(value) < 8 or not value[:4].isdigit():
+        return False
+    for fmt in ('%Y-%m-%d', '%Y%m%d', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S'):
+        try:
+            datetime.strptime(value[:19], fmt)
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def _parse_number(value, parse):
+    """parse(value) for plain numeric text; zero-padded codes such as '00123', nan and inf are not numbers."""
+    digits = value.strip().lstrip('+-')
+    if len(digits) > 1 and digits[0] == '0' and digits[1].isdigit():
+        raise ValueError(f"zero-padded code {value!r}")
+    number = parse(value)
+    if not math.isfinite(number):
+        raise ValueError(f"not a finite number: {value!r}")
+    return number
+
+
+def _number(value):
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        return value
+    for parse in (int, float):
+        try:
+            return _parse_number(value, parse)
+        except ValueError:
+            continue
+    return value  # keep stray text such as "N/A" or a zero-padded code instead of failing the load
+
+
+def _text(value):
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _iso(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def _real(value):
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def infer_column_type(values):
+    """Return (sqlite_type, converter) for one column of a sample batch.
+
+    converter is None when the values can be stored as they are.
+    """
+    sample = [v for v in values if v is not None and v != ''][:1000]
+    if not sample:
+        # Nothing to go on yet: text holds whatever later batches bring
+        return 'TEXT', _text
+    if all(isinstance(v, bool) or isinstance(v, int) for v in sample):
+        return 'INTEGER', None
+    if all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in sample):
+        return 'REAL', (_real if any(isinstance(v, Decimal) for v in sample) else None)
+    if all(isinstance(v, (date, datetime)) for v in sample):
+        return 'DATE', _iso
+    if all(isinstance(v, str) for v in sample):
+        # Before the numbers, or yyyymmdd keys would pass as integers
+        if all(_looks_like_date(v) for v in sample):
+            return 'DATE', None
+        for kind, parse in (('INTEGER', int), ('REAL', float)):
+            try:
+                for v in sample:
+                    _parse_number(v, parse)
+                return kind, _number
+            except ValueError:
+                continue
+        return 'TEXT', None
+    return 'TEXT', (lambda v: v if v is None or isinstance(v, (str, int, float, bytes)) else str(v))
+
+
+class OutputSink:
+    """Destination for extracted cube data.
+
+    open() receives the result column names, write_batch() one batch as a
+    list of column sequences (columnar), checkpoint() is called at safe
+    points during a long load and close() finishes the output. The column
+    types are inferred from the first batch; a column that is empty there
+    is stored as text. slice_key names the date slice
+    a batch belongs to when the extraction runs in parallel slices.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = []
+        self.types = []
+        self.converters = []
+        self.rows_written = 0
+
+    def open(self, columns):
+        self.columns = list(columns)
+
+    def _prepare(self, batch):
+        if not self.types:
+            inferred = [infer_column_type(values) for values in batch]
+            self.types = [kind for kind, _ in inferred]
+            self.converters = [converter for _, converter in inferred]
+            self._create()
+        # Only the columns that need it pay for a per-value conversion
+        return [list(map(converter, values)) if converter else values
+                for converter, values in zip(self.converters, batch)]
+
+    def _create(self):
+        pass
+
+    def write_batch(self, batch, slice_key=None):
+        raise NotImplementedError
+
+    def write_rows(self, rows):
+        """Convenience for row-major input such as cursor.fetchmany()."""
+        if rows:
+            self.write_batch(list(zip(*rows)))
+
+    def checkpoint(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SQLiteSink(OutputSink):
+    """Typed SQLite table, loaded in one transaction with periodic checkpoints.
+
+    Column affinities are inferred from the data (INTEGER/REAL/DATE/TEXT).
+    Indexes are only built once the load is done, which is much cheaper than
+    maintaining them row by row. With slice_column every row also records
+    the date slice it came from, so discard_slice() can drop a partly
+    written slice before it is extracted again, and complete_slice() records
+    a finished slice in _extract_slices in the same commit as its last rows.
+    A later run into the same file can then resume from those checkpoints.
+    """
+
+    def __init__(self, path, table='CubeData', checkpoint_rows=200000, index_columns=None,
+                 slice_column=None):
+        super().__init__(path)
+        self.table = table
+        self.checkpoint_rows = checkpoint_rows
+        self.index_columns = index_columns
+        self.slice_column = slice_column
+        self.conn = None
+        self._slice_rows = {}
+        self._since_checkpoint = 0
+        self._changed = False
+
+    def open(self, columns):
+        super().open(columns)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.isolation_level = None
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA cache_size=-65536")
+        if self.slice_column:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS _extract_slices (
+                    slice TEXT PRIMARY KEY,
+                    rows INTEGER NOT NULL,
+                    completed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+        self.conn.execute("BEGIN")
+
+    @property
+    def safe_columns(self):
+        return [safe_column_name(col) for col in self.columns]
+
+    def _create(self):
+        columns = list(zip(self.safe_columns, self.types))
+        if self.slice_column:
+            columns.append((self.slice_column, 'TEXT'))
+        definitions = ', '.join(f'"{col}" {kind}' for col, kind in columns)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS "{self.table}" ({definitions})')
+        placeholders = ', '.join('?' * len(columns))
+        quoted = ', '.join(f'"{col}"' for col, _ in columns)
+        self._insert_sql = f'INSERT INTO "{self.table}" ({quoted}) VALUES ({placeholders})'
+
+    def write_batch(self, batch, slice_key=None):
+        batch = self._prepare(batch)
+        count = len(batch[0]) if batch else 0
+        if self.slice_column:
+            batch = [*batch, [slice_key] * count]
+            self._slice_rows[slice_key] = self._slice_rows.get(slice_key, 0) + count
+        self.conn.executemany(self._insert_sql, zip(*batch))
+        self._changed = True
+        self.rows_written += count
+        self._since_checkpoint += count
+        if self._since_checkpoint >= self.checkpoint_rows:
+            self.checkpoint()
+
+    def _commit(self):
+        if self._changed:
+            bump_data_version(self.conn)
+            self._changed = False
+        self.conn.execute("COMMIT")
+
+    def checkpoint(self):
+        if self.conn and self.conn.in_transaction:
+            self._commit()
+            self.conn.execute("BEGIN")
+        self._since_checkpoint = 0
+
+    def discard_slice(self, slice_key):
+        """Delete the rows stored for one slice."""
+        if self.conn is None:
+            return 0
+        self.conn.execute("DELETE FROM _extract_slices WHERE slice = ?", (slice_key,))
+        try:
+            cursor = self.conn.execute(
+                f'DELETE FROM "{self.table}" WHERE "{self.slice_column}" = ?', (slice_key,)
+            )
+        except sqlite3.OperationalError:
+            return 0  # nothing written yet, the table does not exist
+        self.rows_written -= self._slice_rows.pop(slice_key, 0)
+        self._changed = self._changed or cursor.rowcount > 0
+        return cursor.rowcount
+
+    def complete_slice(self, slice_key, rows):
+        if self.conn is None:
+            return  # nothing was ever written, so an empty slice is simply redone
+        self.conn.execute(
+            "INSERT OR REPLACE INTO _extract_slices (slice, rows) VALUES (?, ?)", (slice_key, rows)
+        )
+        self.checkpoint()
+
+    def completed_slices(self):
+        """{slice: rows} checkpointed by earlier runs into this file."""
+        if not os.path.exists(self.path):
+            return {}
+        conn = sqlite3.connect(self.path)
+        try:
+            return dict(conn.execute("SELECT slice, rows FROM _extract_slices"))
+        except sqlite3.OperationalError:
+            return {}
+        finally:
+            conn.close()
+
+    def discard_incomplete(self):
+        """Delete rows of slices without a checkpoint, left by a run that was cut short."""
+        try:
+            cursor = self.conn.execute(
+                f'DELETE FROM "{self.table}" WHERE "{self.slice_column}" IS NULL '
+                f'OR "{self.slice_column}" NOT IN (SELECT slice FROM _extract_slices)'
+            )
+        except sqlite3.OperationalError:
+            return 0  # new file
+        self._changed = self._changed or cursor.rowcount > 0
+        return cursor.rowcount
+
+    def verify(self):
+        """Compare stored rows per slice with the checkpoints; returns the mismatches.
+
+        Each mismatch is (slice, checkpointed_rows, stored_rows), where either
+        count is None when that side has no entry for the slice.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            expected = dict(conn.execute("SELECT slice, rows FROM _extract_slices"))
+            stored = dict(conn.execute(
+                f'SELECT "{self.slice_column}", COUNT(*) FROM "{self.table}" GROUP BY 1'
+            ))
+        except sqlite3.OperationalError:
+            return []
+        finally:
+            conn.close()
+        mismatches = []
+        for key in sorted(set(expected) | set(stored), key=str):
+            if expected.get(key) != stored.get(key) and (expected.get(key) or stored.get(key)):
+                mismatches.append((key, expected.get(key), stored.get(key)))
+        return mismatches
+
+    def build_indexes(self):
+        if self.index_columns is not None:
+            columns = [safe_column_name(col) for col in self.index_columns]
+        else:
+            columns = [col for col, kind in zip(self.safe_columns, self.types) if kind == 'DATE']
+        if self.slice_column:
+            columns.append(self.slice_column)
+        for col in columns:
+            self.conn.execute(
+                f'CREATE INDEX IF NOT EXISTS "idx_{self.table}_{col}" ON "{self.table}" ("{col}")'
+            )
+
+    def close(self):
+        if not self.conn:
+            return
+        try:
+            if self.types:
+                self.build_indexes()
+            if self.conn.in_transaction:
+                self._commit()
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            self.conn.close()
+            self.conn = None
+
+
+class CSVSink(OutputSink):
+    """Streaming CSV with a header row; memory use is one batch."""
+
+    def __init__(self, path, delimiter=','):
+        super().__init__(path)
+        self.delimiter = delimiter
+        self._file = None
+        self._writer = None
+
+    def open(self, columns):
+        super().open(columns)
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file, delimiter=self.delimiter)
+        self._writer.writerow(self.columns)
+
+    def write_batch(self, batch, slice_key=None):
+        batch = self._prepare(batch)
+        self._writer.writerows(zip(*batch))
+        self.rows_written += len(batch[0]) if batch else 0
+
+    def checkpoint(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class ParquetSink(OutputSink):
+    """Parquet file written one row group per batch (requires pyarrow).
+
+    Values are converted to the column's Arrow type here rather than left
+    to pyarrow. When a later batch holds a value the column can't take (a
+    2.5 in an int64 column, stray text in a numeric one) the column is
+    widened to float64 or string and the row groups written so far are
+    rewritten under the new schema, since a Parquet file has one schema.
+    """
+
+    ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64', 'DATE': 'string', 'TEXT': 'string'}
+    WIDENING = ('int64', 'float64', 'string')
+    TO_ARROW = {'int64': int, 'float64': float, 'string': lambda v: _text(_iso(v))}
+
+    def __init__(self, path, compression='snappy'):
+        if pa is None:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)")
+        super().__init__(path)
+        self.compression = compression
+        self._writer = None
+        self._schema = None
+        self._kinds = []
+
+    def _create(self):
+        self._kinds = [self.ARROW_TYPES[kind] for kind in self.types]
+        self._open_writer()
+
+    def _open_writer(self):
+        self._schema = pa.schema([
+            (col, getattr(pa, kind)()) for col, kind in zip(self.columns, self._kinds)
+        ])
+        self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+
+    @staticmethod
+    def _arrow_kind(value):
+        if value is None or isinstance(value, bool):
+            return 'int64'
+        if isinstance(value, int):
+            return 'int64' if -2 ** 63 <= value < 2 ** 63 else 'string'
+        if isinstance(value, (float, Decimal)):
+            return 'float64'
+        return 'string'
+
+    def _widen(self, kinds):
+        """Reopen the file with wider column types, copying the row groups already written."""
+        self._writer.close()
+        previous = self.path + '.widen'
+        os.replace(self.path, previous)
+        self._kinds = kinds
+        self._open_writer()
+        try:
+            source = pq.ParquetFile(previous)
+            for group in range(source.num_row_groups):
+                # int64 -> float64 may round integers beyond 2**53; that is what widening means
+                self._writer.write_table(source.read_row_group(group).cast(self._schema, safe=False))
+        finally:
+            os.remove(previous)
+
+    def write_batch(self, batch, slice_key=None):
+        batch = self._prepare(batch)
+        kinds = list(self._kinds)
+        for i, values in enumerate(batch):
+            if kinds[i] != 'string':
+                needed = max(map(self.WIDENING.index, map(self._arrow_kind, values)), default=0)
+                kinds[i] = self.WIDENING[max(needed, self.WIDENING.index(kinds[i]))]
+        if kinds != self._kinds:
+            self._widen(kinds)
+        arrays = []
+        for values, kind, field in zip(batch, self._kinds, self._schema):
+            convert = self.TO_ARROW[kind]
+            arrays.append(pa.array([None if v is None else convert(v) for v in values],
+                                   type=field.type, from_pandas=True))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self.rows_written += len(batch[0]) if batch else 0
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+
+
+class ExcelSink(OutputSink):
+    """Streaming .xlsx (requires xlsxwriter or openpyxl).
+
+    Uses xlsxwriter in constant_memory mode when it is installed, otherwise
+    openpyxl's write-only mode. Either way rows are flushed to disk as they
+    are written, so memory stays flat however large the export is. A sheet
+    holds at most Excel's 1,048,576 rows; the data continues on
+    "<sheet_name> 2", "<sheet_name> 3" and so on, each with its own header.
+    """
+
+    MAX_ROWS = 1048576
+
+    def __init__(self, path, sheet_name='CubeData', max_rows=MAX_ROWS, engine=None):
+        engine = engine or ('xlsxwriter' if xlsxwriter else 'openpyxl')
+        if (engine == 'xlsxwriter' and xlsxwriter is None) or (engine == 'openpyxl' and Workbook is None):
+            raise RuntimeError("Excel output needs xlsxwriter or openpyxl (pip install xlsxwriter)")
+        if engine not in ('xlsxwriter', 'openpyxl'):
+            raise ValueError(f"Unknown Excel engine: {engine}")
+        super().__init__(path)
+        self.sheet_name = sheet_name
+        self.max_rows = max_rows
+        self.engine = engine
+        self.sheets = 0
+        self._workbook = None
+        self._sheet = None
+        self._sheet_rows = 0
+
+    def open(self, columns):
+        super().open(columns)
+        if self.engine == 'xlsxwriter':
+            self._workbook = xlsxwriter.Workbook(self.path, {
+                'constant_memory': True,
+                'default_date_format': 'yyyy-mm-dd',
+                'nan_inf_to_errors': True,
+            })
+        else:
+            self._workbook = Workbook(write_only=True)
+        self._add_sheet()
+
+    def _add_sheet(self):
+        self.sheets += 1
+        title = self.sheet_name if self.sheets == 1 else f"{self.sheet_name} {self.sheets}"
+        if self.engine == 'xlsxwriter':
+            self._sheet = self._workbook.add_worksheet(title[:31])
+            self._sheet.write_row(0, 0, self.columns)
+        else:
+            self._sheet = self._workbook.create_sheet(title=title[:31])
+            self._sheet.append(self.columns)
+        self._sheet_rows = 1
+
+    def _create(self):
+        # Dates are stored as ISO text elsewhere; Excel should get real dates
+        self.converters = [_excel_date if kind == 'DATE' else converter
+                           for kind, converter in zip(self.types, self.converters)]
+
+    def write_batch(self, batch, slice_key=None):
+        batch = self._prepare(batch)
+        xlsx = self.engine == 'xlsxwriter'
+        for row in zip(*batch):
+            if self._sheet_rows >= self.max_rows:
+                self._add_sheet()
+            if xlsx:
+                self._sheet.write_row(self._sheet_rows, 0, row)
+            else:
+                self._sheet.append(row)
+            self._sheet_rows += 1
+        self.rows_written += len(batch[0]) if batch else 0
+
+    def close(self):
+        if self._workbook:
+            try:
+                if self.engine == 'xlsxwriter':
+                    self._workbook.close()
+                else:
+                    self._workbook.save(self.path)
+            finally:
+                self._workbook = None
+                self._sheet = None
+
+
+def _excel_date(value):
+    if isinstance(value, str):
+        try:
+            if len(value) == 8:
+                return datetime.strptime(value, '%Y%m%d').date()
+            if len(value) == 10:
+                return date.fromisoformat(value)
+            return datetime.fromisoformat(value[:19])
+        except ValueError:
+            pass
+    return value
+
+
+SINKS = {
+    '.db': SQLiteSink,
+    '.sqlite': SQLiteSink,
+    '.csv': CSVSink,
+    '.parquet': ParquetSink,
+    '.xlsx': ExcelSink,
+}
+
+
+def open_sink(path, **kwargs):
+    """Pick the sink from the file extension (.db, .csv, .parquet or .xlsx)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in SINKS:
+        raise ValueError(f"Unsupported output type: {ext or path}")
+    return SINKS[ext](path, **kwargs)
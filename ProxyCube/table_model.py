@@ -0,0 +1,122 @@
+from datetime import date, datetime
+
+from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+def format_value(value):
+    """Display text for one cell; numbers get thousands separators."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return f"{value:,}"
+    if isinstance(value, float):
+        if value != value:
+            return ""  # NaN
+        if value == 0 or abs(value) >= 0.01:
+            return f"{value:,.2f}"
+        return f"{value:.4g}"
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S") if value.time() else value.strftime("%Y-%m-%d")
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """Read-only table model over an iterator of row chunks.
+
+    Rows are kept as one list per column and pulled batch_size at a time
+    when the view scrolls near the end (canFetchMore/fetchMore), so only
+    what has been looked at is ever read. Cells are formatted when the
+    view asks for them. total, when known, is the number of rows the
+    chunks will yield. close() closes the chunk generator, which releases
+    the cursor behind it.
+    """
+
+    def __init__(self, columns, chunks, total=None, batch_size=1000, parent=None):
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.total = total
+        self.batch_size = batch_size
+        self._values = [[] for _ in self.columns]
+        self._rows = 0
+        self._chunks = chunks
+        self._pending = []  # rows of a chunk larger than batch_size, not shown yet
+        self._exhausted = False
+        self._numeric = [None] * len(self.columns)
+
+    @property
+    def loaded_rows(self):
+        return self._rows
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.columns[section] if section < len(self.columns) else None
+        return section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self._values[index.column()][index.row()]
+        if role == Qt.DisplayRole:
+            return format_value(value)
+        if role == Qt.ToolTipRole:
+            return None if value is None else str(value)
+        if role == Qt.TextAlignmentRole:
+            if self._is_numeric(index.column()):
+                return int(Qt.AlignRight | Qt.AlignVCenter)
+            return int(Qt.AlignLeft | Qt.AlignVCenter)
+        return None
+
+    def _is_numeric(self, column):
+        # Decided from the first non-null value, so a column aligns the same way on every row
+        if self._numeric[column] is None:
+            for value in self._values[column]:
+                if value is not None:
+                    self._numeric[column] = isinstance(value, (int, float)) and not isinstance(value, bool)
+                    break
+        return bool(self._numeric[column])
+
+    def row(self, row):
+        return tuple(values[row] for values in self._values)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return bool(self._pending) or not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        while len(self._pending) < self.batch_size and not self._exhausted:
+            try:
+                chunk = next(self._chunks)
+            except StopIteration:
+                self._exhausted = True
+                break
+            self._pending.extend(chunk)
+        batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+        if not batch:
+            return
+        self.beginInsertRows(QModelIndex(), self._rows, self._rows + len(batch) - 1)
+        for values, column in zip(self._values, zip(*batch)):
+            values.extend(column)
+        self._rows += len(batch)
+        self.endInsertRows()
+
+    def close(self):
+        self._exhausted = True
+        self._pending = []
+        close = getattr(self._chunks, 'close', None)
+        if close:
+            close()
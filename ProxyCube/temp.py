@@ -1,22 +1,35 @@
 import os
 import sys
 import sqlite3
-import pandas as pd
 from datetime import datetime, timedelta
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit,
                               QPushButton, QComboBox, QListWidget, QDateEdit, QTableView, QCheckBox, QGroupBox,
                               QMessageBox, QFileDialog, QAbstractItemView, QProgressBar, QSystemTrayIcon, QMenu,
                               QAction, QListWidgetItem)
 from PySide6.QtCore import Qt, QTimer, QThread, Signal, QSettings, QDate, QTime
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QIcon
-import pyadomd
+from PySide6.QtGui import QIcon
+if os.environ.get('PROXYCUBE_MOCK'):
+    import mock_adomd as pyadomd  # offline runs against a synthetic cube
+else:
+    import pyadomd
+from sinks import SQLiteSink, ExcelSink, open_sink
+from parallel import ParallelExtractor, extraction_mdx
+from incremental import IncrementalStore
+from local_engine import LocalCubeEngine
+from router import HybridRouter
+from metadata_cache import MetadataCache
+from table_model import ColumnarTableModel
+
+PREVIEW_BATCH = 1000
 
 class CubeConnection:
-    def __init__(self, server, database):
+    def __init__(self, server, database, metadata_cache=None):
         self.connection_string = f"Provider=MSOLAP;Data Source={server};Initial Catalog={database};Integrated Security=SSPI;"
         self.conn = None
         self.server = server
         self.database = database
+        # Optional MetadataCache so reopening a cube does not re-run the schema rowsets
+        self.metadata_cache = metadata_cache
 
     def connect(self):
         try:
@@ -51,7 +64,21 @@ class CubeConnection:
             print(f"Metadata error: {e}")
             return []
 
-    def get_columns(self, cube_name):
+    def get_columns(self, cube_name, refresh=False):
+        if self.metadata_cache is None:
+            return self._query_columns(cube_name)
+        key = MetadataCache.key(self.server, self.database, cube_name)
+        if not refresh:
+            columns = self.metadata_cache.lookup(key, 'columns')
+            if columns:
+                return columns
+        columns = self._query_columns(cube_name)
+        if columns:
+            # _query_columns reports errors as an empty list; never cache that
+            self.metadata_cache.store(key, 'columns', columns)
+        return columns
+
+    def _query_columns(self, cube_name):
         if not self.conn:
             return []
         try:
@@ -101,10 +128,12 @@ class CubeConnection:
 
 class ExtractionThread(QThread):
     update_progress = Signal(int, str)
+    slice_progress = Signal(dict)
     finished = Signal()
     error = Signal(str)
 
-    def __init__(self, server, database, cube_name, columns, start_date, end_date, db_path):
+    def __init__(self, server, database, cube_name, columns, start_date, end_date, db_path,
+                 sink=None, chunk_size=50000, grain=None, workers=4, resume=False):
         super().__init__()
         self.server = server
         self.database = database
@@ -113,64 +142,199 @@ class ExtractionThread(QThread):
         self.start_date = start_date
         self.end_date = end_date
         self.db_path = db_path
+        # SQLite, CSV or Parquet; chosen from the output file extension when not given
+        self.sink = sink
+        self.chunk_size = chunk_size
+        # 'day', 'week' or 'month' splits the range into slices extracted in parallel
+        self.grain = grain
+        self.workers = workers
+        # Continue from the slices an earlier, interrupted run into db_path checkpointed
+        self.resume = resume
         self._is_running = True
 
     def stop(self):
         self._is_running = False
 
+    def connect_cube(self):
+        cube_conn = CubeConnection(self.server, self.database)
+        if not cube_conn.connect():
+            raise Exception("Failed to connect to cube")
+        return cube_conn
+
     def run(self):
         try:
-            # Create SQLite connection
-            sqlite_conn = sqlite3.connect(self.db_path)
-            cursor = sqlite_conn.cursor()
-            
-            # Create table with sanitized column names
-            safe_columns = [f'"{col.replace(".", "_").replace(" ", "_")}"' for col in self.columns]
-            create_table = f"CREATE TABLE IF NOT EXISTS CubeData ({', '.join([f'{col} TEXT' for col in safe_columns])})"
-            cursor.execute(create_table)
-            sqlite_conn.commit()
-            
+            if self.sink is None:
+                self.sink = open_sink(self.db_path)
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        # SQLite output is always loaded slice by slice so it can be checkpointed and resumed
+        if self.grain or isinstance(self.sink, SQLiteSink):
+            self.run_sliced()
+            return
+        cube_conn = None
+        try:
             # Create cube connection
-            cube_conn = CubeConnection(self.server, self.database)
-            if not cube_conn.connect():
-                raise Exception("Failed to connect to cube")
+            cube_conn = self.connect_cube()
             
             # Generate MDX query
-            mdx_columns = ", ".join([f"[{col}]" for col in self.columns])
-            date_condition = f"[Date].[Date].&[{self.start_date}] : [Date].[Date].&[{self.end_date}]"
-            mdx = f"""
-                SELECT {{ {mdx_columns} }} ON COLUMNS, 
-                NON EMPTY {{ {date_condition} }} ON ROWS 
-                FROM [{self.cube_name}]
-            """
+            mdx = extraction_mdx(self.cube_name, self.columns, self.start_date, self.end_date)
             
             # Execute query
             cube_cursor = cube_conn.conn.cursor()
             cube_cursor.execute(mdx)
             
-            # Process data in chunks
-            chunk_size = 5000
+            # The result also carries the row-axis (date) columns, so take names from the cursor
+            sink = self.sink
+            sink.open([col[0] for col in cube_cursor.description])
             total_rows = 0
-            placeholders = ", ".join(["?"] * len(self.columns))
-            insert_sql = f"INSERT INTO CubeData VALUES ({placeholders})"
-            
-            while self._is_running:
-                rows = cube_cursor.fetchmany(chunk_size)
-                if not rows:
-                    break
-                
-                # Insert into SQLite
-                cursor.executemany(insert_sql, rows)
-                sqlite_conn.commit()
-                
-                total_rows += len(rows)
-                self.update_progress.emit(total_rows, f"Extracted {total_rows} rows")
+            try:
+                while self._is_running:
+                    rows = cube_cursor.fetchmany(self.chunk_size)
+                    if not rows:
+                        break
+                    
+                    # Hand the sink columns, not rows
+                    sink.write_batch(list(zip(*rows)))
+                    
+                    total_rows += len(rows)
+                    self.update_progress.emit(total_rows, f"Extracted {total_rows} rows")
+            finally:
+                sink.close()
             
-            sqlite_conn.close()
-            cube_conn.disconnect()
             self.finished.emit()
         except Exception as e:
             self.error.emit(str(e))
+        finally:
+            if cube_conn:
+                cube_conn.disconnect()
+
+    def run_sliced(self):
+        try:
+            sink = self.sink
+            if isinstance(sink, SQLiteSink) and not sink.slice_column:
+                sink.slice_column = '_slice'  # lets a slice that failed halfway be retried
+            extractor = ParallelExtractor(
+                self.connect_cube, self.cube_name, self.columns, self.start_date, self.end_date,
+                sink, grain=self.grain or 'month', workers=self.workers if self.grain else 1,
+                chunk_size=self.chunk_size, progress=self.report_slice,
+                should_stop=lambda: not self._is_running, resume=self.resume
+            )
+            try:
+                extractor.run()
+                if not self._is_running and isinstance(sink, SQLiteSink) and sink.conn:
+                    # Stopped: drop the half-written slices so a resumed run redoes them
+                    sink.discard_incomplete()
+            finally:
+                sink.close()
+            if not self._is_running:
+                return  # stop_extraction() already reset the UI; nothing to verify
+            if isinstance(sink, SQLiteSink):
+                mismatches = sink.verify()
+                if mismatches:
+                    details = ', '.join(f"{key}: {expected} expected, {stored} stored"
+                                        for key, expected, stored in mismatches[:5])
+                    raise Exception(f"Row count check failed for {len(mismatches)} slices ({details})")
+            self.finished.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def report_slice(self, event):
+        message = (f"Slice {event['slice']} {event['status']} - {event['slices_done']}/"
+                   f"{event['slices_total']} slices, {event['total_rows']} rows")
+        if event['error']:
+            message += f" ({event['error']})"
+        self.update_progress.emit(event['total_rows'], message)
+        self.slice_progress.emit(event)
+
+class IncrementalExtractionThread(ExtractionThread):
+    """Refresh the persistent store with new or changed slices instead of writing a new file."""
+
+    def __init__(self, store, start_date, end_date, snapshot_dir=None, workers=4):
+        super().__init__(store.server, store.database, store.cube_name, store.columns,
+                         start_date, end_date, store.path, grain=store.grain, workers=workers)
+        self.store = store
+        self.snapshot_dir = snapshot_dir
+
+    def run(self):
+        try:
+            summary = self.store.refresh(
+                self.connect_cube, self.start_date, self.end_date, workers=self.workers,
+                progress=self.report_slice, should_stop=lambda: not self._is_running
+            )
+            self.store.compact(self.snapshot_dir)
+            if summary['rows'] or summary['extracted']:
+                # Keep the local engine's rollups in step with the refreshed store
+                engine = LocalCubeEngine(self.store.path)
+                try:
+                    engine.build_rollups()
+                finally:
+                    engine.close()
+            self.update_progress.emit(
+                summary['rows'],
+                f"{summary['extracted']} of {summary['slices']} slices new or changed, "
+                f"{summary['rows']} rows loaded into {summary['path']}"
+            )
+            self.finished.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+
+class ExcelExportThread(ExtractionThread):
+    """Stream the store's rows for a date range into an .xlsx file.
+
+    Slices missing from the store are fetched first (see HybridRouter);
+    the rows are then read back in chunks and appended to a write-only
+    workbook, so neither side holds the whole result in memory.
+    """
+    export_progress = Signal(int, int, str)
+
+    def __init__(self, store, start_date, end_date, excel_path, chunk_size=50000):
+        super().__init__(store.server, store.database, store.cube_name, store.columns,
+                         start_date, end_date, excel_path, chunk_size=chunk_size)
+        self.store = store
+        self.rows_written = 0
+        self.sheets = 0
+
+    def run(self):
+        cube_conn = None
+        try:
+            router = HybridRouter(self.store, None)
+            if router.coverage(self.start_date, self.end_date)[1]:
+                router.cube_conn = cube_conn = self.connect_cube()
+            columns, total, chunks = router.stream(
+                self.start_date, self.end_date, self.chunk_size,
+                progress=lambda done, count, key, rows: self.export_progress.emit(
+                    0, 0, f"Fetched slice {key} ({done}/{count}, {rows} rows)"),
+                should_stop=lambda: not self._is_running
+            )
+            if not self._is_running:
+                return
+            if not total:
+                raise Exception("No data returned from cube")
+
+            sink = ExcelSink(self.db_path)
+            sink.open(columns)
+            try:
+                for rows in chunks:
+                    if not self._is_running:
+                        break
+                    sink.write_rows(rows)
+                    self.export_progress.emit(sink.rows_written, total,
+                                              f"Exported {sink.rows_written} of {total} rows")
+            finally:
+                chunks.close()
+            if not self._is_running:
+                return  # the workbook is only written on save, so a cancelled export leaves no file
+            self.export_progress.emit(sink.rows_written, total, "Saving workbook...")
+            sink.close()
+            self.rows_written = sink.rows_written
+            self.sheets = sink.sheets
+            self.finished.emit()
+        except Exception as e:
+            self.error.emit(str(e))
+        finally:
+            if cube_conn:
+                cube_conn.disconnect()
 
 class CubeExtractorApp(QMainWindow):
     def __init__(self):
@@ -183,6 +347,7 @@ class CubeExtractorApp(QMainWindow):
         
         # Cube connection
         self.cube_conn = None
+        self.metadata_cache = MetadataCache()
         self.extraction_thread = None
         self.connection_timer = QTimer()
         self.connection_timer.timeout.connect(self.check_connection)
@@ -240,6 +405,10 @@ class CubeExtractorApp(QMainWindow):
         self.cube_combo.setMinimumWidth(200)
         self.cube_combo.currentIndexChanged.connect(self.load_cube_columns)
         cube_layout.addWidget(self.cube_combo, 1)
+        self.refresh_columns_btn = QPushButton("Refresh Columns")
+        self.refresh_columns_btn.setToolTip("Reload the cube's columns from the server instead of the metadata cache")
+        self.refresh_columns_btn.clicked.connect(lambda: self.load_cube_columns(refresh=True))
+        cube_layout.addWidget(self.refresh_columns_btn)
         main_layout.addLayout(cube_layout)
         
         # Column Selection
@@ -274,6 +443,11 @@ class CubeExtractorApp(QMainWindow):
         self.end_date.setDate(QDate.currentDate())
         date_layout.addWidget(self.end_date)
         
+        date_layout.addWidget(QLabel("Parallel Slices:"))
+        self.grain_combo = QComboBox()
+        self.grain_combo.addItems(["None", "Day", "Week", "Month"])
+        date_layout.addWidget(self.grain_combo)
+        
         date_group.setLayout(date_layout)
         main_layout.addWidget(date_group)
         
@@ -282,13 +456,16 @@ class CubeExtractorApp(QMainWindow):
         preview_layout = QVBoxLayout()
         
         preview_btn_layout = QHBoxLayout()
-        self.preview_btn = QPushButton("Preview Data (First 10 Rows)")
+        self.preview_btn = QPushButton("Preview Data")
         self.preview_btn.clicked.connect(self.preview_data)
         preview_btn_layout.addWidget(self.preview_btn)
         
         self.skip_preview_check = QCheckBox("Skip preview if connection fails")
         self.skip_preview_check.setChecked(True)
         preview_btn_layout.addWidget(self.skip_preview_check)
+        
+        self.local_preview_check = QCheckBox("Summarize from local store")
+        preview_btn_layout.addWidget(self.local_preview_check)
         preview_layout.addLayout(preview_btn_layout)
         
         self.preview_table = QTableView()
@@ -347,6 +524,16 @@ class CubeExtractorApp(QMainWindow):
         time_layout.addWidget(self.time_combo)
         sched_layout.addLayout(time_layout)
         
+        self.incremental_check = QCheckBox("Incremental: only extract new or changed slices into one store")
+        sched_layout.addWidget(self.incremental_check)
+        
+        store_layout = QHBoxLayout()
+        store_layout.addWidget(QLabel("Store Folder:"))
+        self.store_input = QLineEdit()
+        self.store_input.setText(os.path.join(os.getcwd(), "cube_store"))
+        store_layout.addWidget(self.store_input)
+        sched_layout.addLayout(store_layout)
+        
         sched_group.setLayout(sched_layout)
         main_layout.addWidget(sched_group)
         
@@ -390,6 +577,9 @@ class CubeExtractorApp(QMainWindow):
         # Load scheduling settings
         self.sched_check.setChecked(self.settings.value("scheduling_enabled", False, type=bool))
         self.time_combo.setCurrentText(self.settings.value("extraction_time", "02:00"))
+        self.grain_combo.setCurrentText(self.settings.value("slice_grain", "None"))
+        self.incremental_check.setChecked(self.settings.value("incremental", False, type=bool))
+        self.store_input.setText(self.settings.value("store_dir", self.store_input.text()))
         
         # Load date range
         start_date = self.settings.value("start_date")
@@ -407,6 +597,9 @@ class CubeExtractorApp(QMainWindow):
         # Save scheduling settings
         self.settings.setValue("scheduling_enabled", self.sched_check.isChecked())
         self.settings.setValue("extraction_time", self.time_combo.currentText())
+        self.settings.setValue("slice_grain", self.grain_combo.currentText())
+        self.settings.setValue("incremental", self.incremental_check.isChecked())
+        self.settings.setValue("store_dir", self.store_input.text())
         
         # Save date range
         self.settings.setValue("start_date", self.start_date.date().toString(Qt.ISODate))
@@ -423,7 +616,7 @@ class CubeExtractorApp(QMainWindow):
         if not self.cube_conn or self.cube_conn.server != server or self.cube_conn.database != database:
             if self.cube_conn:
                 self.cube_conn.disconnect()
-            self.cube_conn = CubeConnection(server, database)
+            self.cube_conn = CubeConnection(server, database, self.metadata_cache)
         
         self.status_bar.showMessage("Connecting to cube...")
         QApplication.processEvents()
@@ -461,7 +654,7 @@ class CubeExtractorApp(QMainWindow):
         else:
             self.status_bar.showMessage(f"Retry failed at {datetime.now().strftime('%H:%M')}, will try again in 15 min")
 
-    def load_cube_columns(self):
+    def load_cube_columns(self, index=None, refresh=False):
         if not self.cube_conn or not self.cube_conn.conn:
             return
         
@@ -470,7 +663,7 @@ class CubeExtractorApp(QMainWindow):
             return
         
         self.column_list.clear()
-        columns = self.cube_conn.get_columns(cube_name)
+        columns = self.cube_conn.get_columns(cube_name, refresh=refresh)
         if columns:
             self.column_list.addItems(columns)
         else:
@@ -493,40 +686,75 @@ class CubeExtractorApp(QMainWindow):
         if not self.validate_selection():
             return
         
-        cube_name = self.cube_combo.currentText()
-        selected_cols = [item.text() for item in self.column_list.selectedItems()]
+        if self.local_preview_check.isChecked():
+            self.preview_local()
+            return
+        
         start_date = self.start_date.date().toString("yyyyMMdd")
         end_date = self.end_date.date().toString("yyyyMMdd")
         
-        # Generate MDX query
-        mdx_columns = ", ".join([f"[{col}]" for col in selected_cols])
-        date_condition = f"[Date].[Date].&[{start_date}] : [Date].[Date].&[{end_date}]"
-        mdx = f"""
-            SELECT TOP 10 {{ {mdx_columns} }} ON COLUMNS, 
-            NON EMPTY {{ {date_condition} }} ON ROWS 
-            FROM [{cube_name}]
-        """
-        
         try:
-            # Execute query
-            columns, data = self.cube_conn.execute_query(mdx)
-            
-            # Display in table
-            model = QStandardItemModel()
-            model.setHorizontalHeaderLabels(columns)
-            
-            for row in data:
-                items = [QStandardItem(str(item)) for item in row]
-                model.appendRow(items)
+            # Served from the local store; the cube is only asked for slices not on disk yet
+            router = HybridRouter(self.current_store(), self.cube_conn)
+            # Only the first batch has to be on disk; scrolling reads further stored rows batch by batch
+            router.fetch(start_date, end_date, limit=PREVIEW_BATCH)
+            columns, total, chunks = router.stream(start_date, end_date, chunk_size=PREVIEW_BATCH,
+                                                   fetch_missing=False)
             
-            self.preview_table.setModel(model)
-            self.preview_table.resizeColumnsToContents()
-            self.status_bar.showMessage(f"Preview loaded: {len(data)} rows")
+            model = ColumnarTableModel(columns, chunks, total, PREVIEW_BATCH)
+            note = f"{len(router.fetched)} slices fetched from the cube"
+            _, missing = router.coverage(start_date, end_date)
+            if missing:
+                # The row total counts stored rows, so say the preview is partial
+                note += f"; partial: stored data only, {len(missing)} more slices not fetched yet"
+            self.set_preview_model(model, note)
         except Exception as e:
             if not self.skip_preview_check.isChecked():
                 QMessageBox.warning(self, "Preview Error", f"Failed to load preview: {str(e)}")
             self.status_bar.showMessage(f"Preview failed: {str(e)}")
 
+    def preview_local(self):
+        # Measures summed by every stored attribute, per period of the slice grain; never touches the cube
+        grain = self.grain_combo.currentText().lower()
+        # Look the store up without creating it; a preview must not leave an empty store behind
+        path = IncrementalStore.store_path(*self.current_store_source())
+        try:
+            if not os.path.exists(path):
+                raise ValueError(path)
+            engine = LocalCubeEngine(path)
+        except ValueError:
+            QMessageBox.information(self, "Local Store",
+                                    "No local data for this selection yet. Run an incremental extraction first.")
+            return
+        try:
+            started = datetime.now()
+            columns, data = engine.query(
+                by=engine.dimensions,
+                start_date=self.start_date.date().toString("yyyyMMdd"),
+                end_date=self.end_date.date().toString("yyyyMMdd"),
+                grain="month" if grain == "none" else grain,
+                limit=1000
+            )
+            elapsed = (datetime.now() - started).total_seconds() * 1000
+        finally:
+            engine.close()
+        
+        model = ColumnarTableModel(columns, iter([data]), len(data), PREVIEW_BATCH)
+        self.set_preview_model(model, f"local summary in {elapsed:.0f} ms")
+
+    def set_preview_model(self, model, note):
+        old_model = self.preview_table.model()
+        model.fetchMore()
+        self.preview_table.setModel(model)
+        if isinstance(old_model, ColumnarTableModel):
+            old_model.close()
+        self.preview_table.resizeColumnsToContents()
+        
+        def show_status():
+            self.status_bar.showMessage(f"Preview: {model.loaded_rows:,} of {model.total:,} rows loaded, {note}")
+        model.rowsInserted.connect(show_status)
+        show_status()
+
     def validate_selection(self):
         if not self.cube_conn or not self.cube_conn.conn:
             QMessageBox.warning(self, "Connection Error", "Not connected to cube")
@@ -550,16 +778,38 @@ class CubeExtractorApp(QMainWindow):
         if not self.validate_selection():
             return
         
+        if self.incremental_check.isChecked():
+            self.start_incremental_extraction()
+            return
+        
         # Get output path
         default_name = f"{self.cube_combo.currentText()}_{datetime.now().strftime('%Y%m%d_%H%M')}.db"
         db_path, _ = QFileDialog.getSaveFileName(
             self, 
-            "Save SQLite Database", 
+            "Save Extracted Data", 
             os.path.join(os.getcwd(), default_name),
-            "SQLite Databases (*.db)"
+            "SQLite Databases (*.db);;CSV Files (*.csv);;Parquet Files (*.parquet)"
         )
         if not db_path:
             return
+        self.settings.setValue("output_dir", os.path.dirname(db_path))
+        
+        resume = False
+        if db_path.lower().endswith(('.db', '.sqlite')) and SQLiteSink(db_path).completed_slices():
+            answer = QMessageBox.question(
+                self, "Resume Extraction",
+                "This file holds a partial extraction. Resume it?\n\n"
+                "Yes keeps the completed slices and extracts the rest, No starts over.",
+                QMessageBox.Yes | QMessageBox.No | QMessageBox.Cancel
+            )
+            if answer == QMessageBox.Cancel:
+                return
+            resume = answer == QMessageBox.Yes
+        if not resume:
+            # The save dialog already confirmed overwriting; appending would duplicate rows
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
         
         # Get parameters
         server = self.server_input.text().strip()
@@ -568,6 +818,7 @@ class CubeExtractorApp(QMainWindow):
         selected_cols = [item.text() for item in self.column_list.selectedItems()]
         start_date = self.start_date.date().toString("yyyyMMdd")
         end_date = self.end_date.date().toString("yyyyMMdd")
+        grain = self.grain_combo.currentText().lower()
         
         # Setup extraction thread
         self.extraction_thread = ExtractionThread(
@@ -577,11 +828,40 @@ class CubeExtractorApp(QMainWindow):
             selected_cols,
             start_date,
             end_date,
-            db_path
+            db_path,
+            grain=None if grain == "none" else grain,
+            resume=resume
         )
         
+        self.run_extraction_thread()
+
+    def current_store_source(self):
+        """(store_dir, server, database, cube, columns) of the current selection."""
+        return (
+            self.store_input.text().strip(),
+            self.server_input.text().strip(),
+            self.db_input.text().strip(),
+            self.cube_combo.currentText(),
+            [item.text() for item in self.column_list.selectedItems()],
+        )
+
+    def current_store(self):
+        grain = self.grain_combo.currentText().lower()
+        return IncrementalStore(*self.current_store_source(), grain="month" if grain == "none" else grain)
+
+    def start_incremental_extraction(self):
+        self.extraction_thread = IncrementalExtractionThread(
+            self.current_store(),
+            self.start_date.date().toString("yyyyMMdd"),
+            self.end_date.date().toString("yyyyMMdd"),
+            snapshot_dir=self.settings.value("output_dir")
+        )
+        self.run_extraction_thread()
+
+    def run_extraction_thread(self):
         # Connect signals
         self.extraction_thread.update_progress.connect(self.update_progress)
+        self.extraction_thread.slice_progress.connect(self.update_slice_progress)
         self.extraction_thread.finished.connect(self.extraction_finished)
         self.extraction_thread.error.connect(self.show_extraction_error)
         
@@ -600,10 +880,21 @@ class CubeExtractorApp(QMainWindow):
         if self.extraction_thread and self.extraction_thread.isRunning():
             self.extraction_thread.stop()
             self.extraction_thread.wait()
+            self.extract_btn.setEnabled(True)
+            self.stop_btn.setEnabled(False)
+            self.export_btn.setEnabled(True)
             self.progress_label.setText("Extraction stopped by user")
             self.status_bar.showMessage("Extraction stopped")
 
     def extraction_finished(self):
+        thread = self.extraction_thread
+        if type(thread) is ExtractionThread and thread.db_path.lower().endswith('.db'):
+            # A full extract next to an existing store becomes one of the snapshots compact() rotates
+            store_dir = self.store_input.text().strip()
+            if os.path.exists(IncrementalStore.store_path(store_dir, thread.server, thread.database,
+                                                          thread.cube_name, thread.columns)):
+                IncrementalStore(store_dir, thread.server, thread.database, thread.cube_name,
+                                 thread.columns).record_snapshot(thread.db_path)
         self.extract_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
         self.export_btn.setEnabled(True)
@@ -617,6 +908,10 @@ class CubeExtractorApp(QMainWindow):
         self.progress_bar.setValue(progress)
         self.progress_label.setText(message)
 
+    def update_slice_progress(self, event):
+        # Sliced runs know their size up front, so show real progress
+        self.progress_bar.setValue(event['slices_done'] * 100 // max(1, event['slices_total']))
+
     def show_extraction_error(self, message):
         QMessageBox.critical(self, "Extraction Error", message)
         self.extract_btn.setEnabled(True)
@@ -641,38 +936,45 @@ class CubeExtractorApp(QMainWindow):
             return
         
         # Get parameters
-        cube_name = self.cube_combo.currentText()
-        selected_cols = [item.text() for item in self.column_list.selectedItems()]
         start_date = self.start_date.date().toString("yyyyMMdd")
         end_date = self.end_date.date().toString("yyyyMMdd")
         
-        # Generate MDX query
-        mdx_columns = ", ".join([f"[{col}]" for col in selected_cols])
-        date_condition = f"[Date].[Date].&[{start_date}] : [Date].[Date].&[{end_date}]"
-        mdx = f"""
-            SELECT {{ {mdx_columns} }} ON COLUMNS, 
-            NON EMPTY {{ {date_condition} }} ON ROWS 
-            FROM [{cube_name}]
-        """
-        
-        try:
-            # Execute query
-            columns, data = self.cube_conn.execute_query(mdx)
-            
-            if not data:
-                QMessageBox.warning(self, "Export Error", "No data returned from cube")
-                return
-            
-            # Create DataFrame
-            df = pd.DataFrame(data, columns=columns)
-            
-            # Save to Excel
-            df.to_excel(excel_path, index=False)
-            QMessageBox.information(self, "Success", f"Data exported to {excel_path}")
-            self.status_bar.showMessage(f"Data exported to {excel_path}")
-        except Exception as e:
-            QMessageBox.critical(self, "Export Error", str(e))
-            self.status_bar.showMessage(f"Export failed: {str(e)}")
+        self.extraction_thread = ExcelExportThread(self.current_store(), start_date, end_date, excel_path)
+        self.extraction_thread.export_progress.connect(self.update_export_progress)
+        self.extraction_thread.finished.connect(self.export_finished)
+        self.extraction_thread.error.connect(self.show_export_error)
+
+        self.extract_btn.setEnabled(False)
+        self.stop_btn.setEnabled(True)
+        self.export_btn.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.progress_label.setText("Starting export...")
+        self.extraction_thread.start()
+        self.status_bar.showMessage(f"Exporting to {excel_path}")
+
+    def update_export_progress(self, rows, total, message):
+        if total:
+            self.progress_bar.setValue(rows * 100 // total)
+        self.progress_label.setText(message)
+
+    def export_finished(self):
+        thread = self.extraction_thread
+        self.extract_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.export_btn.setEnabled(True)
+        sheets = f" on {thread.sheets} sheets" if thread.sheets > 1 else ""
+        message = f"Exported {thread.rows_written} rows{sheets} to {thread.db_path}"
+        self.progress_label.setText(message)
+        self.status_bar.showMessage(message)
+        QMessageBox.information(self, "Success", message)
+
+    def show_export_error(self, message):
+        QMessageBox.critical(self, "Export Error", message)
+        self.extract_btn.setEnabled(True)
+        self.stop_btn.setEnabled(False)
+        self.export_btn.setEnabled(True)
+        self.progress_label.setText("Export failed")
+        self.status_bar.showMessage(f"Export failed: {message}")
 
     def check_schedule(self):
         if not self.sched_check.isChecked():
@@ -1,14 +1,20 @@
 import sys
 import sqlite3
 from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, 
-                               QMessageBox, QTextEdit, QLabel, QMessageBox)
+                               QMessageBox, QTextEdit, QLabel, QMessageBox,
+                               QInputDialog)
 from PySide6.QtCore import Qt
+from survey_cycles import SurveyCycleManager
+from snapshots import SnapshotManager
+
+DATABASES = ['hierarchy.db', 'feedback.db', 'attendance.db']
 
 class DatabaseResetApp(QWidget):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Database Reset Manager")
         self.setGeometry(100, 100, 600, 400)
+        self.snapshots = SnapshotManager()
         self.init_ui()
         
     def init_ui(self):
@@ -20,7 +26,7 @@ class DatabaseResetApp(QWidget):
         info_label.setStyleSheet("font-size: 16px; font-weight: bold; margin-bottom: 20px;")
         
         # Buttons
-        self.btn_feedback = QPushButton("Reset Feedback & Attendance Data")
+        self.btn_feedback = QPushButton("Start New Survey Cycle (Archive Previous)")
         self.btn_feedback.setStyleSheet("QPushButton { background-color: #FFA500; padding: 10px; }")
         self.btn_feedback.clicked.connect(self.reset_feedback_attendance)
         
@@ -31,6 +37,10 @@ class DatabaseResetApp(QWidget):
         self.btn_total = QPushButton("Total Reset (Full System Reset)")
         self.btn_total.setStyleSheet("QPushButton { background-color: #DC143C; padding: 10px; }")
         self.btn_total.clicked.connect(self.total_reset)
+
+        self.btn_restore = QPushButton("Restore From Snapshot")
+        self.btn_restore.setStyleSheet("QPushButton { background-color: #4682B4; padding: 10px; }")
+        self.btn_restore.clicked.connect(self.restore_snapshot)
         
         # Status display
         self.status_area = QTextEdit()
@@ -41,6 +51,7 @@ class DatabaseResetApp(QWidget):
         layout.addWidget(self.btn_feedback)
         layout.addWidget(self.btn_users)
         layout.addWidget(self.btn_total)
+        layout.addWidget(self.btn_restore)
         layout.addWidget(QLabel("Operation Log:"))
         layout.addWidget(self.status_area)
         
@@ -53,39 +64,80 @@ class DatabaseResetApp(QWidget):
         reply = QMessageBox.question(
             self,
             'Confirm Reset',
-            f"{message}\nThis operation cannot be undone!",
+            f"{message}\nA snapshot is taken first; use 'Restore From Snapshot' to undo.",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         return reply == QMessageBox.StandardButton.Yes
 
+    def take_snapshot(self, label):
+        """Back up all databases before a destructive operation; False aborts it."""
+        try:
+            snapshot_id = self.snapshots.take(DATABASES, label=label)
+            self.log_message(f"Snapshot {snapshot_id} saved")
+            return True
+        except Exception as e:
+            self.log_message(f"Snapshot failed: {str(e)}")
+            QMessageBox.critical(self, "Error", f"Snapshot failed, nothing was reset: {str(e)}")
+            return False
+
+    def restore_snapshot(self):
+        snapshots = self.snapshots.list_snapshots()
+        if not snapshots:
+            QMessageBox.information(self, "Restore", "No snapshots available.")
+            return
+        snapshot_id, ok = QInputDialog.getItem(
+            self, 'Restore Snapshot', 'Snapshot:', [m['id'] for m in snapshots], 0, False
+        )
+        if not ok or not self.confirm_reset(f"Overwrite the live databases with snapshot {snapshot_id}?"):
+            return
+        if not self.take_snapshot('before-restore'):
+            return
+
+        try:
+            for path in self.snapshots.restore(snapshot_id):
+                self.log_message(f"Restored {path}")
+            QMessageBox.information(self, "Success", f"Snapshot {snapshot_id} restored!")
+        except Exception as e:
+            self.log_message(f"Error: {str(e)}")
+            QMessageBox.critical(self, "Error", f"Restore failed: {str(e)}")
+
     def reset_feedback_attendance(self):
-        if not self.confirm_reset("Clear all feedback responses and attendance records?"):
+        cycles = SurveyCycleManager()
+        new_period, ok = QInputDialog.getText(
+            self, 'New Survey Cycle', 'Cycle label:',
+            text=cycles.next_period()
+        )
+        if not ok or not new_period.strip():
+            return
+        if cycles.cycle_exists(new_period.strip()):
+            # Checked before the snapshot, so a rejected label leaves nothing behind
+            QMessageBox.warning(self, "New Survey Cycle", f"Survey cycle '{new_period.strip()}' already exists.")
+            return
+        if not self.confirm_reset(f"Close the current survey cycle and open '{new_period.strip()}'?\n"
+                                  "Previous cycles will be archived and removed from the live databases."):
+            return
+        if not self.take_snapshot('before-new-cycle'):
             return
             
         try:
-            # Reset Feedback Database
-            conn = sqlite3.connect('feedback.db')
-            conn.execute("PRAGMA foreign_keys = OFF")
-            conn.execute("DELETE FROM feedback_responses")
-            conn.commit()
-            conn.close()
-            
-            # Reset Attendance Database
-            conn = sqlite3.connect('attendance.db')
-            conn.execute("DELETE FROM submissions")
-            conn.commit()
-            conn.close()
+            previous = cycles.current_period()
+            opened = cycles.open_cycle(new_period.strip())
+            self.log_message(f"Closed cycle {previous}, opened cycle {opened}")
+
+            for archive_path in cycles.archive_closed_cycles():
+                self.log_message(f"Archived cycle snapshot to {archive_path}")
             
-            self.log_message("Successfully reset Feedback & Attendance data")
-            QMessageBox.information(self, "Success", "Feedback and attendance data cleared!")
+            QMessageBox.information(self, "Success", f"Survey cycle {opened} is now open!")
             
         except Exception as e:
             self.log_message(f"Error: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Reset failed: {str(e)}")
+            QMessageBox.critical(self, "Error", f"Cycle rollover failed: {str(e)}")
 
     def reset_user_data(self):
         if not self.confirm_reset("Reset all user accounts and passwords?"):
             return
+        if not self.take_snapshot('before-user-reset'):
+            return
             
         try:
             # Reset Users in Feedback Database
@@ -111,6 +163,8 @@ class DatabaseResetApp(QWidget):
     def total_reset(self):
         if not self.confirm_reset("COMPLETELY reset ALL databases including hierarchy?"):
             return
+        if not self.take_snapshot('before-total-reset'):
+            return
             
         try:
             # Reset Hierarchy Database
@@ -134,6 +188,7 @@ class DatabaseResetApp(QWidget):
             conn.execute("PRAGMA foreign_keys = OFF")
             conn.execute("DROP TABLE IF EXISTS users")
             conn.execute("DROP TABLE IF EXISTS feedback_responses")
+            conn.execute("DROP TABLE IF EXISTS current_cycle")
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -160,14 +215,13 @@ class DatabaseResetApp(QWidget):
             # Reset Attendance Database
             conn = sqlite3.connect('attendance.db')
             conn.execute("DROP TABLE IF EXISTS submissions")
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS submissions (
-                    username TEXT PRIMARY KEY,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            conn.execute("DROP TABLE IF EXISTS survey_cycles")
+            conn.execute("DROP TABLE IF EXISTS current_cycle")
             conn.commit()
             conn.close()
+
+            # Recreate period-keyed submissions and open a fresh cycle
+            SurveyCycleManager().ensure_schema()
             
             self.log_message("Successfully performed TOTAL SYSTEM RESET")
             QMessageBox.information(self, "Success", "All databases reset to initial state!")
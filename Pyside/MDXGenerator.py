@@ -3,17 +3,41 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QLineEdit, QPushButton, QComboBox, QTreeWidget, QTreeWidgetItem,
                                QListWidget, QTextEdit, QDialog, QMessageBox, QLabel, QDialogButtonBox,QListWidgetItem)
 from PySide6.QtCore import Qt
-import pyadomd
 import sys
 import os
+import re
+import time
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                                QLineEdit, QPushButton, QComboBox, QTreeWidget, QTreeWidgetItem,
                                QListWidget, QTextEdit, QDialog, QMessageBox, QLabel, 
-                               QDialogButtonBox, QCheckBox, QFileDialog, QMenu)
+                               QDialogButtonBox, QCheckBox, QFileDialog, QMenu,
+                               QTableWidget, QTableWidgetItem, QFormLayout, QSpinBox, QDateEdit)
 
-from PySide6.QtCore import Qt, QSize, QCursor
+from PySide6.QtCore import Qt, QSize, QCursor, QDate
+
+# Shared modules (mock ADOMD backend, extraction helpers) live in ProxyCube
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ProxyCube'))
+
+if os.environ.get('PROXYCUBE_MOCK'):
+    from mock_adomd import AdomdConnection, AdomdCommand, AdomdParameter
+else:
+    import pyadomd  # loads the ADOMD client assembly through pythonnet
+    from Microsoft.AnalysisServices.AdomdClient import AdomdConnection, AdomdCommand, AdomdParameter
+
+from metadata_cache import MetadataCache, connection_identity
+from result_cache import ResultCache
+from mdx_plan import build_query, optimize
+from code_templates import render_script, SLICE_GRAINS
+
+# Members are listed this many at a time; "Load more..." fetches the next page
+MEMBER_PAGE_SIZE = 500
+# Rows shown by Run Query
+PREVIEW_ROWS = 1000
+
+def hierarchy_of(expression):
+    """'[dim].[hierarchy]' (lower case) of a member, level or set expression such as '[Date].[Date].&[20240101]'."""
+    return '.'.join(re.findall(r'\[(?:[^\]]|\]\])*\]', expression)[:2]).lower()
 
-from Microsoft.AnalysisServices.AdomdClient import AdomdConnection, AdomdCommand, AdomdParameter
 
 class AxisDialog(QDialog):
     def __init__(self, parent=None):
@@ -34,6 +58,93 @@ class AxisDialog(QDialog):
         buttons.rejected.connect(self.reject)
         self.setLayout(layout)
 
+class ExportOptionsDialog(QDialog):
+    """How the generated script fetches and where it writes."""
+
+    def __init__(self, cube_name, hierarchies, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Python Export Options")
+        layout = QFormLayout()
+
+        self.template_combo = QComboBox()
+        self.template_combo.addItem("Parquet (pyarrow)", "parquet")
+        self.template_combo.addItem("CSV (pandas)", "csv")
+        self.template_combo.addItem("Print to console", "console")
+        self.template_combo.currentIndexChanged.connect(self.update_output_name)
+        layout.addRow("Output:", self.template_combo)
+
+        self.output_edit = QLineEdit()
+        layout.addRow("Output file:", self.output_edit)
+        self.cube_name = cube_name or "cube"
+        self.update_output_name()
+
+        self.chunk_spin = QSpinBox()
+        self.chunk_spin.setRange(1000, 1000000)
+        self.chunk_spin.setSingleStep(10000)
+        self.chunk_spin.setValue(50000)
+        layout.addRow("Rows per chunk:", self.chunk_spin)
+
+        self.slice_check = QCheckBox("Split the query into date slices and run them in parallel")
+        layout.addRow(self.slice_check)
+
+        # Slices are key ranges, so this should be a level keyed by yyyymmdd
+        self.date_combo = QComboBox()
+        self.date_combo.setEditable(True)
+        self.date_combo.addItems(hierarchies)
+        dates = [h for h in hierarchies if 'date' in h.lower()]
+        self.date_combo.setCurrentText(dates[0] if dates else "[Date].[Date]")
+        layout.addRow("Date hierarchy:", self.date_combo)
+
+        self.start_edit = QDateEdit(QDate(QDate.currentDate().year(), 1, 1))
+        self.end_edit = QDateEdit(QDate.currentDate())
+        for edit in (self.start_edit, self.end_edit):
+            edit.setCalendarPopup(True)
+            edit.setDisplayFormat("yyyy-MM-dd")
+        layout.addRow("From:", self.start_edit)
+        layout.addRow("To:", self.end_edit)
+
+        self.grain_combo = QComboBox()
+        self.grain_combo.addItems([grain.capitalize() for grain in SLICE_GRAINS])
+        self.grain_combo.setCurrentText("Month")
+        layout.addRow("Slice by:", self.grain_combo)
+
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 16)
+        self.workers_spin.setValue(4)
+        layout.addRow("Parallel queries:", self.workers_spin)
+
+        for widget in (self.date_combo, self.start_edit, self.end_edit, self.grain_combo, self.workers_spin):
+            widget.setEnabled(False)
+            self.slice_check.toggled.connect(widget.setEnabled)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
+        buttons.accepted.connect(self.accept)
+        buttons.rejected.connect(self.reject)
+        layout.addRow(buttons)
+        self.setLayout(layout)
+
+    def update_output_name(self):
+        template = self.template_combo.currentData()
+        self.output_edit.setEnabled(template != "console")
+        if template != "console":
+            self.output_edit.setText(f"{self.cube_name}.{template}")
+
+    def options(self):
+        options = {
+            'template': self.template_combo.currentData(),
+            'output': self.output_edit.text().strip(),
+            'chunk_size': self.chunk_spin.value(),
+        }
+        if self.slice_check.isChecked():
+            options.update({
+                'date_level': self.date_combo.currentText().strip(),
+                'start_date': self.start_edit.date().toString("yyyyMMdd"),
+                'end_date': self.end_edit.date().toString("yyyyMMdd"),
+                'grain': self.grain_combo.currentText().lower(),
+                'workers': self.workers_spin.value(),
+            })
+        return options
+
 class CodeDialog(QDialog):
     def __init__(self, code, parent=None):
         super().__init__(parent)
@@ -59,6 +170,44 @@ class CodeDialog(QDialog):
                 f.write(self.code_edit.toPlainText())
             QMessageBox.information(self, "Saved", f"File saved to:\n{path}")
 
+class ResultsDialog(QDialog):
+    def __init__(self, columns, rows, message, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Query Results")
+        self.setMinimumSize(800, 500)
+
+        layout = QVBoxLayout()
+        table = QTableWidget(len(rows), len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                table.setItem(r, c, QTableWidgetItem("" if value is None else str(value)))
+        table.resizeColumnsToContents()
+
+        layout.addWidget(table)
+        layout.addWidget(QLabel(message))
+        self.setLayout(layout)
+
+class PlanDialog(QDialog):
+    """The query as picked next to the optimized one, with what each cost to run."""
+
+    def __init__(self, plans, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Naive vs Optimized")
+        self.setMinimumSize(1000, 600)
+
+        layout = QHBoxLayout()
+        for title, mdx, cost in plans:
+            column = QVBoxLayout()
+            column.addWidget(QLabel(title))
+            text = QTextEdit()
+            text.setPlainText(mdx)
+            text.setReadOnly(True)
+            column.addWidget(text)
+            column.addWidget(QLabel(cost))
+            layout.addLayout(column)
+        self.setLayout(layout)
+
 class MainWindow(QMainWindow):
 
     def __init__(self):
@@ -70,6 +219,7 @@ class MainWindow(QMainWindow):
         self.connection_string = QLineEdit()
         self.connect_btn = QPushButton("Connect")
         self.cube_combo = QComboBox()
+        self.refresh_btn = QPushButton("Refresh Metadata")
         self.metadata_tree = QTreeWidget()
         self.columns_list = QListWidget()
         self.rows_list = QListWidget()
@@ -77,7 +227,12 @@ class MainWindow(QMainWindow):
         self.query_edit = QTextEdit()
         self.non_empty_cols = QCheckBox("Non Empty Columns")
         self.non_empty_rows = QCheckBox("Non Empty Rows")
+        self.optimize_check = QCheckBox("Optimize MDX")
+        self.optimize_check.setChecked(True)
+        self.compare_btn = QPushButton("Compare Plans")
         self.export_btn = QPushButton("Export Python Code")
+        self.run_btn = QPushButton("Run Query")
+        self.clear_cache_btn = QPushButton("Clear Result Cache")
         
         # Layout
         central_widget = QWidget()
@@ -95,7 +250,10 @@ class MainWindow(QMainWindow):
         # Left Panel
         left_layout = QVBoxLayout()
         left_layout.addWidget(QLabel("Cubes:"))
-        left_layout.addWidget(self.cube_combo)
+        cube_layout = QHBoxLayout()
+        cube_layout.addWidget(self.cube_combo, 1)
+        cube_layout.addWidget(self.refresh_btn)
+        left_layout.addLayout(cube_layout)
         left_layout.addWidget(QLabel("Metadata:"))
         left_layout.addWidget(self.metadata_tree)
         
@@ -107,6 +265,10 @@ class MainWindow(QMainWindow):
         right_layout.addWidget(QLabel("Rows:"))
         right_layout.addWidget(self.rows_list)
         right_layout.addWidget(self.non_empty_rows)
+        plan_layout = QHBoxLayout()
+        plan_layout.addWidget(self.optimize_check)
+        plan_layout.addWidget(self.compare_btn)
+        right_layout.addLayout(plan_layout)
         right_layout.addWidget(QLabel("Filters:"))
         right_layout.addWidget(self.filters_list)
         
@@ -118,7 +280,11 @@ class MainWindow(QMainWindow):
         main_layout.addLayout(middle_layout)
         main_layout.addWidget(QLabel("Generated MDX Query:"))
         main_layout.addWidget(self.query_edit)
-        main_layout.addWidget(self.export_btn)
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(self.run_btn)
+        button_layout.addWidget(self.clear_cache_btn)
+        button_layout.addWidget(self.export_btn)
+        main_layout.addLayout(button_layout)
         
         central_widget.setLayout(main_layout)
         self.setCentralWidget(central_widget)
@@ -126,13 +292,21 @@ class MainWindow(QMainWindow):
         # Connections
         self.connect_btn.clicked.connect(self.connect_to_olap)
         self.cube_combo.currentTextChanged.connect(self.load_cube_metadata)
+        self.refresh_btn.clicked.connect(self.refresh_metadata)
+        self.metadata_tree.itemExpanded.connect(self.load_tree_children)
         self.metadata_tree.itemDoubleClicked.connect(self.handle_item_double_click)
         self.export_btn.clicked.connect(self.generate_python_code)
+        self.run_btn.clicked.connect(self.run_query)
+        self.clear_cache_btn.clicked.connect(self.clear_result_cache)
         self.non_empty_cols.stateChanged.connect(self.generate_mdx)
         self.non_empty_rows.stateChanged.connect(self.generate_mdx)
+        self.optimize_check.stateChanged.connect(self.generate_mdx)
+        self.compare_btn.clicked.connect(self.compare_plans)
         
         # Initialize
         self.connection = None
+        self.metadata_cache = MetadataCache()
+        self.result_cache = ResultCache()
         self.metadata_tree.setHeaderLabel("Cube Structure")
         
         # Enable drag-drop and context menus
@@ -182,64 +356,60 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to load cubes: {str(e)}")
 
+    def cache_key(self, cube_name):
+        return MetadataCache.key(*connection_identity(self.connection_string.text()), cube_name)
+
+    def read_rowset(self, query):
+        """Run a schema rowset query and return its rows as lists of strings."""
+        if self.connection is None:
+            raise Exception("Not connected")
+        cmd = AdomdCommand(query, self.connection)
+        reader = cmd.ExecuteReader()
+        rows = []
+        try:
+            while reader.Read():
+                rows.append([None if reader.IsDBNull(i) else str(reader.GetValue(i))
+                             for i in range(reader.FieldCount)])
+        finally:
+            reader.Close()
+        return rows
+
     def load_cube_metadata(self, cube_name):
         self.metadata_tree.clear()
         if not cube_name:
             return
 
         try:
+            key = self.cache_key(cube_name)
             # Escape single quotes in cube name
             safe_cube_name = cube_name.replace("'", "''")
 
-            # Load dimensions and hierarchies
-            hier_query = f"""
+            # Dimensions and hierarchies; levels and members load when a node is expanded
+            hierarchies = self.metadata_cache.get(key, 'hierarchies', lambda: self.read_rowset(f"""
             SELECT [DIMENSION_UNIQUE_NAME], [HIERARCHY_UNIQUE_NAME], [HIERARCHY_CAPTION]
             FROM $system.MDSCHEMA_HIERARCHIES
             WHERE CUBE_NAME = '{safe_cube_name}' AND HIERARCHY_ORIGIN = 2
-            """
-            
-            cmd = AdomdCommand(hier_query, self.connection)
-            reader = cmd.ExecuteReader()
+            """))
             dimensions = {}
+            for dim_name, hier_unique_name, hier_caption in hierarchies:
+                if dim_name not in dimensions:
+                    dimensions[dim_name] = QTreeWidgetItem(self.metadata_tree, [dim_name])
 
-            try:
-                while reader.Read():
-                    dim_name = reader.GetString(0)
-                    hier_unique_name = reader.GetString(1)
-                    hier_caption = reader.GetString(2)
-
-                    if dim_name not in dimensions:
-                        dimensions[dim_name] = QTreeWidgetItem(self.metadata_tree, [dim_name])
-                    
-                    hier_item = QTreeWidgetItem(dimensions[dim_name], [hier_caption])
-                    hier_item.setData(0, Qt.UserRole, hier_unique_name)
-                    hier_item.setData(0, Qt.UserRole + 1, "hierarchy")
-            finally:
-                reader.Close()
+                hier_item = QTreeWidgetItem(dimensions[dim_name], [hier_caption])
+                hier_item.setData(0, Qt.UserRole, hier_unique_name)
+                hier_item.setData(0, Qt.UserRole + 1, "hierarchy")
+                hier_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
 
-            # Load measures
-            measures_query = f"""
+            measures = self.metadata_cache.get(key, 'measures', lambda: self.read_rowset(f"""
             SELECT [MEASURE_UNIQUE_NAME], [MEASURE_NAME]
             FROM $system.MDSCHEMA_MEASURES
             WHERE CUBE_NAME = '{safe_cube_name}'
-            """
-            
-            cmd = AdomdCommand(measures_query, self.connection)
-            reader = cmd.ExecuteReader()
+            """))
             measures_item = QTreeWidgetItem(self.metadata_tree, ["Measures"])
-            
-            try:
-                while reader.Read():
-                    measure_unique_name = reader.GetString(0)
-                    measure_name = reader.GetString(1)
-                    
-                    measure_item = QTreeWidgetItem(measures_item, [measure_name])
-                    measure_item.setData(0, Qt.UserRole, measure_unique_name)
-                    measure_item.setData(0, Qt.UserRole + 1, "measure")
-            finally:
-                reader.Close()
-
-            self.metadata_tree.expandAll()
+            for measure_unique_name, measure_name in measures:
+                measure_item = QTreeWidgetItem(measures_item, [measure_name])
+                measure_item.setData(0, Qt.UserRole, measure_unique_name)
+                measure_item.setData(0, Qt.UserRole + 1, "measure")
 
         except Exception as e:
             QMessageBox.critical(
@@ -247,16 +417,101 @@ class MainWindow(QMainWindow):
                 "Metadata Load Error",
                 f"Failed to load cube metadata:\n{str(e)}"
             )
-            
+
+    def refresh_metadata(self):
+        cube_name = self.cube_combo.currentText()
+        if not cube_name:
+            return
+        self.metadata_cache.invalidate(self.cache_key(cube_name))
+        self.load_cube_metadata(cube_name)
+
+    def load_tree_children(self, item):
+        item_type = item.data(0, Qt.UserRole + 1)
+        if item_type not in ("hierarchy", "level") or item.data(0, Qt.UserRole + 2):
+            return
+        item.setData(0, Qt.UserRole + 2, True)
+        try:
+            if item_type == "hierarchy":
+                self.load_levels(item)
+            else:
+                self.load_member_page(item, 0)
+        except Exception as e:
+            # Keep the expand arrow so collapsing and expanding again retries
+            item.setData(0, Qt.UserRole + 2, False)
+            QMessageBox.critical(self, "Metadata Load Error", f"Failed to load members:\n{str(e)}")
+            return
+        if item.childCount() == 0:
+            item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+    def load_levels(self, hier_item):
+        cube_name = self.cube_combo.currentText()
+        hier_unique_name = hier_item.data(0, Qt.UserRole)
+        safe_cube_name = cube_name.replace("'", "''")
+        safe_hierarchy = hier_unique_name.replace("'", "''")
+        levels = self.metadata_cache.get(
+            self.cache_key(cube_name), f"levels:{hier_unique_name}",
+            lambda: self.read_rowset(f"""
+            SELECT [LEVEL_UNIQUE_NAME], [LEVEL_NAME], [LEVEL_CARDINALITY]
+            FROM $system.MDSCHEMA_LEVELS
+            WHERE CUBE_NAME = '{safe_cube_name}' AND HIERARCHY_UNIQUE_NAME = '{safe_hierarchy}'
+            """))
+        for level_unique_name, level_name, cardinality in levels:
+            label = f"{level_name} ({cardinality})" if cardinality else level_name
+            level_item = QTreeWidgetItem(hier_item, [label])
+            level_item.setData(0, Qt.UserRole, level_unique_name)
+            level_item.setData(0, Qt.UserRole + 1, "level")
+            level_item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+
+    def load_member_page(self, level_item, page):
+        """Add one page of the level's members, plus a "Load more..." item if there are more."""
+        cube_name = self.cube_combo.currentText()
+        level_unique_name = level_item.data(0, Qt.UserRole)
+        hier_unique_name = level_item.parent().data(0, Qt.UserRole)
+
+        def fetch_page():
+            # The server cuts the page out with Subset, so page N costs one page, not N;
+            # one extra member tells whether another page follows
+            rows = self.read_rowset(f"""
+            WITH MEMBER [Measures].[_UniqueName] AS {hier_unique_name}.CurrentMember.UniqueName
+            MEMBER [Measures].[_Caption] AS {hier_unique_name}.CurrentMember.Member_Caption
+            SELECT {{ [Measures].[_UniqueName], [Measures].[_Caption] }} ON COLUMNS,
+            SUBSET({level_unique_name}.Members, {page * MEMBER_PAGE_SIZE}, {MEMBER_PAGE_SIZE + 1}) ON ROWS
+            FROM [{cube_name.replace(']', ']]')}]
+            """)
+            # The row axis columns come first; the two calculated members are last
+            members = [row[-2:] for row in rows]
+            return {'members': members[:MEMBER_PAGE_SIZE], 'more': len(members) > MEMBER_PAGE_SIZE}
+
+        result = self.metadata_cache.get(
+            self.cache_key(cube_name), f"members:{level_unique_name}:{page}", fetch_page)
+        for member_unique_name, member_caption in result['members']:
+            member_item = QTreeWidgetItem(level_item, [member_caption or member_unique_name])
+            member_item.setData(0, Qt.UserRole, member_unique_name)
+            member_item.setData(0, Qt.UserRole + 1, "member")
+        if result['more']:
+            more_item = QTreeWidgetItem(level_item, ["Load more..."])
+            more_item.setData(0, Qt.UserRole + 1, "more")
+            more_item.setData(0, Qt.UserRole + 2, page + 1)
+
     def handle_item_double_click(self, item):
         unique_name = item.data(0, Qt.UserRole)
         item_type = item.data(0, Qt.UserRole+1)
         
+        if item_type == "more":
+            level_item = item.parent()
+            level_item.removeChild(item)
+            try:
+                self.load_member_page(level_item, item.data(0, Qt.UserRole + 2))
+            except Exception as e:
+                level_item.addChild(item)
+                QMessageBox.critical(self, "Metadata Load Error", f"Failed to load members:\n{str(e)}")
+            return
+
         if not unique_name:
             return
         
         # Generate MDX expression based on item type
-        if item_type == "hierarchy":
+        if item_type in ("hierarchy", "level"):
             mdx_expression = f"{unique_name}.Members"
         else:
             mdx_expression = unique_name
@@ -275,77 +530,136 @@ class MainWindow(QMainWindow):
             target_list.addItem(list_item)
             self.generate_mdx()
    
+    def build_plan(self):
+        """The picked items as a naive query (mdx_plan.build_query)."""
+        return build_query(
+            self.cube_combo.currentText(),
+            [self.columns_list.item(i).data(Qt.UserRole) for i in range(self.columns_list.count())],
+            [self.rows_list.item(i).data(Qt.UserRole) for i in range(self.rows_list.count())],
+            [self.filters_list.item(i).data(Qt.UserRole) for i in range(self.filters_list.count())],
+            self.non_empty_cols.isChecked(),
+            self.non_empty_rows.isChecked()
+        )
+
     def generate_mdx(self):
-        cube_name = self.cube_combo.currentText()
-        columns = [self.columns_list.item(i).data(Qt.UserRole) 
-                  for i in range(self.columns_list.count())]
-        rows = [self.rows_list.item(i).data(Qt.UserRole) 
-               for i in range(self.rows_list.count())]
-        filters = [self.filters_list.item(i).data(Qt.UserRole) 
-                  for i in range(self.filters_list.count())]
-
-        select_clauses = []
-        if columns:
-            non_empty = "NON EMPTY " if self.non_empty_cols.isChecked() else ""
-            select_clauses.append(f"{non_empty}{{ {', '.join(columns)} }} ON COLUMNS")
-        if rows:
-            non_empty = "NON EMPTY " if self.non_empty_rows.isChecked() else ""
-            select_clauses.append(f"{non_empty}{{ {', '.join(rows)} }} ON ROWS")
-
-        where_clause = ""
-        if filters:
-            where_clause = f"WHERE ( {', '.join(filters)} )"
-
-        mdx = "SELECT\n    " + ",\n    ".join(select_clauses) + f"\nFROM [{cube_name}]"
-        if where_clause:
-            mdx += "\n" + where_clause
+        query = self.build_plan()
+        if self.optimize_check.isChecked():
+            query = optimize(query)
+        mdx = query.to_mdx()
         
         self.query_edit.setPlainText(mdx)
         return mdx
-    
-    def generate_python_code(self):
-        mdx_query = self.generate_mdx()
-        conn_str = self.connection_string.text()
-        
-        code = f"""# Required DLL setup:
-        # 1. Download Microsoft Analysis Services client libraries
-        # 2. Place these DLLs in your Python environment's DLL search path:
-        #    - Microsoft.AnalysisServices.AdomdClient.dll
-        #    - Microsoft.AnalysisServices.AdomdClient.Xmla.dll
-        #    - Microsoft.AnalysisServices.Core.dll
-
-        import clr
-        clr.AddReference('Microsoft.AnalysisServices.AdomdClient')
-
-        from Microsoft.AnalysisServices.AdomdClient import AdomdConnection, AdomdCommand
 
-        # Connection configuration
-        connection_string = "{conn_str}"
-        mdx_query = \"\"\"{mdx_query}\"\"\"
-
-        def execute_mdx():
-            conn = AdomdConnection(connection_string)
+    def measure_query(self, mdx):
+        """Run mdx to the end; returns a one-line cost summary."""
+        stats = getattr(self.connection, 'stats', None)  # only the mock backend counts its work
+        before = dict(stats) if stats else {}
+        started = time.perf_counter()
+        try:
+            cmd = AdomdCommand(mdx, self.connection)
+            reader = cmd.ExecuteReader()
+            rows = 0
             try:
-                conn.Open()
-                cmd = AdomdCommand(mdx_query, conn)
-                reader = cmd.ExecuteReader()
-                
-                # Get column headers
-                columns = [col.ColumnName for col in reader.GetSchemaTable().Columns]
-                print("|".join(columns))
-                
-                # Print results
                 while reader.Read():
-                    print("|".join(str(reader[i]) for i in range(len(columns))))
-                    
-            except Exception as e:
-                print(f"Error")
+                    rows += 1
+                cells = rows * reader.FieldCount
             finally:
-                conn.Close()
+                reader.Close()
+        except Exception as e:
+            return f"Failed: {str(e)}"
+        cost = f"{(time.perf_counter() - started) * 1000:.0f} ms, {rows} rows, {cells} cells returned"
+        if stats:
+            cost += (f"\nServer work: {stats['tuples'] - before['tuples']} tuples, "
+                     f"{stats['cells'] - before['cells']} cells, {stats['scans'] - before['scans']} fact scans")
+        return cost
+
+    def compare_plans(self):
+        if self.connection is None:
+            QMessageBox.warning(self, "Compare Plans", "Connect first")
+            return
+        if not self.columns_list.count():
+            QMessageBox.warning(self, "Compare Plans", "Add something to the Columns axis first")
+            return
+        if getattr(self.connection, 'stats', None) is None and QMessageBox.question(
+                self, "Compare Plans",
+                "This runs both queries in full against the server. Continue?") != QMessageBox.Yes:
+            return
+        naive = self.build_plan().to_mdx()
+        optimized = optimize(self.build_plan()).to_mdx()
+        PlanDialog([
+            ("Naive", naive, self.measure_query(naive)),
+            ("Optimized", optimized, self.measure_query(optimized)),
+        ], self).exec()
+
+    def result_identity(self):
+        return ResultCache.identity(*connection_identity(self.connection_string.text()))
+
+    def execute_preview(self, mdx):
+        """Run the MDX and return (columns, first PREVIEW_ROWS rows)."""
+        if self.connection is None:
+            raise Exception("Not connected")
+        cmd = AdomdCommand(mdx, self.connection)
+        reader = cmd.ExecuteReader()
+        try:
+            columns = [reader.GetName(i) for i in range(reader.FieldCount)]
+            rows = []
+            while len(rows) < PREVIEW_ROWS and reader.Read():
+                rows.append(tuple(None if reader.IsDBNull(i) else reader.GetValue(i)
+                                  for i in range(len(columns))))
+        finally:
+            reader.Close()
+        return columns, rows
+
+    def run_query(self):
+        mdx = self.generate_mdx()
+        if not self.columns_list.count():
+            QMessageBox.warning(self, "Run Query", "Add something to the Columns axis first")
+            return
+        try:
+            hits = self.result_cache.stats()['hits']
+            columns, rows = self.result_cache.get_or_run(
+                self.result_identity(), mdx, lambda: self.execute_preview(mdx), PREVIEW_ROWS)
+            stats = self.result_cache.stats()
+            source = "from cache" if stats['hits'] > hits else "from server"
+            message = (f"{len(rows)} rows {source} - cache: {stats['hits']} hits, "
+                       f"{stats['misses']} misses ({stats['hit_rate']:.0%})")
+            ResultsDialog(columns, rows, message, self).exec()
+        except Exception as e:
+            QMessageBox.critical(self, "Query Error", f"Query failed:\n{str(e)}")
+
+    def clear_result_cache(self):
+        self.result_cache.invalidate(self.result_identity())
+        QMessageBox.information(self, "Result Cache", "Cached results for this connection were cleared.")
+
+    def tree_hierarchies(self):
+        hierarchies = []
+        for i in range(self.metadata_tree.topLevelItemCount()):
+            dimension = self.metadata_tree.topLevelItem(i)
+            for j in range(dimension.childCount()):
+                if dimension.child(j).data(0, Qt.UserRole + 1) == "hierarchy":
+                    hierarchies.append(dimension.child(j).data(0, Qt.UserRole))
+        return hierarchies
+
+    def generate_python_code(self):
+        mdx_query = self.generate_mdx()
+        cube_name = self.cube_combo.currentText()
+        options_dialog = ExportOptionsDialog(cube_name, self.tree_hierarchies(), self)
+        if not options_dialog.exec():
+            return
+        options = options_dialog.options()
+        if options.get('start_date', '') > options.get('end_date', ''):
+            QMessageBox.warning(self, "Python Export", "The start date is after the end date")
+            return
+        if options.get('date_level'):
+            rows = [self.rows_list.item(i).data(Qt.UserRole) for i in range(self.rows_list.count())]
+            if hierarchy_of(options['date_level']) not in map(hierarchy_of, rows):
+                # Each slice would return its own partial totals for the same rows
+                QMessageBox.warning(self, "Python Export",
+                                    f"Splitting by date needs {options['date_level']} on Rows.\n"
+                                    "Add it to Rows or export without date slices.")
+                return
 
-        if __name__ == "__main__":
-            execute_mdx()
-"""
+        code = render_script(self.connection_string.text(), cube_name, mdx_query, **options)
         dialog = CodeDialog(code, self)
         dialog.exec()
 
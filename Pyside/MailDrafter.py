@@ -5,6 +5,7 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QPushButton, QTableWidget, QTableWidgetItem, QLabel, 
                                QFileDialog, QMessageBox, QTextEdit)
 from PySide6.QtCore import Qt
+from compliance import ComplianceAnalyzer
 
 class FeedbackReminderTool(QMainWindow):
     def __init__(self):
@@ -105,35 +106,16 @@ class FeedbackReminderTool(QMainWindow):
         self.results = {'not_registered': [], 'registered_not_submitted': [], 'submitted': []}
 
         try:
-            # Database connections
-            hier_conn = sqlite3.connect('hierarchy.db')
-            feedback_conn = sqlite3.connect('feedback.db')
-            attend_conn = sqlite3.connect('attendance.db')
-
-            for _, row in self.data.iterrows():
-                name = row['Name']
-                email = row['Email']
-
-                # Check if in hierarchy
-                hier_cur = hier_conn.cursor()
-                hier_cur.execute("SELECT name FROM employees WHERE name = ?", (name,))
-                if not hier_cur.fetchone():
-                    continue  # Skip if not in hierarchy
-
-                # Check registration
-                feedback_cur = feedback_conn.cursor()
-                feedback_cur.execute("SELECT username FROM users WHERE username = ?", (name,))
-                if not feedback_cur.fetchone():
-                    self.results['not_registered'].append(row)
-                    continue
+            analyzer = ComplianceAnalyzer()
+            classified = analyzer.classify(ComplianceAnalyzer.roster_from_dataframe(self.data))
 
-                # Check submission
-                attend_cur = attend_conn.cursor()
-                attend_cur.execute("SELECT username FROM submissions WHERE username = ?", (name,))
-                if not attend_cur.fetchone():
-                    self.results['registered_not_submitted'].append(row)
-                else:
-                    self.results['submitted'].append(row)
+            # People outside the hierarchy are skipped, as before
+            for category, status in (('not_registered', 'not_registered'),
+                                     ('registered_not_submitted', 'pending'),
+                                     ('submitted', 'submitted')):
+                self.results[category] = [
+                    {'Name': name, 'Email': email} for name, email in classified[status]
+                ]
 
             self.update_table()
             QMessageBox.information(self, "Analysis Complete", 
@@ -144,10 +126,6 @@ class FeedbackReminderTool(QMainWindow):
 
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Database Error", str(e))
-        finally:
-            hier_conn.close()
-            feedback_conn.close()
-            attend_conn.close()
 
     def update_table(self):
         self.table.setRowCount(0)
@@ -1,45 +1,180 @@
 import sys
 import sqlite3
+import hashlib
 import os
 import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, 
-    QLabel, QLineEdit, QPushButton, QTextEdit, QFileDialog
+    QLabel, QLineEdit, QPushButton, QTextEdit, QFileDialog, QComboBox,
+    QHBoxLayout, QTableWidget, QTableWidgetItem, QHeaderView
 )
 from PySide6.QtCore import QThread, Signal
+from replication import ChangeLogReplicator
+from reconcile import MerkleReconciler
+from page_delta import PageDeltaSync
+from snapshots import SnapshotManager
+
+# Snapshots are whole-database copies; kept inside a synced folder they would be
+# uploaded in full on every sync, so both sides snapshot to this local directory
+SNAPSHOT_ROOT = os.path.join(os.path.expanduser('~'), '.db_sync', 'snapshots')
+
+
+def local_snapshot_dir(base):
+    """Local, non-synced snapshot directory for the databases in base."""
+    base = os.path.abspath(base)
+    digest = hashlib.sha1(base.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(SNAPSHOT_ROOT, f"{os.path.basename(base.rstrip(os.sep)) or 'root'}-{digest}")
 
 class DBSyncThread(QThread):
     update_log = Signal(str)
+    # {'database', 'table', 'rows_scanned', 'rows_copied', 'bytes', 'elapsed'}
+    progress = Signal(dict)
     finished = Signal()
 
-    def __init__(self, primary_path, secondary_path):
+    MODES = {
+        'incremental': "Incremental (change log)",
+        'reconcile_dry_run': "Reconcile diverged replicas - dry run",
+        'reconcile': "Reconcile diverged replicas (primary wins)",
+        'publish_deltas': "Publish page deltas (Path 1 -> Path 2)",
+        'apply_deltas': "Apply page deltas (Path 2 -> Path 1)",
+    }
+
+    def __init__(self, primary_path, secondary_path, mode='incremental', max_workers=3):
         super().__init__()
         self.primary_path = primary_path
         self.secondary_path = secondary_path
+        self.mode = mode
+        self.max_workers = max_workers
         self.databases = ['hierarchy.db', 'feedback.db', 'attendance.db']
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """Stop at the next transaction boundary; committed work is kept."""
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
 
     def run(self):
+        # The databases are independent files, so they sync side by side
+        failed = []
         try:
-            for db_name in self.databases:
-                self.sync_database(db_name)
-            self.update_log.emit("\nSync completed successfully!")
-        except Exception as e:
-            self.update_log.emit(f"\nError: {str(e)}")
+            if self.mode != 'reconcile_dry_run' and not self.take_snapshots():
+                return
+
+            workers = max(1, min(self.max_workers, len(self.databases)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(self.sync_database, db_name): db_name
+                           for db_name in self.databases}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        failed.append(futures[future])
+                        self.update_log.emit(f"\nError in {futures[future]}: {str(e)}")
+
+            if self.is_cancelled():
+                self.update_log.emit("\nSync cancelled - completed batches were kept")
+            elif failed:
+                self.update_log.emit(f"\nSync finished with errors in: {', '.join(failed)}")
+            else:
+                self.update_log.emit("\nSync completed successfully!")
         finally:
             self.finished.emit()
 
+    def take_snapshots(self):
+        """Snapshot whichever side a sync can write to; False aborts the sync."""
+        sides = {
+            'publish_deltas': [],
+            'apply_deltas': [self.primary_path],
+        }.get(self.mode, [self.primary_path, self.secondary_path])
+        for base in sides:
+            paths = [f"{base}/{db_name}" for db_name in self.databases]
+            try:
+                snapshot_dir = local_snapshot_dir(base)
+                snapshot_id = SnapshotManager(snapshot_dir).take(paths, label=f"pre-{self.mode}")
+                self.update_log.emit(f"📸 Snapshot {snapshot_id} of {base} saved in {snapshot_dir}")
+            except Exception as e:
+                self.update_log.emit(f"🔥 Snapshot of {base} failed, sync aborted: {str(e)}")
+                return False
+        return True
+
+    def report_progress(self, db_name, table, scanned, copied, nbytes, started):
+        self.progress.emit({
+            'database': db_name,
+            'table': table,
+            'rows_scanned': scanned,
+            'rows_copied': copied,
+            'bytes': nbytes,
+            'elapsed': time.monotonic() - started,
+        })
+
     def sync_database(self, db_name):
         primary_db = f"{self.primary_path}/{db_name}"
         secondary_db = f"{self.secondary_path}/{db_name}"
 
+        if self.mode.endswith('_deltas'):
+            self.sync_page_deltas(primary_db, db_name)
+            return
+
         # Create database if not exists
         for path in [primary_db, secondary_db]:
             if not os.path.exists(path):
                 open(path, 'a').close()
 
-        # Merge both databases
-        self.merge_databases(primary_db, secondary_db, db_name)
+        if self.mode.startswith('reconcile'):
+            self.reconcile_databases(primary_db, secondary_db, db_name,
+                                     dry_run=self.mode == 'reconcile_dry_run')
+        else:
+            # Merge both databases
+            self.merge_databases(primary_db, secondary_db, db_name)
+
+    def sync_page_deltas(self, local_db, db_name):
+        # Deltas live in the shared folder; the publisher's manifests stay local
+        deltas = PageDeltaSync(f"{self.secondary_path}/.page_deltas",
+                               state_dir=f"{self.primary_path}/.page_delta_state")
+        started = time.monotonic()
+        if self.mode == 'publish_deltas':
+            if not os.path.exists(local_db):
+                self.update_log.emit(f"  ⚠️ {db_name} not found, nothing to publish")
+                return
+            delta_path = deltas.publish(local_db)
+            if delta_path is None:
+                self.update_log.emit(f"  📦 {db_name}: unchanged since last publish")
+                return
+            header = PageDeltaSync.read_header(delta_path)
+            nbytes = os.path.getsize(delta_path)
+            self.report_progress(db_name, '(pages)', header['page_count'], header['pages'], nbytes, started)
+            self.update_log.emit(f"  📦 {db_name}: {header['pages']}/{header['page_count']} pages "
+                                 f"changed, wrote {nbytes} bytes")
+        else:
+            applied = deltas.apply_pending(local_db, db_name)
+            nbytes = sum(os.path.getsize(p) for p in applied)
+            self.report_progress(db_name, '(pages)', len(applied), len(applied), nbytes, started)
+            self.update_log.emit(f"  📦 {db_name}: applied {len(applied)} delta(s)")
+
+    def reconcile_databases(self, db1_path, db2_path, db_name, dry_run):
+        action = "Comparing" if dry_run else "Reconciling"
+        self.update_log.emit(f"\n🌳 {action} {db_name}...")
+        reconciler = MerkleReconciler(db1_path, db2_path)
+        started = time.monotonic()
+
+        def on_table(report):
+            if 'rows_read' in report:
+                copied = 0 if dry_run else (
+                    report['only_primary'] + report['only_secondary'] + report['differing'])
+                self.report_progress(db_name, report['table'], report['rows_read'], copied, 0, started)
+
+        reports = reconciler.reconcile(dry_run=dry_run, prefer='primary',
+                                       progress=on_table, should_stop=self.is_cancelled)
+        for line in reconciler.format_report(reports).splitlines():
+            self.update_log.emit(f"  📊 {line}")
+        if dry_run:
+            self.update_log.emit("  ℹ️ Dry run - no changes written")
 
     # def merge_databases(self, db1_path, db2_path, db_name):
     #     self.update_log.emit(f"\nSyncing {db_name}...")
@@ -245,138 +380,39 @@ class DBSyncThread(QThread):
         self.update_log.emit(f"\n🔄 Syncing {db_name}...")
         
         try:
-            # Connect to databases
-            conn1 = sqlite3.connect(db1_path)
-            conn2 = sqlite3.connect(db2_path)
-            
-            # Configure connection settings
-            for conn in [conn1, conn2]:
-                conn.execute('PRAGMA journal_mode=WAL')
-                conn.execute('PRAGMA foreign_keys=ON')
-
-            # Initialize schema for both databases
-            with conn1, conn2:
-                # Create sync metadata table
-                conn1.execute('''CREATE TABLE IF NOT EXISTS _sync_meta (
-                    table_name TEXT PRIMARY KEY,
-                    last_modified TEXT NOT NULL DEFAULT '1970-01-01T00:00:00'
-                )''')
-                
-                conn2.execute('''CREATE TABLE IF NOT EXISTS _sync_meta (
-                    table_name TEXT PRIMARY KEY,
-                    last_modified TEXT NOT NULL DEFAULT '1970-01-01T00:00:00'
-                )''')
-
-                # Add sync column to all tables
-                for conn in [conn1, conn2]:
-                    tables = conn.execute('''
-                        SELECT name FROM sqlite_master
-                        WHERE type='table'
-                        AND name NOT LIKE 'sqlite_%'
-                        AND name NOT LIKE '_sync_%'
-                    ''').fetchall()
-
-                    for (table_name,) in tables:
-                        try:
-                            conn.execute(f'''
-                                ALTER TABLE "{table_name}"
-                                ADD COLUMN _sync_last_modified TEXT 
-                                NOT NULL DEFAULT '1970-01-01T00:00:00'
-                            ''')
-                        except sqlite3.OperationalError as e:
-                            if "duplicate column name" not in str(e):
-                                raise
-
-            # Bidirectional sync
-            for source, target in [(conn1, conn2), (conn2, conn1)]:
-                with source:
-                    source_cur = source.cursor()
-                    target_cur = target.cursor()
-
-                    # Get list of user tables
-                    tables = source_cur.execute('''
-                        SELECT name FROM sqlite_master
-                        WHERE type='table'
-                        AND name NOT LIKE 'sqlite_%'
-                        AND name NOT LIKE '_sync_%'
-                    ''').fetchall()
-
-                    for (table_name,) in tables:
-                        self.update_log.emit(f"  📊 Processing table: {table_name}")
-                        
-                        # 1. Get last sync time from target
-                        target_cur.execute('''
-                            SELECT last_modified FROM _sync_meta
-                            WHERE table_name = ?
-                        ''', (table_name,))
-                        target_time_row = target_cur.fetchone()
-                        last_sync_time = target_time_row[0] if target_time_row else '1970-01-01T00:00:00'
-
-                        # 2. Get new/modified records from source
-                        source_cur.execute(f'''
-                            SELECT * FROM "{table_name}"
-                            WHERE datetime(_sync_last_modified) > datetime(?)
-                        ''', (last_sync_time,))
-                        new_records = source_cur.fetchall()
-
-                        if not new_records:
-                            continue
-
-                        # 3. Get column information
-                        source_cur.execute(f'PRAGMA table_info("{table_name}")')
-                        columns = [col[1] for col in source_cur.fetchall()]
-                        column_count = len(columns)
-
-                        # 4. Prepare insert statement
-                        placeholders = ', '.join(['?'] * column_count)
-                        insert_sql = f'''
-                            INSERT OR REPLACE INTO "{table_name}"
-                            VALUES ({placeholders})
-                        '''
-
-                        # 5. Process records
-                        current_time = datetime.now().isoformat()
-                        valid_records = []
-                        
-                        for record in new_records:
-                            if len(record) != column_count:
-                                self.update_log.emit(f"    ⚠️ Skipping malformed record in {table_name}")
-                                continue
-                                
-                            # Update sync timestamp
-                            record_list = list(record)
-                            sync_index = columns.index('_sync_last_modified')
-                            record_list[sync_index] = current_time
-                            valid_records.append(tuple(record_list))
-
-                        # 6. Insert records
-                        if valid_records:
-                            try:
-                                target_cur.executemany(insert_sql, valid_records)
-                                target.commit()
-                                
-                                # Update sync metadata
-                                target_cur.execute('''
-                                    INSERT OR REPLACE INTO _sync_meta
-                                    VALUES (?, ?)
-                                ''', (table_name, current_time))
-                                target.commit()
-                                
-                            except sqlite3.Error as e:
-                                self.update_log.emit(f"    ❌ Error syncing {table_name}: {str(e)}")
-                                target.rollback()
-
-            self.update_log.emit("✅ Sync completed successfully!")
+            # Each side logs its own writes in _changes via triggers; a sync
+            # only replays entries past the peer's high-watermark
+            primary = ChangeLogReplicator(db1_path)
+            started = time.monotonic()
+            totals = {}
+
+            def on_batch(direction, stats):
+                for table, values in stats.items():
+                    totals[(direction, table)] = values
+                    combined = [totals[key] for key in totals if key[1] == table]
+                    self.report_progress(
+                        db_name, table,
+                        sum(v['scanned'] for v in combined),
+                        sum(v['copied'] for v in combined),
+                        sum(v['bytes'] for v in combined),
+                        started
+                    )
+
+            pulled, pushed = primary.sync_with(db2_path, progress=on_batch,
+                                               should_stop=self.is_cancelled)
+            self.update_log.emit(f"  📊 {db_name}: applied {pulled} change(s) from secondary")
+            self.update_log.emit(f"  📊 {db_name}: applied {pushed} change(s) to secondary")
+            self.update_log.emit(f"✅ {db_name} synced in {time.monotonic() - started:.2f}s")
             
         except Exception as e:
-            self.update_log.emit(f"🔥 Critical error: {str(e)}")
+            self.update_log.emit(f"🔥 Critical error in {db_name}: {str(e)}")
             raise
         finally:
-            # Cleanup WAL files
-            for conn in [conn1, conn2]:
-                if conn:
-                    conn.execute('PRAGMA wal_checkpoint(FULL)')
-                    conn.close()
+            # Fold the WAL back without waiting on readers that are still attached
+            for path in [db1_path, db2_path]:
+                conn = sqlite3.connect(path)
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+                conn.close()
 
 
 class SyncApp(QMainWindow):
@@ -405,10 +441,31 @@ class SyncApp(QMainWindow):
         layout.addWidget(self.path2_input)
         layout.addWidget(browse2_btn)
         
-        # Sync Button
+        # Sync mode
+        self.mode_combo = QComboBox()
+        for mode, label in DBSyncThread.MODES.items():
+            self.mode_combo.addItem(label, mode)
+        layout.addWidget(QLabel("Sync Mode:"))
+        layout.addWidget(self.mode_combo)
+        
+        # Sync / Cancel Buttons
+        button_layout = QHBoxLayout()
         sync_btn = QPushButton("Start Synchronization")
         sync_btn.clicked.connect(self.start_sync)
-        layout.addWidget(sync_btn)
+        button_layout.addWidget(sync_btn)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(self.cancel_sync)
+        button_layout.addWidget(self.cancel_btn)
+        layout.addLayout(button_layout)
+        
+        # Per-table progress
+        self.progress_table = QTableWidget(0, 6)
+        self.progress_table.setHorizontalHeaderLabels(
+            ["Database", "Table", "Rows Scanned", "Rows Copied", "Bytes", "Elapsed (s)"])
+        self.progress_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.progress_table)
+        self.progress_rows = {}
         
         # Log Output
         self.log_output = QTextEdit()
@@ -434,13 +491,36 @@ class SyncApp(QMainWindow):
             self.log_output.append("Sync already in progress!")
             return
             
-        self.sync_thread = DBSyncThread(path1, path2)
+        self.progress_table.setRowCount(0)
+        self.progress_rows = {}
+        self.sync_thread = DBSyncThread(path1, path2, self.mode_combo.currentData())
         self.sync_thread.update_log.connect(self.log_output.append)
+        self.sync_thread.progress.connect(self.update_progress)
         self.sync_thread.finished.connect(self.on_sync_finished)
         self.sync_thread.start()
+        self.cancel_btn.setEnabled(True)
         self.log_output.append("Starting synchronization...")
 
+    def cancel_sync(self):
+        if self.sync_thread and self.sync_thread.isRunning():
+            self.sync_thread.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.log_output.append("Cancelling after the current batch...")
+
+    def update_progress(self, info):
+        key = (info['database'], info['table'])
+        row = self.progress_rows.get(key)
+        if row is None:
+            row = self.progress_table.rowCount()
+            self.progress_table.insertRow(row)
+            self.progress_rows[key] = row
+        values = [info['database'], info['table'], info['rows_scanned'], info['rows_copied'],
+                  info['bytes'], f"{info['elapsed']:.2f}"]
+        for col, value in enumerate(values):
+            self.progress_table.setItem(row, col, QTableWidgetItem(str(value)))
+
     def on_sync_finished(self):
+        self.cancel_btn.setEnabled(False)
         self.log_output.append("Sync process completed!")
 
 if __name__ == "__main__":
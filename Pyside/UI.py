@@ -17,6 +17,12 @@ from cryptography.hazmat.primitives import serialization, hashes
 from pathlib import Path
 import os
 import shutil
+from survey_cycles import SurveyCycleManager
+from outbox import SubmissionOutbox
+from feedback_server import FEEDBACK_TABLES, FeedbackClient, ServerError
+
+# Set FEEDBACK_SERVER=host:port to go through feedback_server.py instead of the shared files
+SERVER = FeedbackClient.from_env()
 
 class CryptographyManager:
     def __init__(self):
@@ -119,10 +125,17 @@ class CryptographyManager:
 
 class FeedbackDatabase:
     def __init__(self):
-        self.conn = sqlite3.connect('feedback.db')
+        # No local file handle in server mode; every call goes through SERVER
+        self.conn = None if SERVER else sqlite3.connect('feedback.db')
         self.crypto = CryptographyManager()
+        self.cycles = SurveyCycleManager()
         self.create_tables()
 
+    @property
+    def outbox(self):
+        # Started on first use so headless tools can use this class without a flusher
+        return SubmissionOutbox.shared()
+
     def encrypt_feedback_data(self, data, manager_chain):
         encrypted_data = {}
         for manager in manager_chain:
@@ -132,33 +145,78 @@ class FeedbackDatabase:
                 print(f"Encryption failed for {manager}: {str(e)}")
         return encrypted_data
 
+    def encrypt_submission(self, manager_chain, responses, general_feedback, approval_status):
+        """Encrypt a survey for every manager in the chain and return the rows to store."""
+        # Encrypt responses
+        encrypted_responses = {}
+        for qid, response in responses.items():
+            encrypted_responses[qid] = {}
+            for manager in manager_chain:
+                try:
+                    # encrypted = self.crypto.encrypt_data(
+                    #     str(response), 
+                    #     manager
+                    # )
+                    encrypted = base64.b64encode(
+                            self.crypto.encrypt_data(str(response), manager)
+                        ).decode('utf-8')
+                    encrypted_responses[qid][manager] = encrypted
+                except Exception as e:
+                    print(f"Encryption failed for {manager}: {str(e)}")
+                    continue
+
+        # Encrypt general feedback
+        encrypted_general = {}
+        if general_feedback:
+            for manager in manager_chain:
+                try:
+                    encrypted = self.crypto.encrypt_data(
+                        general_feedback, 
+                        manager
+                    )
+                    encrypted_general[manager] = encrypted
+                except Exception as e:
+                    print(f"General feedback encryption failed for {manager}: {str(e)}")
+                    continue
+
+        # One row per answer (and general comment) per manager in the chain
+        rows = []
+        for i, manager in enumerate(manager_chain):
+            reportee_type = 'direct' if i == 0 else 'indirect'
+
+            # Question responses
+            for qid, encrypted_data in encrypted_responses.items():
+                if manager in encrypted_data:
+                    rows.append({
+                        'manager': manager,
+                        'reportee_type': reportee_type,
+                        'question_id': qid,
+                        'response': encrypted_data[manager],
+                        'approval_status': approval_status,
+                    })
+
+            # General feedback
+            if manager in encrypted_general:
+                rows.append({
+                    'manager': manager,
+                    'reportee_type': reportee_type,
+                    'general_feedback': encrypted_general[manager],
+                    'approval_status': approval_status,
+                })
+        return rows
+
     def create_tables(self):
+        if SERVER:
+            return  # The server owns the schema
         cursor = self.conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT NOT NULL UNIQUE,
-                encrypted_data TEXT NOT NULL,
-                approved BOOLEAN NOT NULL DEFAULT 0
-            )
-        ''')
-        # Create feedback responses table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS feedback_responses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                manager TEXT NOT NULL,
-                reportee_type TEXT NOT NULL,
-                question_id TEXT,
-                response TEXT,
-                general_feedback TEXT,
-                approval_status BOOLEAN NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        for ddl in FEEDBACK_TABLES:
+            cursor.execute(ddl)
         self.conn.commit()
+        self.cycles.ensure_schema()
     
     def username_exists(self, username):
+        if SERVER:
+            return SERVER.query('username_exists', username)
         cursor = self.conn.cursor()
         cursor.execute('SELECT username FROM users WHERE username = ?', (username,))
         return cursor.fetchone() is not None
@@ -191,6 +249,12 @@ class FeedbackDatabase:
         ct_bytes = cipher.encrypt(pad(password.encode(), AES.block_size))
         encrypted_data = base64.b64encode(iv + ct_bytes).decode()
         
+        if SERVER:
+            try:
+                SERVER.add_user(username, encrypted_data)
+            except ServerError as e:
+                raise ValueError(str(e))
+            return
         cursor = self.conn.cursor()
         cursor.execute('''
             INSERT INTO users (username, encrypted_data, approved)
@@ -220,11 +284,15 @@ class FeedbackDatabase:
             print("Could not distribute private key - OneDrive not found")
             
     def validate_user(self, username, password):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT encrypted_data FROM users WHERE username = ?
-        ''', (username,))
-        result = cursor.fetchone()
+        if SERVER:
+            secret = SERVER.query('user_secret', username)
+            result = (secret,) if secret is not None else None
+        else:
+            cursor = self.conn.cursor()
+            cursor.execute('''
+                SELECT encrypted_data FROM users WHERE username = ?
+            ''', (username,))
+            result = cursor.fetchone()
         
         if not result:
             return False
@@ -242,6 +310,8 @@ class FeedbackDatabase:
             return False
 
     def get_unapproved_reportees(self, usernames):
+        if SERVER:
+            return SERVER.query('unapproved_reportees', list(usernames))
         cursor = self.conn.cursor()
         placeholders = ','.join(['?']*len(usernames))
         cursor.execute(f'''
@@ -251,6 +321,9 @@ class FeedbackDatabase:
         return [row[0] for row in cursor.fetchall()]
 
     def approve_users(self, usernames):
+        if SERVER:
+            SERVER.approve_users(usernames)
+            return
         cursor = self.conn.cursor()
         placeholders = ','.join(['?']*len(usernames))
         cursor.execute(f'''
@@ -261,12 +334,16 @@ class FeedbackDatabase:
     
     # In FeedbackDatabase class
     def get_user_status(self, username):
+        if SERVER:
+            return SERVER.query('user_status', username)
         cursor = self.conn.cursor()
         cursor.execute('SELECT approved FROM users WHERE username = ?', (username,))
         result = cursor.fetchone()
         return bool(result[0]) if result else False
 
     def get_all_unapproved(self):
+        if SERVER:
+            return SERVER.query('unapproved')
         cursor = self.conn.cursor()
         cursor.execute('SELECT username FROM users WHERE approved = 0')
         return [row[0] for row in cursor.fetchall()]
@@ -274,6 +351,8 @@ class FeedbackDatabase:
 class HierarchyValidator:
     @staticmethod
     def validate_username(username):
+        if SERVER:
+            return SERVER.query('employee_exists', username)
         conn = sqlite3.connect('hierarchy.db')
         cursor = conn.cursor()
         cursor.execute('SELECT name FROM employees WHERE name = ?', (username,))
@@ -283,6 +362,8 @@ class HierarchyValidator:
     
     @staticmethod
     def get_manager_reportees(manager_username):
+        if SERVER:
+            return SERVER.query('direct_reportees', manager_username)
         conn = sqlite3.connect('hierarchy.db')
         cursor = conn.cursor()
         cursor.execute('''
@@ -296,6 +377,8 @@ class HierarchyValidator:
     
     @staticmethod
     def get_manager_chain(username):
+        if SERVER:
+            return SERVER.query('manager_chain', username)
         conn = sqlite3.connect('hierarchy.db')
         cursor = conn.cursor()
         manager_chain = []
@@ -321,6 +404,8 @@ class HierarchyValidator:
     @staticmethod
 
     def get_hierarchy():
+        if SERVER:
+            return [tuple(row) for row in SERVER.query('hierarchy')]
         conn = sqlite3.connect('hierarchy.db')
         cursor = conn.cursor()
         cursor.execute('SELECT id, name, manager_id FROM employees')
@@ -331,6 +416,9 @@ class HierarchyValidator:
     # Add to HierarchyValidator class
     @staticmethod
     def get_all_reportees(manager_username):
+        if SERVER:
+            direct, indirect = SERVER.query('all_reportees', manager_username)
+            return direct, indirect
         conn = sqlite3.connect('hierarchy.db')
         cursor = conn.cursor()
         
@@ -628,7 +716,29 @@ class FeedbackMainWindow(QMainWindow):
         self.crypto = CryptographyManager()
         self.init_ui()
         self.handle_key_distribution()
-        
+        # A duplicate or failed submission is only known once the outbox flusher has run
+        self.notice_timer = QTimer(self)
+        self.notice_timer.timeout.connect(self.show_outbox_notices)
+        self.notice_timer.start(30000)
+        self.show_outbox_notices()
+        
+    def show_outbox_notices(self):
+        if not self.username:
+            return
+        for status, period, error in self.feedback_db.outbox.take_notices(self.username):
+            if status == 'duplicate':
+                QMessageBox.warning(
+                    self, "Feedback Not Recorded",
+                    f"Your feedback for {period} was not recorded: feedback for this cycle "
+                    "had already been submitted from another machine."
+                )
+            else:
+                QMessageBox.critical(
+                    self, "Feedback Not Recorded",
+                    f"Your feedback for {period} could not be saved ({error}).\n"
+                    "Please contact the administrator."
+                )
+
     def init_ui(self):
         self.setWindowTitle(f'Feedback System - Welcome {self.username}')
         self.setGeometry(100, 100, 800, 600)
@@ -818,11 +928,17 @@ class FeedbackMainWindow(QMainWindow):
 
         
     def check_feedback_before_analysis(self):
-        conn = sqlite3.connect('feedback.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM feedback_responses WHERE manager = ?', (self.username,))
-        response_count = cursor.fetchone()[0]
-        conn.close()
+        if SERVER:
+            response_count = SERVER.query('response_count', self.username, SERVER.query('current_period'))
+        else:
+            conn = sqlite3.connect('feedback.db')
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT COUNT(*) FROM feedback_responses WHERE period = ? AND manager = ?',
+                (self.feedback_db.cycles.current_period(), self.username)
+            )
+            response_count = cursor.fetchone()[0]
+            conn.close()
         
         if response_count == 0:
             QMessageBox.information(
@@ -836,6 +952,7 @@ class FeedbackMainWindow(QMainWindow):
 
     def sign_out(self):
         # Clear user session data
+        self.notice_timer.stop()
         self.username = None
         QMessageBox.information(self, "Signed Out", "You have been successfully signed out")
         
@@ -867,6 +984,9 @@ class FeedbackMainWindow(QMainWindow):
             QMessageBox.warning(self, "Warning", "Manager information not found")
 
     def get_manager_name(self):
+        if SERVER:
+            chain = SERVER.query('manager_chain', self.username)
+            return chain[0] if chain else None
         conn = sqlite3.connect('hierarchy.db')
         cursor = conn.cursor()
         cursor.execute('''
@@ -1019,7 +1139,7 @@ class SurveyApp(QDialog):
 
     #     # Check if already submitted
     #     if not self.attendance_db.mark_submission(self.current_user):
-    #         QMessageBox.warning(self, "Error", "You've already submitted feedback! \n You can only submit once per month.")
+    #         QMessageBox.warning(self, "Error", "You've already submitted feedback! \n You can only submit once per survey cycle.")
     #         return
         
     #     # # Get approval status
@@ -1107,9 +1227,11 @@ class SurveyApp(QDialog):
             )
             return
 
-        # Check if already submitted
-        if not self.attendance_db.mark_submission(self.current_user):
-            QMessageBox.warning(self, "Error", "You've already submitted feedback! \n You can only submit once per month.")
+        # Check if already submitted (or still queued from this machine)
+        period = self.attendance_db.current_period()
+        if (self.attendance_db.has_submitted(self.current_user, period)
+                or self.feedback_db.outbox.has_pending(self.current_user, period)):
+            QMessageBox.warning(self, "Error", "You've already submitted feedback! \n You can only submit once per survey cycle.")
             return
 
         # Get approval status
@@ -1145,82 +1267,21 @@ class SurveyApp(QDialog):
             )
             return
 
-        # Encrypt responses
-        encrypted_responses = {}
-        for qid, response in self.lm_responses.items():
-            encrypted_responses[qid] = {}
-            for manager in manager_chain:
-                try:
-                    # encrypted = self.feedback_db.crypto.encrypt_data(
-                    #     str(response), 
-                    #     manager
-                    # )
-                    encrypted = base64.b64encode(
-                            self.feedback_db.crypto.encrypt_data(str(response), manager)
-                        ).decode('utf-8')
-                    encrypted_responses[qid][manager] = encrypted
-                except Exception as e:
-                    print(f"Encryption failed for {manager}: {str(e)}")
-                    continue
-
-        # Encrypt general feedback
-        general_feedback = self.general_feedback_input.toPlainText()
-        encrypted_general = {}
-        if general_feedback:
-            for manager in manager_chain:
-                try:
-                    encrypted = self.feedback_db.crypto.encrypt_data(
-                        general_feedback, 
-                        manager
-                    )
-                    encrypted_general[manager] = encrypted
-                except Exception as e:
-                    print(f"General feedback encryption failed for {manager}: {str(e)}")
-                    continue
+        # Queue encrypted data locally; the outbox flusher writes it and the
+        # attendance record to the shared databases in one transaction
+        rows = self.feedback_db.encrypt_submission(
+            manager_chain,
+            self.lm_responses,
+            self.general_feedback_input.toPlainText(),
+            approval_status
+        )
 
-        # Store encrypted data
-        conn = sqlite3.connect('feedback.db')
-        cursor = conn.cursor()
-        
         try:
-            for i, manager in enumerate(manager_chain):
-                reportee_type = 'direct' if i == 0 else 'indirect'
-                
-                # Insert question responses
-                for qid, encrypted_data in encrypted_responses.items():
-                    if manager in encrypted_data:
-                        cursor.execute('''
-                            INSERT INTO feedback_responses 
-                            (manager, reportee_type, question_id, response, approval_status)
-                            VALUES (?, ?, ?, ?, ?)
-                        ''', (
-                            manager, 
-                            reportee_type,
-                            qid,
-                            encrypted_data[manager],  # Store binary data
-                            approval_status
-                        ))
-
-                # Insert general feedback
-                if manager in encrypted_general:
-                    cursor.execute('''
-                        INSERT INTO feedback_responses 
-                        (manager, reportee_type, general_feedback, approval_status)
-                        VALUES (?, ?, ?, ?)
-                    ''', (
-                        manager,
-                        reportee_type,
-                        encrypted_general[manager],
-                        approval_status
-                    ))
-
-            conn.commit()
+            self.feedback_db.outbox.submit(self.current_user, period, rows)
             QMessageBox.information(self, "Success", "Feedback submitted to all relevant managers!")
             self.close()
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Failed to submit feedback: {str(e)}")
-        finally:
-            conn.close()
 
 class FeedbackAnalysisDialog(QDialog):
     def __init__(self, username, feedback_db):
@@ -1323,7 +1384,9 @@ class FeedbackAnalysisDialog(QDialog):
 
     def load_data(self):
         try:
-            conn = sqlite3.connect('feedback.db')
+            period = self.attendance_db.current_period()
+            # Under SERVER the shared files are only opened by the server
+            conn = None if SERVER else sqlite3.connect('feedback.db')
             
             # Clear previous data
             self.responses_df = pd.DataFrame()
@@ -1334,13 +1397,18 @@ class FeedbackAnalysisDialog(QDialog):
             responses_query = """
                 SELECT id reportee_type, question_id, response 
                 FROM feedback_responses
-                WHERE manager = ? 
+                WHERE period = ? AND manager = ? 
                 AND (approval_status = 1 OR ? = 1)
                 AND response IS NOT NULL
             """
-            self.responses_df = pd.read_sql_query(
-                responses_query, conn, 
-                params=(self.username, int(self.include_unapproved)))
+            if SERVER:
+                self.responses_df = pd.DataFrame(
+                    SERVER.query('manager_responses', self.username, period, self.include_unapproved),
+                    columns=['reportee_type', 'question_id', 'response'])
+            else:
+                self.responses_df = pd.read_sql_query(
+                    responses_query, conn, 
+                    params=(period, self.username, int(self.include_unapproved)))
             
             # New decryption step
             if not self.responses_df.empty:
@@ -1384,31 +1452,37 @@ class FeedbackAnalysisDialog(QDialog):
             direct_reportees, indirect_reportees = HierarchyValidator.get_all_reportees(self.username)
             
             # Get submission counts
-            conn_att = sqlite3.connect('attendance.db')
-            cursor = conn_att.cursor()
-            
             submitted_direct = 0
             submitted_indirect = 0
             
-            if direct_reportees:
-                placeholders = ','.join(['?']*len(direct_reportees))
-                cursor.execute(f'''
-                    SELECT COUNT(DISTINCT username) 
-                    FROM submissions 
-                    WHERE username IN ({placeholders})
-                ''', direct_reportees)
-                submitted_direct = cursor.fetchone()[0] or 0
-                
-            if indirect_reportees:
-                placeholders = ','.join(['?']*len(indirect_reportees))
-                cursor.execute(f'''
-                    SELECT COUNT(DISTINCT username) 
-                    FROM submissions 
-                    WHERE username IN ({placeholders})
-                ''', indirect_reportees)
-                submitted_indirect = cursor.fetchone()[0] or 0
+            if SERVER:
+                if direct_reportees:
+                    submitted_direct = SERVER.query('submitted_among', period, direct_reportees) or 0
+                if indirect_reportees:
+                    submitted_indirect = SERVER.query('submitted_among', period, indirect_reportees) or 0
+            else:
+                conn_att = sqlite3.connect('attendance.db')
+                cursor = conn_att.cursor()
                 
-            conn_att.close()
+                if direct_reportees:
+                    placeholders = ','.join(['?']*len(direct_reportees))
+                    cursor.execute(f'''
+                        SELECT COUNT(DISTINCT username) 
+                        FROM submissions 
+                        WHERE period = ? AND username IN ({placeholders})
+                    ''', [period] + direct_reportees)
+                    submitted_direct = cursor.fetchone()[0] or 0
+                    
+                if indirect_reportees:
+                    placeholders = ','.join(['?']*len(indirect_reportees))
+                    cursor.execute(f'''
+                        SELECT COUNT(DISTINCT username) 
+                        FROM submissions 
+                        WHERE period = ? AND username IN ({placeholders})
+                    ''', [period] + indirect_reportees)
+                    submitted_indirect = cursor.fetchone()[0] or 0
+                    
+                conn_att.close()
             
             # Update label
             self.submission_count_label.setText(
@@ -1421,13 +1495,18 @@ class FeedbackAnalysisDialog(QDialog):
             general_query = """
                 SELECT general_feedback, timestamp 
                 FROM feedback_responses
-                WHERE manager = ? 
+                WHERE period = ? AND manager = ? 
                 AND (approval_status = 1 OR ? = 1)
                 AND general_feedback IS NOT NULL
             """
-            self.general_feedback_df = pd.read_sql_query(
-                general_query, conn,
-                params=(self.username, int(self.include_unapproved)))
+            if SERVER:
+                self.general_feedback_df = pd.DataFrame(
+                    SERVER.query('general_feedback', self.username, period, self.include_unapproved),
+                    columns=['general_feedback', 'timestamp'])
+            else:
+                self.general_feedback_df = pd.read_sql_query(
+                    general_query, conn,
+                    params=(period, self.username, int(self.include_unapproved)))
             
             # Update general feedback list
             self.general_feedback_list.clear()
@@ -1466,7 +1545,7 @@ class FeedbackAnalysisDialog(QDialog):
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error loading data: {str(e)}")
         finally:
-            if 'conn' in locals():
+            if locals().get('conn'):
                 conn.close()
 
     def decrypt_response(self, row):
@@ -1885,33 +1964,47 @@ class FeedbackAnalysisDialog(QDialog):
 
 class AttendanceDB:
     def __init__(self):
-        self.conn = sqlite3.connect('attendance.db')
+        self.conn = None if SERVER else sqlite3.connect('attendance.db')
+        self.cycles = SurveyCycleManager()
         self.create_table()
         
     def create_table(self):
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS submissions (
-                username TEXT PRIMARY KEY,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        self.conn.commit()
+        if SERVER:
+            return  # The server owns the schema
+        # Submissions are keyed by (period, username); see SurveyCycleManager
+        self.cycles.ensure_schema()
+
+    def current_period(self):
+        if SERVER:
+            return SERVER.query('current_period')
+        return self.cycles.current_period()
         
     def mark_submission(self, username):
+        if SERVER:
+            return SERVER.mark_submission(username, self.current_period())
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
-                INSERT INTO submissions (username) VALUES (?)
-            ''', (username,))
+                INSERT INTO submissions (period, username) VALUES (?, ?)
+            ''', (self.current_period(), username))
             self.conn.commit()
             return True
         except sqlite3.IntegrityError:
-            return False  # Already submitted
+            return False  # Already submitted this cycle
         
+    def has_submitted(self, username, period=None):
+        if SERVER:
+            return SERVER.query('has_submitted', username, period or self.current_period())
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT 1 FROM submissions WHERE period = ? AND username = ?',
+                       (period or self.current_period(), username))
+        return cursor.fetchone() is not None
+
     def get_submission_count(self):
+        if SERVER:
+            return SERVER.query('submission_count', self.current_period())
         cursor = self.conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM submissions')
+        cursor.execute('SELECT COUNT(*) FROM submissions WHERE period = ?', (self.current_period(),))
         return cursor.fetchone()[0]
 
 if __name__ == '__main__':
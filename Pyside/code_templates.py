@@ -0,0 +1,299 @@
+TEMPLATES = ('parquet', 'csv', 'console')
+SLICE_GRAINS = ('day', 'week', 'month')
+
+_HEADER = '''\
+# Generated by the MDX Query Builder.
+#
+# Required DLL setup:
+# 1. Download Microsoft Analysis Services client libraries
+# 2. Place these DLLs in your Python environment's DLL search path:
+#    - Microsoft.AnalysisServices.AdomdClient.dll
+#    - Microsoft.AnalysisServices.AdomdClient.Xmla.dll
+#    - Microsoft.AnalysisServices.Core.dll
+# {requirements}
+
+import time
+from datetime import datetime, timedelta
+
+import clr
+clr.AddReference('Microsoft.AnalysisServices.AdomdClient')
+
+from Microsoft.AnalysisServices.AdomdClient import AdomdConnection, AdomdCommand
+{imports}
+# Connection configuration
+CONNECTION_STRING = {conn_str!r}
+CUBE = {cube!r}
+MDX_QUERY = """{mdx}"""
+'''
+
+_READER = '''
+CHUNK_SIZE = {chunk_size}
+
+
+def to_python(value):
+    """Plain Python values for what ADOMD.NET returns (System.Decimal, System.DateTime, ...)."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    kind = type(value).__name__
+    if kind == 'Decimal':
+        return float(str(value))
+    if kind == 'DateTime':
+        return datetime.fromisoformat(value.ToString('s'))
+    return str(value)
+
+
+def read_chunks(mdx, chunk_size=CHUNK_SIZE):
+    """Run mdx on its own connection and yield (columns, {{column: values}}) chunks."""
+    conn = AdomdConnection(CONNECTION_STRING)
+    conn.Open()
+    try:
+        reader = AdomdCommand(mdx, conn).ExecuteReader()
+        try:
+            columns = [reader.GetName(i) for i in range(reader.FieldCount)]
+            chunk = [[] for _ in columns]
+            count = 0
+            while reader.Read():
+                for i, values in enumerate(chunk):
+                    values.append(None if reader.IsDBNull(i) else to_python(reader.GetValue(i)))
+                count += 1
+                if count == chunk_size:
+                    yield columns, dict(zip(columns, chunk))
+                    chunk = [[] for _ in columns]
+                    count = 0
+            if count:
+                yield columns, dict(zip(columns, chunk))
+        finally:
+            reader.Close()
+    finally:
+        conn.Close()
+'''
+
+_PARQUET_WRITER = '''
+OUTPUT_PATH = {output!r}
+
+
+class Writer:
+    """Appends chunks to one Parquet file, a row group per chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.writer = None
+
+    def write(self, columns, chunk):
+        table = pa.Table.from_pydict(chunk)
+        if self.writer is None:
+            # Columns that are all null in the first chunk would pin the schema to null
+            schema = pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                                for f in table.schema])
+            self.writer = pq.ParquetWriter(self.path, schema, compression='snappy')
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+'''
+
+_CSV_WRITER = '''
+OUTPUT_PATH = {output!r}
+
+
+class Writer:
+    """Appends chunks to one CSV file; the header is written with the first chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = True
+
+    def write(self, columns, chunk):
+        frame = pd.DataFrame(chunk, columns=columns)
+        frame.to_csv(self.path, mode='w' if self.header else 'a', header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        pass
+'''
+
+_CONSOLE_WRITER = '''
+
+class Writer:
+    """Prints chunks; handy to check a query before exporting it."""
+
+    def __init__(self, path=None):
+        self.header = True
+
+    def write(self, columns, chunk):
+        if self.header:
+            print("|".join(columns))
+            self.header = False
+        for row in zip(*(chunk[c] for c in columns)):
+            print("|".join(str(v) for v in row))
+
+    def close(self):
+        pass
+'''
+
+_SINGLE_RUN = '''
+
+def main():
+    started = time.perf_counter()
+    writer = Writer({output_arg})
+    rows = 0
+    try:
+        for columns, chunk in read_chunks(MDX_QUERY):
+            writer.write(columns, chunk)
+            rows += len(chunk[columns[0]])
+            elapsed = time.perf_counter() - started
+            print(f"{{rows}} rows in {{elapsed:.1f}}s ({{rows / max(elapsed, 1e-9):.0f}} rows/s)")
+    finally:
+        writer.close()
+    print(f"Done: {{rows}} rows in {{time.perf_counter() - started:.1f}}s")
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+_SLICED_RUN = '''
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DATE_LEVEL = {date_level!r}
+START_DATE = {start!r}
+END_DATE = {end!r}
+GRAIN = {grain!r}
+WORKERS = {workers}
+
+
+def date_slices(start, end, grain):
+    """Inclusive yyyymmdd (start, end) pairs of one day, week or month."""
+    current = datetime.strptime(start, '%Y%m%d').date()
+    last = datetime.strptime(end, '%Y%m%d').date()
+    while current <= last:
+        if grain == 'day':
+            slice_end = current
+        elif grain == 'week':
+            slice_end = current + timedelta(days=6 - current.weekday())
+        else:
+            slice_end = (current.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        slice_end = min(slice_end, last)
+        yield current.strftime('%Y%m%d'), slice_end.strftime('%Y%m%d')
+        current = slice_end + timedelta(days=1)
+
+
+def slice_mdx(start, end):
+    """MDX_QUERY restricted to one date range by a subselect around the cube."""
+    subselect = (f"FROM ( SELECT {{{{ {{DATE_LEVEL}}.&[{{start}}] : {{DATE_LEVEL}}.&[{{end}}] }}}} ON COLUMNS "
+                 f"FROM [{{CUBE}}] )")
+    head, found, tail = MDX_QUERY.rpartition(f"FROM [{{CUBE}}]")
+    if not found:
+        raise ValueError("MDX_QUERY has no FROM clause for the cube")
+    return head + subselect + tail
+
+
+def main():
+    started = time.perf_counter()
+    slices = list(date_slices(START_DATE, END_DATE, GRAIN))
+    # Workers each query one slice at a time; this thread is the only writer
+    chunks = queue.Queue(maxsize=WORKERS * 2)
+    # Set when this thread stops reading, so no worker stays blocked on a full queue
+    stop = threading.Event()
+
+    def put(message):
+        while not stop.is_set():
+            try:
+                chunks.put(message, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def extract(slice_range):
+        if stop.is_set():
+            return
+        slice_started = time.perf_counter()
+        rows = 0
+        source = read_chunks(slice_mdx(*slice_range))
+        try:
+            for columns, chunk in source:
+                if not put(('rows', slice_range, columns, chunk)):
+                    return
+                rows += len(chunk[columns[0]])
+            put(('done', slice_range, rows, time.perf_counter() - slice_started))
+        except Exception as e:
+            put(('failed', slice_range, str(e), time.perf_counter() - slice_started))
+        finally:
+            source.close()
+
+    writer = Writer({output_arg})
+    total_rows, finished, failed = 0, 0, []
+    try:
+        with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+            try:
+                for slice_range in slices:
+                    pool.submit(extract, slice_range)
+                while finished < len(slices):
+                    message = chunks.get()
+                    if message[0] == 'rows':
+                        _, _, columns, chunk = message
+                        writer.write(columns, chunk)
+                        total_rows += len(chunk[columns[0]])
+                        continue
+                    finished += 1
+                    kind, (start, end), detail, seconds = message
+                    if kind == 'done':
+                        print(f"Slice {{start}}-{{end}}: {{detail}} rows in {{seconds:.1f}}s "
+                              f"({{finished}}/{{len(slices)}}, {{total_rows}} rows so far)")
+                    else:
+                        failed.append((start, end, detail))
+                        print(f"Slice {{start}}-{{end}} failed after {{seconds:.1f}}s: {{detail}}")
+            finally:
+                # A failed write re-raises once the workers have let go
+                stop.set()
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    print(f"Done: {{total_rows}} rows from {{len(slices) - len(failed)}} slices in {{elapsed:.1f}}s "
+          f"({{total_rows / max(elapsed, 1e-9):.0f}} rows/s)")
+    if failed:
+        raise SystemExit(f"{{len(failed)}} slices failed")
+
+
+if __name__ == "__main__":
+    main()
+'''
+
+
+def render_script(conn_str, cube, mdx, template='parquet', output='cube_data.parquet',
+                  chunk_size=50000, date_level=None, start_date=None, end_date=None,
+                  grain='month', workers=4):
+    """Python source that runs mdx in chunks and writes the result.
+
+    template is 'parquet' (pyarrow), 'csv' (pandas) or 'console'. With a
+    date_level such as '[Date].[Date]' the query is split into yyyymmdd
+    key ranges of the grain, run WORKERS at a time, each slice wrapped in a
+    subselect on that level. The date hierarchy has to be on ROWS for that:
+    otherwise every slice returns partial totals for the same rows.
+    """
+    if template not in TEMPLATES:
+        raise ValueError(f"Unknown template: {template}")
+    if date_level and grain not in SLICE_GRAINS:
+        raise ValueError(f"Unknown slice grain: {grain}")
+    requirements, imports, writer = {
+        'parquet': ("pip install pythonnet pyarrow", "\nimport pyarrow as pa\nimport pyarrow.parquet as pq\n",
+                    _PARQUET_WRITER),
+        'csv': ("pip install pythonnet pandas", "\nimport pandas as pd\n", _CSV_WRITER),
+        'console': ("pip install pythonnet", "", _CONSOLE_WRITER),
+    }[template]
+    output_arg = 'OUTPUT_PATH' if template != 'console' else ''
+
+    code = _HEADER.format(requirements=requirements, imports=imports, conn_str=conn_str, cube=cube,
+                          mdx=mdx.replace('\\', '\\\\').replace('"""', '\\"\\"\\"'))
+    code += _READER.format(chunk_size=int(chunk_size))
+    code += writer.format(output=output)
+    if date_level:
+        code += _SLICED_RUN.format(date_level=date_level, start=start_date, end=end_date, grain=grain,
+                                   workers=int(workers), output_arg=output_arg)
+    else:
+        code += _SINGLE_RUN.format(output_arg=output_arg)
+    return code
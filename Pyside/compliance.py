@@ -0,0 +1,104 @@
+import sqlite3
+
+from survey_cycles import SurveyCycleManager
+
+
+class ComplianceAnalyzer:
+    """Classify a roster against hierarchy.db, feedback.db and attendance.db in one pass.
+
+    The roster is loaded into a temp table on an in-memory connection that
+    ATTACHes the three databases, so every person is classified by a single
+    join instead of three point queries per row.
+    """
+
+    STATUSES = ('not_in_hierarchy', 'not_registered', 'pending', 'submitted')
+
+    def __init__(self, hierarchy_db='hierarchy.db', feedback_db='feedback.db',
+                 attendance_db='attendance.db'):
+        self.hierarchy_db = hierarchy_db
+        self.feedback_db = feedback_db
+        self.attendance_db = attendance_db
+
+    def _connect(self):
+        conn = sqlite3.connect(':memory:')
+        conn.execute("ATTACH DATABASE ? AS hier", (self.hierarchy_db,))
+        conn.execute("ATTACH DATABASE ? AS fb", (self.feedback_db,))
+        conn.execute("ATTACH DATABASE ? AS att", (self.attendance_db,))
+        conn.execute('''
+            CREATE TEMP TABLE roster (
+                pos INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                email TEXT
+            )
+        ''')
+        return conn
+
+    def _load_roster(self, conn, roster):
+        conn.executemany(
+            "INSERT INTO roster (name, email) VALUES (?, ?)",
+            ((str(name), '' if email is None else str(email)) for name, email in roster)
+        )
+        conn.execute("CREATE INDEX temp.roster_name ON roster(name)")
+
+    def classify(self, roster, root=None, period=None):
+        """Return a dict of status -> [(name, email), ...] in roster order.
+
+        roster is any iterable of (name, email) pairs. When root is given
+        (a manager name or a list of names), only people in those managers'
+        subtrees, including the managers themselves, are reported.
+        Submissions are counted for period, the current survey cycle by default.
+        """
+        results = {status: [] for status in self.STATUSES}
+        if period is None:
+            period = SurveyCycleManager(self.attendance_db, self.feedback_db).current_period()
+        conn = self._connect()
+        try:
+            self._load_roster(conn, roster)
+
+            params = []
+            if root is None:
+                scope = 'hier_scope(name) AS (SELECT DISTINCT name FROM hier.employees)'
+                scope_join = 'LEFT JOIN'
+            else:
+                roots = [root] if isinstance(root, str) else list(root)
+                placeholders = ','.join('?' * len(roots))
+                scope = f'''subtree(id) AS (
+                        SELECT id FROM hier.employees WHERE name IN ({placeholders})
+                        UNION
+                        SELECT e.id FROM hier.employees e
+                        JOIN subtree s ON e.manager_id = s.id
+                    ),
+                    hier_scope(name) AS (
+                        SELECT DISTINCT e.name FROM hier.employees e
+                        JOIN subtree s ON s.id = e.id
+                    )'''
+                params.extend(roots)
+                # Outside the subtree means out of scope, not "not in hierarchy"
+                scope_join = 'JOIN'
+
+            cursor = conn.execute(f'''
+                WITH RECURSIVE {scope}
+                SELECT r.name, r.email,
+                    CASE
+                        WHEN h.name IS NULL THEN 'not_in_hierarchy'
+                        WHEN u.username IS NULL THEN 'not_registered'
+                        WHEN s.username IS NULL THEN 'pending'
+                        ELSE 'submitted'
+                    END
+                FROM roster r
+                {scope_join} hier_scope h ON h.name = r.name
+                LEFT JOIN fb.users u ON u.username = r.name
+                LEFT JOIN att.submissions s ON s.period = ? AND s.username = r.name
+                ORDER BY r.pos
+            ''', params + [period])
+            for name, email, status in cursor:
+                results[status].append((name, email))
+        finally:
+            conn.close()
+        return results
+
+    @staticmethod
+    def roster_from_dataframe(df, name_col='Name', email_col='Email'):
+        """Return (name, email) pairs from a pandas roster without iterrows()."""
+        emails = df[email_col].where(df[email_col].notna(), None)
+        return zip(df[name_col].tolist(), emails.tolist())
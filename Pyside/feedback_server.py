@@ -0,0 +1,506 @@
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from outbox import SubmissionOutbox
+from survey_cycles import SurveyCycleManager
+
+# Frame: 4-byte length of the rest, 1-byte opcode, 4-byte request id, packed payload
+FRAME = struct.Struct('>IBI')
+
+OP_PING = 1
+OP_SUBMIT = 2
+OP_APPROVE = 3
+OP_QUERY = 4
+OP_ADD_USER = 5
+OP_MARK_SUBMISSION = 6
+OP_OK = 100
+OP_ERROR = 101
+
+
+# Tables of feedback.db that UI.FeedbackDatabase and the server both create
+FEEDBACK_TABLES = (
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT NOT NULL UNIQUE,
+        encrypted_data TEXT NOT NULL,
+        approved BOOLEAN NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS feedback_responses (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        manager TEXT NOT NULL,
+        reportee_type TEXT NOT NULL,
+        question_id TEXT,
+        response TEXT,
+        general_feedback TEXT,
+        approval_status BOOLEAN NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        period TEXT
+    )
+    ''',
+)
+
+
+class ServerError(Exception):
+    pass
+
+
+def pack_value(value, out=None):
+    """Encode None/bool/int/float/str/bytes/list/tuple/dict in a compact tagged format."""
+    out = bytearray() if out is None else out
+    if value is None:
+        out += b'N'
+    elif value is True or value is False:
+        out += b'T' if value else b'F'
+    elif isinstance(value, int):
+        out += b'i' + struct.pack('>q', value)
+    elif isinstance(value, float):
+        out += b'd' + struct.pack('>d', value)
+    elif isinstance(value, str):
+        data = value.encode('utf-8')
+        out += b's' + struct.pack('>I', len(data)) + data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        out += b'b' + struct.pack('>I', len(data)) + data
+    elif isinstance(value, (list, tuple)):
+        out += b'l' + struct.pack('>I', len(value))
+        for item in value:
+            pack_value(item, out)
+    elif isinstance(value, dict):
+        out += b'm' + struct.pack('>I', len(value))
+        for key, item in value.items():
+            pack_value(key, out)
+            pack_value(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__}")
+    return out
+
+
+def unpack_value(data, pos=0):
+    """Decode one value from data at pos; returns (value, next_pos)."""
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b'N':
+        return None, pos
+    if tag in (b'T', b'F'):
+        return tag == b'T', pos
+    if tag == b'i':
+        return struct.unpack_from('>q', data, pos)[0], pos + 8
+    if tag == b'd':
+        return struct.unpack_from('>d', data, pos)[0], pos + 8
+    if tag in (b's', b'b'):
+        (length,) = struct.unpack_from('>I', data, pos)
+        raw = bytes(data[pos + 4:pos + 4 + length])
+        return (raw.decode('utf-8') if tag == b's' else raw), pos + 4 + length
+    if tag in (b'l', b'm'):
+        (count,) = struct.unpack_from('>I', data, pos)
+        pos += 4
+        items = []
+        for _ in range(count * (2 if tag == b'm' else 1)):
+            item, pos = unpack_value(data, pos)
+            items.append(item)
+        if tag == b'l':
+            return items, pos
+        return dict(zip(items[::2], items[1::2])), pos
+    raise ValueError(f"Unknown tag {tag!r}")
+
+
+def encode_frame(opcode, request_id, payload):
+    body = pack_value(payload)
+    return FRAME.pack(len(body) + FRAME.size - 4, opcode, request_id) + body
+
+
+class FeedbackServer:
+    """Single process that owns feedback.db, attendance.db and hierarchy.db.
+
+    Desktop clients talk to it over a local TCP socket instead of opening
+    the files on the shared folder. All writes go through one connection on
+    one thread: requests that arrive within group_window are committed
+    together in a single transaction, each in its own savepoint so one bad
+    request can't fail its neighbours. Reads run on a second connection and
+    are cached until the next write commits, or until the files are changed
+    by someone else (a DRT rollover, a restore), which PRAGMA data_version
+    reveals before each read.
+    """
+
+    def __init__(self, data_dir='.', host='127.0.0.1', port=8765,
+                 group_window=0.005, max_group=256):
+        self.feedback_db = os.path.join(data_dir, 'feedback.db')
+        self.attendance_db = os.path.join(data_dir, 'attendance.db')
+        self.hierarchy_db = os.path.join(data_dir, 'hierarchy.db')
+        self.host = host
+        self.port = port
+        self.group_window = group_window
+        self.max_group = max_group
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feedback-writer')
+        self._reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='feedback-reader')
+        self._local = threading.local()
+        self._cache = {}
+        self._generation = 0
+        self._data_versions = None
+        self._queue = None
+        self.stats = {'commits': 0, 'writes': 0, 'reads': 0, 'cache_hits': 0}
+
+    def _connection(self):
+        # One connection per executor thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.feedback_db, timeout=30)
+            conn.isolation_level = None
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("ATTACH DATABASE ? AS att", (self.attendance_db,))
+            conn.execute("ATTACH DATABASE ? AS hier", (self.hierarchy_db,))
+            SubmissionOutbox.create_received_table(conn)
+            self._local.conn = conn
+        return conn
+
+    # Writes ----------------------------------------------------------------
+
+    def _submit(self, conn, submissions):
+        results = []
+        for submission in submissions:
+            # store_submission uses its own savepoint, so a bad submission
+            # is rolled back alone and reported in its slot
+            try:
+                submission_id, username, period, rows = submission
+                results.append(list(SubmissionOutbox.store_submission(
+                    conn, submission_id, username, period, [tuple(r) for r in rows])))
+            except sqlite3.OperationalError:
+                raise  # locked or I/O trouble: fail the request so the client backs off
+            except Exception as e:
+                results.append(['error', str(e)])
+        return results
+
+    def _approve(self, conn, usernames):
+        placeholders = ','.join('?' * len(usernames))
+        return conn.execute(f"UPDATE main.users SET approved = 1 WHERE username IN ({placeholders})",
+                            usernames).rowcount
+
+    def _add_user(self, conn, payload):
+        username, encrypted_data = payload
+        try:
+            conn.execute("INSERT INTO main.users (username, encrypted_data, approved) VALUES (?, ?, 0)",
+                         (username, encrypted_data))
+        except sqlite3.IntegrityError:
+            raise ServerError("Username already exists")
+        return True
+
+    def _mark_submission(self, conn, payload):
+        username, period = payload
+        return conn.execute("INSERT OR IGNORE INTO att.submissions (period, username) VALUES (?, ?)",
+                            (period, username)).rowcount == 1
+
+    WRITES = {OP_SUBMIT: '_submit', OP_APPROVE: '_approve',
+              OP_ADD_USER: '_add_user', OP_MARK_SUBMISSION: '_mark_submission'}
+
+    def _apply_group(self, group):
+        """Run a group of writes in one transaction; returns (ok, result) per request."""
+        conn = self._connection()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for opcode, payload in group:
+                conn.execute("SAVEPOINT request")
+                try:
+                    result = getattr(self, self.WRITES[opcode])(conn, payload)
+                    conn.execute("RELEASE request")
+                    results.append((True, result))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO request")
+                    conn.execute("RELEASE request")
+                    results.append((False, str(e)))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        self.stats['commits'] += 1
+        self.stats['writes'] += len(group)
+        return results
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._queue.get()]
+            # Give concurrent clients a moment to join this commit
+            await asyncio.sleep(self.group_window)
+            while len(group) < self.max_group and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(
+                    self._writer, self._apply_group, [(op, payload) for op, payload, _ in group])
+            except Exception as e:
+                results = [(False, str(e))] * len(group)
+            self._generation += 1
+            self._cache.clear()
+            for (_, _, future), result in zip(group, results):
+                if not future.done():
+                    future.set_result(result)
+
+    # Reads -----------------------------------------------------------------
+
+    @staticmethod
+    def _manager_chain(conn, username):
+        chain = []
+        current = username
+        while len(chain) < 64:
+            row = conn.execute('''
+                SELECT m.name FROM hier.employees e
+                JOIN hier.employees m ON e.manager_id = m.id
+                WHERE e.name = ?
+            ''', (current,)).fetchone()
+            if not row:
+                break
+            chain.append(row[0])
+            current = row[0]
+        return chain
+
+    @staticmethod
+    def _all_reportees(conn, manager):
+        """[direct, indirect] reportee names of manager."""
+        rows = conn.execute('''
+            WITH RECURSIVE subordinates AS (
+                SELECT e.id, e.name, 1 AS level FROM hier.employees e
+                JOIN hier.employees m ON e.manager_id = m.id WHERE m.name = ?
+                UNION ALL
+                SELECT e.id, e.name, s.level + 1 FROM hier.employees e
+                JOIN subordinates s ON e.manager_id = s.id
+            )
+            SELECT name, level FROM subordinates
+        ''', (manager,)).fetchall()
+        return [[name for name, level in rows if level == 1], [name for name, level in rows if level > 1]]
+
+    @staticmethod
+    def _scalar(conn, sql, params):
+        row = conn.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    QUERIES = {
+        'username_exists': lambda conn, username: FeedbackServer._scalar(
+            conn, "SELECT 1 FROM main.users WHERE username = ?", (username,)) is not None,
+        'user_secret': lambda conn, username: FeedbackServer._scalar(
+            conn, "SELECT encrypted_data FROM main.users WHERE username = ?", (username,)),
+        'unapproved_reportees': lambda conn, usernames: [r[0] for r in conn.execute(
+            f"SELECT username FROM main.users WHERE username IN ({','.join('?' * len(usernames))}) "
+            "AND approved = 0", usernames)],
+        'response_count': lambda conn, manager, period: FeedbackServer._scalar(
+            conn, "SELECT COUNT(*) FROM main.feedback_responses WHERE period = ? AND manager = ?",
+            (period, manager)),
+        'submission_count': lambda conn, period: FeedbackServer._scalar(
+            conn, "SELECT COUNT(*) FROM att.submissions WHERE period = ?", (period,)),
+        'user_status': lambda conn, username: bool(FeedbackServer._scalar(
+            conn, "SELECT approved FROM main.users WHERE username = ?", (username,))),
+        'unapproved': lambda conn: [r[0] for r in conn.execute(
+            "SELECT username FROM main.users WHERE approved = 0")],
+        'manager_chain': lambda conn, username: FeedbackServer._manager_chain(conn, username),
+        'current_period': lambda conn: FeedbackServer._scalar(
+            conn, "SELECT period FROM att.current_cycle", ()),
+        'has_submitted': lambda conn, username, period: FeedbackServer._scalar(
+            conn, "SELECT 1 FROM att.submissions WHERE period = ? AND username = ?",
+            (period, username)) is not None,
+        'submitted_among': lambda conn, period, usernames: FeedbackServer._scalar(
+            conn, f"SELECT COUNT(DISTINCT username) FROM att.submissions WHERE period = ? "
+            f"AND username IN ({','.join('?' * len(usernames))})", (period, *usernames)),
+        'employee_exists': lambda conn, name: FeedbackServer._scalar(
+            conn, "SELECT 1 FROM hier.employees WHERE name = ?", (name,)) is not None,
+        'direct_reportees': lambda conn, manager: [r[0] for r in conn.execute(
+            "SELECT e.name FROM hier.employees e JOIN hier.employees m ON e.manager_id = m.id "
+            "WHERE m.name = ?", (manager,))],
+        'all_reportees': lambda conn, manager: FeedbackServer._all_reportees(conn, manager),
+        'hierarchy': lambda conn: [list(r) for r in conn.execute(
+            "SELECT id, name, manager_id FROM hier.employees")],
+        'manager_responses': lambda conn, manager, period, include_unapproved: [list(r) for r in conn.execute(
+            "SELECT id, question_id, response FROM main.feedback_responses "
+            "WHERE period = ? AND manager = ? AND (approval_status = 1 OR ? = 1) AND response IS NOT NULL",
+            (period, manager, int(include_unapproved)))],
+        'general_feedback': lambda conn, manager, period, include_unapproved: [list(r) for r in conn.execute(
+            "SELECT general_feedback, timestamp FROM main.feedback_responses "
+            "WHERE period = ? AND manager = ? AND (approval_status = 1 OR ? = 1) AND general_feedback IS NOT NULL",
+            (period, manager, int(include_unapproved)))],
+    }
+
+    def _run_query(self, name, args):
+        return self.QUERIES[name](self._connection(), *args)
+
+    def _read_data_versions(self):
+        # Changes only when another connection commits to the file
+        conn = self._connection()
+        return tuple(conn.execute(f"PRAGMA {schema}.data_version").fetchone()[0]
+                     for schema in ('main', 'att', 'hier'))
+
+    async def _query(self, payload):
+        name, args = payload[0], payload[1:]
+        if name not in self.QUERIES:
+            raise ServerError(f"Unknown query {name}")
+        key = bytes(pack_value(payload))
+        self.stats['reads'] += 1
+        loop = asyncio.get_running_loop()
+        versions = await loop.run_in_executor(self._reader, self._read_data_versions)
+        if versions != self._data_versions:
+            # Another connection committed: a DRT rollover or restore, or our own writer
+            self._data_versions = versions
+            self._generation += 1
+            self._cache.clear()
+        if key in self._cache:
+            self.stats['cache_hits'] += 1
+            return self._cache[key]
+        generation = self._generation
+        result = await loop.run_in_executor(self._reader, self._run_query, name, args)
+        # Don't cache a result that a commit may have overtaken
+        if generation == self._generation:
+            self._cache[key] = result
+        return result
+
+    # Connections -----------------------------------------------------------
+
+    async def _handle_request(self, opcode, request_id, payload, writer):
+        try:
+            if opcode == OP_PING:
+                reply = (True, 'pong')
+            elif opcode in self.WRITES:
+                future = asyncio.get_running_loop().create_future()
+                await self._queue.put((opcode, payload, future))
+                reply = await future
+            elif opcode == OP_QUERY:
+                reply = (True, await self._query(payload))
+            else:
+                reply = (False, f"Unknown opcode {opcode}")
+        except Exception as e:
+            reply = (False, str(e))
+        ok, result = reply
+        writer.write(encode_frame(OP_OK if ok else OP_ERROR, request_id, result))
+        await writer.drain()
+
+    async def _handle_client(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(FRAME.size)
+                length, opcode, request_id = FRAME.unpack(header)
+                body = await reader.readexactly(length - (FRAME.size - 4))
+                payload, _ = unpack_value(body)
+                # Requests are pipelined; replies carry the request id
+                task = asyncio.create_task(self._handle_request(opcode, request_id, payload, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, ready=None):
+        conn = sqlite3.connect(self.feedback_db)
+        try:
+            with conn:
+                for ddl in FEEDBACK_TABLES:
+                    conn.execute(ddl)
+        finally:
+            conn.close()
+        SurveyCycleManager(self.attendance_db, self.feedback_db).ensure_schema()
+        self._queue = asyncio.Queue()
+        writer_task = asyncio.create_task(self._writer_loop())
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        if ready:
+            ready()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            writer_task.cancel()
+
+    def run(self):
+        asyncio.run(self.serve())
+
+
+class FeedbackClient:
+    """Blocking client for FeedbackServer, safe to share between threads."""
+
+    ENV_VAR = 'FEEDBACK_SERVER'
+
+    def __init__(self, host='127.0.0.1', port=8765, timeout=30):
+        self.address = (host, port)
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    @classmethod
+    def from_env(cls):
+        """Client for host:port in FEEDBACK_SERVER, or None when server mode is off."""
+        address = os.environ.get(cls.ENV_VAR)
+        if not address:
+            return None
+        host, _, port = address.rpartition(':')
+        return cls(host or '127.0.0.1', int(port))
+
+    def _recv_exactly(self, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Feedback server closed the connection")
+            data += chunk
+        return data
+
+    def call(self, opcode, payload=None):
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._sock = socket.create_connection(self.address, timeout=self.timeout)
+                    self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+                self._sock.sendall(encode_frame(opcode, self._next_id, payload))
+                length, reply_op, request_id = FRAME.unpack(self._recv_exactly(FRAME.size))
+                result, _ = unpack_value(self._recv_exactly(length - (FRAME.size - 4)))
+            except OSError:
+                self.close()
+                raise
+        if reply_op == OP_ERROR:
+            raise ServerError(result)
+        return result
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def ping(self):
+        return self.call(OP_PING)
+
+    def submit(self, submissions):
+        """submissions: [submission_id, username, period, rows]; returns [status, error] each."""
+        return self.call(OP_SUBMIT, submissions)
+
+    def approve_users(self, usernames):
+        return self.call(OP_APPROVE, list(usernames))
+
+    def add_user(self, username, encrypted_data):
+        return self.call(OP_ADD_USER, [username, encrypted_data])
+
+    def mark_submission(self, username, period):
+        """True when recorded, False when the user already submitted for period."""
+        return self.call(OP_MARK_SUBMISSION, [username, period])
+
+    def query(self, name, *args):
+        return self.call(OP_QUERY, [name, *args])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Single-writer server for the feedback databases")
+    parser.add_argument('--data-dir', default='.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+    print(f"Serving {os.path.abspath(args.data_dir)} on {args.host}:{args.port}")
+    FeedbackServer(args.data_dir, args.host, args.port).run()
@@ -0,0 +1,307 @@
+"""Month-end load test for the feedback submission path.
+
+Spawns worker processes that each replay SurveyApp.submit_feedback without
+the GUI (hierarchy lookup, encryption for the manager chain, attendance
+check, storing the rows) for a slice of synthetic users, then reports
+throughput, latency percentiles, lock-wait time and failures.
+
+    python loadtest.py --users 2000 --workers 16 --mode outbox
+    python loadtest.py --users 2000 --workers 16 --mode direct
+    python loadtest.py --users 2000 --workers 16 --mode server
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+MODES = ('outbox', 'direct', 'server')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def prepare_data_dir(data_dir, users, fanout=8):
+    """Create hierarchy.db, feedback.db, attendance.db and manager keys for `users` employees."""
+    data_dir = Path(data_dir).resolve()
+    data_dir.mkdir(parents=True, exist_ok=True)
+    keys_dir = data_dir / 'keys'
+    keys_dir.mkdir(exist_ok=True)
+    os.chdir(data_dir)
+    from UI import CryptographyManager, FeedbackDatabase, AttendanceDB
+
+    names = [f"emp{i:05d}" for i in range(users + 1)]
+    conn = sqlite3.connect('hierarchy.db')
+    conn.execute("DROP TABLE IF EXISTS employees")
+    conn.execute('''
+        CREATE TABLE employees (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            position TEXT,
+            manager_id INTEGER,
+            FOREIGN KEY (manager_id) REFERENCES employees(id) ON DELETE SET NULL
+        )
+    ''')
+    # Employee i (1-based id) reports to (i - 2) // fanout + 1; id 1 is the root
+    conn.executemany(
+        "INSERT INTO employees (id, name, position, manager_id) VALUES (?, ?, ?, ?)",
+        [(i + 1, name, 'Employee', (i - 1) // fanout + 1 if i else None) for i, name in enumerate(names)]
+    )
+    conn.commit()
+    managers = [row[0] for row in conn.execute(
+        "SELECT DISTINCT m.name FROM employees e JOIN employees m ON e.manager_id = m.id")]
+    conn.close()
+
+    crypto = CryptographyManager()
+    crypto.keys_dir = keys_dir
+    for manager in managers:
+        if not crypto.public_key_exists(manager):
+            _, public_key = crypto._generate_keys()
+            crypto._save_public_key(public_key, keys_dir / f"{manager}_public.pem")
+
+    feedback_db = FeedbackDatabase()
+    feedback_db.conn.executemany(
+        "INSERT OR IGNORE INTO users (username, encrypted_data, approved) VALUES (?, ?, ?)",
+        [(name, 'loadtest', random.random() < 0.8) for name in names[1:]]
+    )
+    feedback_db.conn.commit()
+    AttendanceDB()
+    return names[1:]
+
+
+def reset_run_state(data_dir):
+    """Clear submissions so the same users can submit again."""
+    conn = sqlite3.connect(Path(data_dir) / 'attendance.db')
+    period = conn.execute("SELECT period FROM current_cycle").fetchone()[0]
+    conn.execute("DELETE FROM submissions WHERE period = ?", (period,))
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(Path(data_dir) / 'feedback.db')
+    conn.execute("DELETE FROM feedback_responses WHERE period = ?", (period,))
+    conn.execute("DROP TABLE IF EXISTS received_submissions")
+    conn.commit()
+    conn.close()
+    for path in (Path(data_dir) / 'outboxes').glob('*.db*'):
+        path.unlink()
+
+
+def _write_direct(attendance_db, username, period, rows):
+    """The pre-outbox write path: attendance first, then every row straight into feedback.db."""
+    if not attendance_db.mark_submission(username):
+        raise RuntimeError("already submitted this cycle")
+    conn = sqlite3.connect('feedback.db')
+    conn.isolation_level = None
+    try:
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        lock_wait = time.perf_counter() - started
+        for row in rows:
+            conn.execute('''
+                INSERT INTO feedback_responses
+                (manager, reportee_type, question_id, response, general_feedback, approval_status, period)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (row['manager'], row['reportee_type'], row.get('question_id'), row.get('response'),
+                  row.get('general_feedback'), row['approval_status'], period))
+        conn.execute("COMMIT")
+        return lock_wait
+    finally:
+        conn.close()
+
+
+def _write_outbox(outbox, username, period, rows, deadline=60.0):
+    """Queue and flush until the submission settles, backing off like the UI flusher."""
+    submission_id = outbox.submit(username, period, rows)
+    started = time.perf_counter()
+    delay = 0.0
+    while outbox.status(submission_id) == 'pending':
+        try:
+            outbox.flush_once()
+            delay = 0.0
+        except (sqlite3.Error, OSError):
+            if time.perf_counter() - started > deadline:
+                raise
+            delay = min(outbox.max_backoff, max(0.05, delay * 2))
+            time.sleep(delay * random.uniform(0.5, 1.0))
+    status = outbox.status(submission_id)
+    if status != 'stored':
+        raise RuntimeError(f"submission {status}")
+
+
+def _worker(job):
+    data_dir, mode, usernames, start_at, questions, think_ms, server = job
+    os.chdir(data_dir)
+    if mode == 'server':
+        os.environ['FEEDBACK_SERVER'] = server
+    import UI
+    from UI import FeedbackDatabase, AttendanceDB, HierarchyValidator
+    from outbox import SubmissionOutbox
+    from feedback_server import FeedbackClient
+
+    # UI reads FEEDBACK_SERVER at import time; set it explicitly in case UI
+    # was already imported (e.g. inherited from the parent) with another mode
+    UI.SERVER = FeedbackClient.from_env() if mode == 'server' else None
+
+    feedback_db = FeedbackDatabase()
+    feedback_db.crypto.keys_dir = Path(data_dir) / 'keys'
+    attendance_db = AttendanceDB()
+    outbox_dir = Path(data_dir) / 'outboxes'
+    outbox_dir.mkdir(exist_ok=True)
+    # retry_delay=0: a rejected submission settles within the run instead of waiting to be fixed
+    outbox = SubmissionOutbox(outbox_dir / f"worker_{os.getpid()}.db", busy_timeout=5.0,
+                              max_backoff=2.0, client=UI.SERVER, retry_delay=0)
+    responses = {f"Q{q}": random.randint(1, 5) for q in range(1, questions + 1)}
+
+    time.sleep(max(0.0, start_at - time.time()))
+    records = []
+    for username in usernames:
+        if think_ms:
+            time.sleep(random.uniform(0, think_ms) / 1000)
+        began = time.time()
+        started = time.perf_counter()
+        lock_before = outbox.lock_wait
+        lock_wait = 0.0
+        error = None
+        try:
+            period = attendance_db.current_period()
+            if attendance_db.has_submitted(username, period):
+                raise RuntimeError("already submitted this cycle")
+            approval_status = feedback_db.get_user_status(username)
+            manager_chain = HierarchyValidator.get_manager_chain(username)
+            if not manager_chain:
+                raise RuntimeError("No management chain found")
+            missing = [m for m in manager_chain if not feedback_db.crypto.public_key_exists(m)]
+            if missing:
+                raise RuntimeError(f"missing keys for {', '.join(missing)}")
+            rows = feedback_db.encrypt_submission(manager_chain, responses,
+                                                  f"Load test comment from {username}", approval_status)
+            if mode == 'direct':
+                lock_wait = _write_direct(attendance_db, username, period, rows)
+            else:
+                _write_outbox(outbox, username, period, rows)
+                lock_wait = outbox.lock_wait - lock_before
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        records.append((os.getpid(), username, began, time.perf_counter() - started, lock_wait, error))
+    return records
+
+
+def write_timeseries(records, path, t0):
+    buckets = {}
+    for _, _, began, latency, lock_wait, error in records:
+        buckets.setdefault(int(began + latency - t0), []).append((latency, lock_wait, error))
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['second', 'completed', 'failed', 'p50_ms', 'p99_ms', 'lock_wait_ms'])
+        for second in range(max(buckets, default=-1) + 1):
+            items = buckets.get(second, [])
+            ok = [latency for latency, _, error in items if error is None]
+            writer.writerow([
+                second, len(ok), len(items) - len(ok),
+                round(percentile(ok, 50) * 1000, 1), round(percentile(ok, 99) * 1000, 1),
+                round(sum(lock for _, lock, _ in items) * 1000, 1),
+            ])
+
+
+def summarize(records, mode, workers, elapsed):
+    ok = [r[3] for r in records if r[5] is None]
+    failures = {}
+    for r in records:
+        if r[5] is not None:
+            failures[r[5]] = failures.get(r[5], 0) + 1
+    lock_waits = [r[4] for r in records]
+    lines = [
+        f"Mode: {mode}    Workers: {workers}    Submissions: {len(records)}",
+        f"Elapsed: {elapsed:.2f}s    Throughput: {len(ok) / elapsed if elapsed else 0:.1f} submissions/s",
+        f"Latency p50: {percentile(ok, 50) * 1000:.1f} ms    p99: {percentile(ok, 99) * 1000:.1f} ms"
+        f"    max: {max(ok, default=0) * 1000:.1f} ms",
+        f"Lock wait total: {sum(lock_waits):.2f}s    p99: {percentile(lock_waits, 99) * 1000:.1f} ms",
+        f"Failures: {len(records) - len(ok)}",
+    ]
+    for error, count in sorted(failures.items(), key=lambda item: -item[1]):
+        lines.append(f"  {count:6d}  {error}")
+    return '\n'.join(lines)
+
+
+def start_server(data_dir, address):
+    from feedback_server import FeedbackClient
+    host, _, port = address.rpartition(':')
+    process = subprocess.Popen([sys.executable, str(Path(__file__).with_name('feedback_server.py')),
+                                '--data-dir', str(data_dir), '--host', host, '--port', port])
+    client = FeedbackClient(host, int(port), timeout=2)
+    for _ in range(100):
+        try:
+            client.ping()
+            client.close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Feedback server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--mode', choices=MODES, default='outbox')
+    parser.add_argument('--data-dir', default='loadtest_data')
+    parser.add_argument('--server', default='127.0.0.1:8765',
+                        help="feedback server address; started automatically in server mode if not running")
+    parser.add_argument('--questions', type=int, default=10)
+    parser.add_argument('--think-ms', type=int, default=0, help="random pause before each submission")
+    parser.add_argument('--out', default='loadtest_results')
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    data_dir = Path(args.data_dir).resolve()
+    out_dir = Path(args.out).resolve()
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"Preparing {args.users} users in {data_dir}...")
+    usernames = prepare_data_dir(data_dir, args.users)
+    reset_run_state(data_dir)
+
+    server = None
+    if args.mode == 'server':
+        from feedback_server import FeedbackClient
+        host, _, port = args.server.rpartition(':')
+        try:
+            FeedbackClient(host, int(port), timeout=2).ping()
+        except OSError:
+            server = start_server(data_dir, args.server)
+
+    try:
+        slices = [usernames[i::args.workers] for i in range(args.workers)]
+        start_at = time.time() + 2.0  # let every worker finish importing first
+        jobs = [(str(data_dir), args.mode, users, start_at, args.questions, args.think_ms, args.server)
+                for users in slices if users]
+        # spawn, not fork: the parent has already imported UI and opened the databases
+        with multiprocessing.get_context('spawn').Pool(len(jobs)) as pool:
+            records = [record for chunk in pool.map(_worker, jobs) for record in chunk]
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    finished = max((r[2] + r[3] for r in records), default=start_at)
+    report = summarize(records, args.mode, args.workers, finished - start_at)
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    write_timeseries(records, out_dir / f"loadtest_{args.mode}_{stamp}.csv", start_at)
+    with open(out_dir / f"loadtest_{args.mode}_{stamp}.txt", 'w') as f:
+        f.write(report + '\n')
+    print(report)
+    print(f"Results written to {out_dir}")
+
+
+if __name__ == '__main__':
+    main()
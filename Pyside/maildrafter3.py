@@ -6,6 +6,7 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                                QPushButton, QLabel, QFileDialog, QMessageBox, 
                                QTextEdit, QLineEdit, QTableWidget, QTableWidgetItem)
 from PySide6.QtCore import Qt
+from compliance import ComplianceAnalyzer
 
 class EmailDraftApp(QMainWindow):
     def __init__(self):
@@ -104,35 +105,16 @@ class EmailDraftApp(QMainWindow):
         self.results_table.setRowCount(0)
 
         try:
-            hier_conn = sqlite3.connect('hierarchy.db')
-            fb_conn = sqlite3.connect('feedback.db')
-            att_conn = sqlite3.connect('attendance.db')
-
-            for _, row in self.excel_data.iterrows():
-                name = row['Name']
-                email = row['Email']
-
-                # Check hierarchy
-                if not hier_conn.execute("SELECT 1 FROM employees WHERE name = ?", (name,)).fetchone():
-                    continue
-
-                # Check registration
-                registered = fb_conn.execute("SELECT 1 FROM users WHERE username = ?", (name,)).fetchone()
-                submitted = att_conn.execute("SELECT 1 FROM submissions WHERE username = ?", (name,)).fetchone()
-
-                status = ""
-                if not registered:
-                    self.results['unregistered'].append((name, email))
-                    status = "Unregistered"
-                elif not submitted:
-                    self.results['not_submitted'].append((name, email))
-                    status = "Pending Submission"
-                else:
-                    continue
-
-                # Add to table
-                row_pos = self.results_table.rowCount()
-                self.results_table.insertRow(row_pos)
+            classified = ComplianceAnalyzer().classify(
+                ComplianceAnalyzer.roster_from_dataframe(self.excel_data)
+            )
+            self.results['unregistered'] = classified['not_registered']
+            self.results['not_submitted'] = classified['pending']
+
+            rows = ([(name, email, "Unregistered") for name, email in self.results['unregistered']] +
+                    [(name, email, "Pending Submission") for name, email in self.results['not_submitted']])
+            self.results_table.setRowCount(len(rows))
+            for row_pos, (name, email, status) in enumerate(rows):
                 self.results_table.setItem(row_pos, 0, QTableWidgetItem(name))
                 self.results_table.setItem(row_pos, 1, QTableWidgetItem(email))
                 status_item = QTableWidgetItem(status)
@@ -146,10 +128,6 @@ class EmailDraftApp(QMainWindow):
 
         except sqlite3.Error as e:
             QMessageBox.critical(self, "Database Error", str(e))
-        finally:
-            hier_conn.close()
-            fb_conn.close()
-            att_conn.close()
 
     def create_drafts(self):
         if not self.results['unregistered'] and not self.results['not_submitted']:
@@ -0,0 +1,161 @@
+import re
+
+_SEGMENT = re.compile(r'&?\[(?:[^\]]|\]\])*\]')
+
+
+def hierarchy_of(expression):
+    """'[Dim].[Hierarchy]' of a unique name or '<unique name>.Members'; '[Measures]' for measures."""
+    segments = _SEGMENT.findall(expression)
+    if not segments:
+        return expression
+    if segments[0].lower() == '[measures]':
+        return '[Measures]'
+    return '.'.join(segments[:2])
+
+
+class Ref:
+    """One item picked in the builder: a member, a measure or a '<level|hierarchy>.Members' set."""
+
+    def __init__(self, text):
+        self.text = text.strip()
+        self.hierarchy = hierarchy_of(self.text)
+        self.is_set = self.text.lower().endswith(('.members', '.children', '.allmembers'))
+
+    @property
+    def key(self):
+        return self.text.lower()
+
+    def to_mdx(self):
+        return self.text
+
+
+class SetExpr:
+    def __init__(self, items):
+        self.items = list(items)
+
+    def to_mdx(self):
+        return f"{{ {', '.join(item.to_mdx() for item in self.items)} }}"
+
+
+class CrossJoin:
+    def __init__(self, sets):
+        self.sets = list(sets)
+
+    def to_mdx(self):
+        return f"CrossJoin( {', '.join(s.to_mdx() for s in self.sets)} )"
+
+
+class NonEmpty:
+    def __init__(self, set_expr, measures=None):
+        self.set_expr = set_expr
+        self.measures = measures
+
+    def to_mdx(self):
+        if self.measures is None:
+            return f"NonEmpty( {self.set_expr.to_mdx()} )"
+        return f"NonEmpty( {self.set_expr.to_mdx()}, {self.measures.to_mdx()} )"
+
+
+class Axis:
+    def __init__(self, name, set_expr, non_empty=False):
+        self.name = name
+        self.set_expr = set_expr
+        self.non_empty = non_empty
+
+    def to_mdx(self):
+        return f"{'NON EMPTY ' if self.non_empty else ''}{self.set_expr.to_mdx()} ON {self.name}"
+
+
+class SelectQuery:
+    """SELECT axes FROM cube, optionally restricted by subselects and a WHERE tuple."""
+
+    def __init__(self, cube, axes, where=None, subselects=None):
+        self.cube = cube
+        self.axes = axes
+        self.where = where or []
+        self.subselects = subselects or []
+
+    def _source(self, depth=0):
+        if depth == len(self.subselects):
+            return f"[{self.cube}]"
+        pad = '    ' * (depth + 1)
+        return (f"(\n{pad}SELECT {self.subselects[depth].to_mdx()} ON COLUMNS\n"
+                f"{pad}FROM {self._source(depth + 1)}\n{'    ' * depth})")
+
+    def to_mdx(self):
+        mdx = "SELECT\n    " + ",\n    ".join(axis.to_mdx() for axis in self.axes) + f"\nFROM {self._source()}"
+        if self.where:
+            mdx += f"\nWHERE ( {', '.join(ref.to_mdx() for ref in self.where)} )"
+        return mdx
+
+
+def build_query(cube, columns, rows, filters, non_empty_columns=False, non_empty_rows=False):
+    """The query exactly as picked: each axis one set, every filter in the WHERE tuple."""
+    axes = []
+    if columns:
+        axes.append(Axis('COLUMNS', SetExpr(Ref(c) for c in columns), non_empty_columns))
+    if rows:
+        axes.append(Axis('ROWS', SetExpr(Ref(r) for r in rows), non_empty_rows))
+    return SelectQuery(cube, axes, where=[Ref(f) for f in filters])
+
+
+def _dedupe(refs):
+    """Drop repeats, and members already covered by a '.Members' set of their hierarchy."""
+    whole = {ref.hierarchy for ref in refs if ref.is_set and ref.key.endswith('.members')
+             and ref.key.count('[') == 2}
+    seen, kept = set(), []
+    for ref in refs:
+        if ref.key in seen or (not ref.is_set and ref.hierarchy in whole):
+            continue
+        seen.add(ref.key)
+        kept.append(ref)
+    return kept
+
+
+def _group(refs):
+    groups = {}
+    for ref in refs:
+        groups.setdefault(ref.hierarchy, []).append(ref)
+    return list(groups.values())
+
+
+def optimize(query):
+    """Rewrite a build_query() result into a cheaper, equivalent query.
+
+    - repeated items and members already inside a '.Members' set are dropped
+    - an axis spanning several hierarchies becomes CrossJoin of one set per
+      hierarchy (a plain set mixing hierarchies is not valid MDX)
+    - a NON EMPTY row axis becomes NonEmpty(CrossJoin(...), <column
+      measures>), so empty combinations are removed before the axis is built
+    - filters with several members of a hierarchy, or on a hierarchy that is
+      also on an axis, move into subselects; single members stay in WHERE
+    """
+    axes = []
+    axis_hierarchies = set()
+    column_measures = []
+    for axis in query.axes:
+        refs = _dedupe(axis.set_expr.items)
+        groups = _group(refs)
+        axis_hierarchies.update(group[0].hierarchy for group in groups)
+        if axis.name == 'COLUMNS':
+            column_measures = [ref for ref in refs if ref.hierarchy == '[Measures]']
+        if len(groups) == 1:
+            axes.append(Axis(axis.name, SetExpr(refs), axis.non_empty))
+            continue
+        crossjoin = CrossJoin(SetExpr(group) for group in groups)
+        if axis.non_empty and axis.name == 'ROWS':
+            measures = SetExpr(column_measures) if column_measures else None
+            axes.append(Axis(axis.name, NonEmpty(crossjoin, measures)))
+        else:
+            axes.append(Axis(axis.name, crossjoin, axis.non_empty))
+
+    where, subselects = [], []
+    for group in _group(_dedupe(query.where)):
+        hierarchy = group[0].hierarchy
+        if hierarchy == '[Measures]':
+            where.extend(group)
+        elif len(group) > 1 or group[0].is_set or hierarchy in axis_hierarchies:
+            subselects.append(SetExpr(group))
+        else:
+            where.extend(group)
+    return SelectQuery(query.cube, axes, where=where, subselects=subselects)
@@ -0,0 +1,439 @@
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+def is_transient(error):
+    """True for failures worth retrying as-is: locks, busy files, an unreachable share or server."""
+    if isinstance(error, OSError):
+        return True
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class SubmissionOutbox:
+    """Per-client durable queue between the survey form and the shared databases.
+
+    submit() only appends to a small SQLite file on the local disk and
+    returns the submission id, so the UI never waits on the shared folder.
+    A background flusher moves queued submissions into feedback.db and
+    attendance.db in batches, with a busy timeout and exponential backoff
+    while the shared files are locked. Every submission carries a UUID that
+    is recorded in feedback.db in the same transaction as its rows, so a
+    retry after a lost commit acknowledgement can never insert it twice.
+    A submission the shared databases reject is retried on its own after
+    an exponentially growing delay (retry_delay, 2 * retry_delay, ...), so
+    whoever looks after the shared data has time to fix the cause. After
+    max_attempts rejections it moves to the dead_letters table so the
+    submissions queued behind it keep flowing. Duplicates and dead letters
+    are handed to the UI once through take_notices().
+    """
+
+    ROW_COLUMNS = ('manager', 'reportee_type', 'question_id', 'response',
+                   'general_feedback', 'approval_status')
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, outbox_path=None, feedback_db='feedback.db', attendance_db='attendance.db',
+                 batch_size=50, busy_timeout=5.0, max_backoff=60.0, client=None, max_attempts=5,
+                 retry_delay=30.0):
+        if outbox_path is None:
+            outbox_dir = Path.home() / '.feedback_outbox'
+            outbox_dir.mkdir(parents=True, exist_ok=True)
+            outbox_path = outbox_dir / f"outbox_{socket.gethostname()}.db"
+        self.outbox_path = str(outbox_path)
+        self.feedback_db = feedback_db
+        self.attendance_db = attendance_db
+        self.batch_size = batch_size
+        self.busy_timeout = busy_timeout
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # With a FeedbackClient the batches go to the feedback server instead of the files
+        self.client = client
+        # Seconds spent waiting for the shared write lock, for load tests
+        self.lock_wait = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._create_tables()
+
+    @classmethod
+    def shared(cls):
+        """The process-wide outbox, with its flusher already running."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                from feedback_server import FeedbackClient
+                cls._shared = cls(client=FeedbackClient.from_env())
+                cls._shared.start()
+            return cls._shared
+
+    def _local(self):
+        conn = sqlite3.connect(self.outbox_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def _create_tables(self):
+        conn = self._local()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outbox (
+                    submission_id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS outbox_rows (
+                    submission_id TEXT NOT NULL REFERENCES outbox(submission_id),
+                    manager TEXT NOT NULL,
+                    reportee_type TEXT NOT NULL,
+                    question_id TEXT,
+                    response TEXT,
+                    general_feedback TEXT,
+                    approval_status BOOLEAN NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    submission_id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    period TEXT NOT NULL,
+                    created_at DATETIME,
+                    failed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT
+                )
+            ''')
+            # Outbox files outlive upgrades on the clients' disks
+            for table, column, ddl in (
+                ('outbox', 'next_attempt_at', 'REAL NOT NULL DEFAULT 0'),
+                ('outbox', 'notified', 'BOOLEAN NOT NULL DEFAULT 0'),
+                ('dead_letters', 'notified', 'BOOLEAN NOT NULL DEFAULT 0'),
+            ):
+                if column not in {info[1] for info in conn.execute(f"PRAGMA table_info({table})")}:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_rows_id ON outbox_rows(submission_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, created_at)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def submit(self, username, period, rows):
+        """Queue one survey submission; rows are dicts keyed by ROW_COLUMNS."""
+        submission_id = uuid.uuid4().hex
+        conn = self._local()
+        try:
+            with conn:
+                conn.execute(
+                    "INSERT INTO outbox (submission_id, username, period) VALUES (?, ?, ?)",
+                    (submission_id, username, period)
+                )
+                conn.executemany(
+                    f"INSERT INTO outbox_rows (submission_id, {', '.join(self.ROW_COLUMNS)}) "
+                    f"VALUES (?, {', '.join('?' * len(self.ROW_COLUMNS))})",
+                    [(submission_id, *(row.get(col) for col in self.ROW_COLUMNS)) for row in rows]
+                )
+        finally:
+            conn.close()
+        self._wake.set()
+        return submission_id
+
+    def has_pending(self, username, period):
+        conn = self._local()
+        try:
+            return conn.execute(
+                "SELECT 1 FROM outbox WHERE username = ? AND period = ? AND status = 'pending'",
+                (username, period)
+            ).fetchone() is not None
+        finally:
+            conn.close()
+
+    def status(self, submission_id):
+        conn = self._local()
+        try:
+            row = conn.execute("SELECT status FROM outbox WHERE submission_id = ?",
+                               (submission_id,)).fetchone()
+            if row is None and conn.execute("SELECT 1 FROM dead_letters WHERE submission_id = ?",
+                                            (submission_id,)).fetchone():
+                return 'dead'
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def dead_letters(self):
+        """(submission_id, username, period, failed_at, attempts, last_error) of given-up submissions."""
+        conn = self._local()
+        try:
+            return conn.execute('''
+                SELECT submission_id, username, period, failed_at, attempts, last_error
+                FROM dead_letters ORDER BY failed_at
+            ''').fetchall()
+        finally:
+            conn.close()
+
+    def requeue(self, submission_id):
+        """Put a dead-lettered submission back in the queue, e.g. after the shared data was fixed."""
+        conn = self._local()
+        try:
+            with conn:
+                moved = conn.execute('''
+                    INSERT INTO outbox (submission_id, username, period, created_at)
+                    SELECT submission_id, username, period, created_at FROM dead_letters
+                    WHERE submission_id = ?
+                ''', (submission_id,)).rowcount
+                conn.execute("DELETE FROM dead_letters WHERE submission_id = ?", (submission_id,))
+        finally:
+            conn.close()
+        if moved:
+            self._wake.set()
+        return bool(moved)
+
+    def take_notices(self, username):
+        """(status, period, error) for this user's duplicate or dead-lettered submissions not yet shown.
+
+        Each one is returned once; the caller is expected to tell the user.
+        """
+        conn = self._local()
+        try:
+            with conn:
+                notices = conn.execute('''
+                    SELECT 'duplicate', period, last_error FROM outbox
+                    WHERE username = ? AND status = 'duplicate' AND NOT notified
+                    UNION ALL
+                    SELECT 'dead', period, last_error FROM dead_letters WHERE username = ? AND NOT notified
+                ''', (username, username)).fetchall()
+                conn.execute("UPDATE outbox SET notified = 1 WHERE username = ? AND status = 'duplicate'",
+                             (username,))
+                conn.execute("UPDATE dead_letters SET notified = 1 WHERE username = ?", (username,))
+            return notices
+        finally:
+            conn.close()
+
+    def next_attempt_in(self):
+        """Seconds until the earliest pending submission is due, or None when nothing is pending."""
+        conn = self._local()
+        try:
+            due = conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        finally:
+            conn.close()
+        return None if due is None else max(0.0, due - time.time())
+
+    def pending_count(self):
+        conn = self._local()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM outbox WHERE status = 'pending'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _shared_connection(self):
+        conn = sqlite3.connect(self.feedback_db, timeout=self.busy_timeout)
+        conn.isolation_level = None
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+        conn.execute("ATTACH DATABASE ? AS att", (self.attendance_db,))
+        self.create_received_table(conn)
+        return conn
+
+    @classmethod
+    def store_submission(cls, conn, submission_id, username, period, rows):
+        """Write one submission inside the caller's transaction; returns (status, error).
+
+        conn has feedback.db as main and attendance.db attached as att.
+        rows are value tuples in ROW_COLUMNS order. A submission the
+        databases reject is rolled back to its own savepoint and reported
+        as 'error', so it never fails the rest of the batch; transient
+        errors (locks) are raised.
+        """
+        conn.execute("SAVEPOINT submission")
+        try:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO main.received_submissions (submission_id) VALUES (?)",
+                (submission_id,)
+            )
+            if cursor.rowcount == 0:
+                conn.execute("RELEASE submission")
+                return 'stored', None
+            try:
+                conn.execute("INSERT INTO att.submissions (period, username) VALUES (?, ?)",
+                             (period, username))
+            except sqlite3.IntegrityError:
+                # Already submitted for this cycle from another machine
+                conn.execute("ROLLBACK TO submission")
+                conn.execute("RELEASE submission")
+                return 'duplicate', 'already submitted this cycle'
+            conn.executemany(f'''
+                INSERT INTO main.feedback_responses ({', '.join(cls.ROW_COLUMNS)}, period)
+                VALUES ({', '.join('?' * len(cls.ROW_COLUMNS))}, ?)
+            ''', [(*values, period) for values in rows])
+            conn.execute("RELEASE submission")
+            return 'stored', None
+        except sqlite3.Error as e:
+            conn.execute("ROLLBACK TO submission")
+            conn.execute("RELEASE submission")
+            if is_transient(e):
+                raise
+            return 'error', str(e)
+
+    @staticmethod
+    def create_received_table(conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS main.received_submissions (
+                submission_id TEXT PRIMARY KEY,
+                received_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    def _store_batch(self, batch, rows):
+        """Send one batch to the server or the shared files; returns (status, error, submission_id) each."""
+        if self.client is not None:
+            results = self.client.submit([
+                [submission_id, username, period, rows.get(submission_id, [])]
+                for submission_id, username, period in batch
+            ])
+            return [(status, error, submission_id)
+                    for (status, error), (submission_id, _, _) in zip(results, batch)]
+
+        shared = self._shared_connection()
+        try:
+            # One short write transaction per batch instead of one per submission
+            started = time.perf_counter()
+            shared.execute("BEGIN IMMEDIATE")
+            self.lock_wait += time.perf_counter() - started
+            try:
+                outcomes = []
+                for submission_id, username, period in batch:
+                    status, error = self.store_submission(
+                        shared, submission_id, username, period, rows.get(submission_id, []))
+                    outcomes.append((status, error, submission_id))
+                shared.execute("COMMIT")
+            except Exception:
+                if shared.in_transaction:
+                    shared.execute("ROLLBACK")
+                raise
+        finally:
+            shared.close()
+        return outcomes
+
+    def flush_once(self):
+        """Move one batch of pending submissions into the shared databases.
+
+        Returns the number of submissions processed; submissions waiting out
+        a retry delay are left alone. A batch that is
+        rejected as a whole is retried one submission at a time, so the
+        error lands on the submission that caused it. Lock and connection
+        errors propagate so the caller can back off.
+        """
+        local = self._local()
+        try:
+            batch = local.execute('''
+                SELECT submission_id, username, period FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY created_at LIMIT ?
+            ''', (time.time(), self.batch_size)).fetchall()
+            if not batch:
+                return 0
+            rows = {}
+            for submission_id, *values in local.execute(f'''
+                SELECT submission_id, {', '.join(self.ROW_COLUMNS)} FROM outbox_rows
+                WHERE submission_id IN ({','.join('?' * len(batch))})
+            ''', [b[0] for b in batch]):
+                rows.setdefault(submission_id, []).append(values)
+        finally:
+            local.close()
+
+        try:
+            outcomes = self._store_batch(batch, rows)
+        except Exception as e:
+            if is_transient(e):
+                raise
+            outcomes = []
+            for item in batch:
+                try:
+                    outcomes += self._store_batch([item], rows)
+                except Exception as item_error:
+                    if is_transient(item_error):
+                        raise
+                    outcomes.append(('error', str(item_error), item[0]))
+
+        self._settle(outcomes)
+        return len(outcomes)
+
+    def _settle(self, outcomes):
+        """Record outcomes; rejected submissions are retried later until max_attempts, then dead-lettered."""
+        local = self._local()
+        try:
+            with local:
+                for status, error, submission_id in outcomes:
+                    if status != 'error':
+                        local.execute(
+                            "UPDATE outbox SET status = ?, last_error = ?, attempts = attempts + 1 "
+                            "WHERE submission_id = ?",
+                            (status, error, submission_id)
+                        )
+                        continue
+                    # Retrying at once would burn every attempt before anyone could fix the cause
+                    local.execute('''
+                        UPDATE outbox SET attempts = attempts + 1, last_error = ?,
+                            next_attempt_at = ? * (1 << MIN(attempts, 16)) + ?
+                        WHERE submission_id = ?
+                    ''', (error, self.retry_delay, time.time(), submission_id))
+                    moved = local.execute('''
+                        INSERT INTO dead_letters (submission_id, username, period, created_at, attempts, last_error)
+                        SELECT submission_id, username, period, created_at, attempts, last_error FROM outbox
+                        WHERE submission_id = ? AND attempts >= ?
+                    ''', (submission_id, self.max_attempts)).rowcount
+                    if moved:
+                        # Its rows stay in outbox_rows for inspection or requeue()
+                        local.execute("DELETE FROM outbox WHERE submission_id = ?", (submission_id,))
+        finally:
+            local.close()
+
+    def _record_failure(self, error):
+        # Transient failures say nothing about the submissions, so they don't count as attempts
+        local = self._local()
+        try:
+            with local:
+                local.execute("UPDATE outbox SET last_error = ? WHERE status = 'pending'", (str(error),))
+        finally:
+            local.close()
+
+    def _run(self):
+        # Imported here: feedback_server imports this module
+        from feedback_server import ServerError
+        delay = 0.0
+        while not self._stop.is_set():
+            try:
+                while self.flush_once():
+                    if self._stop.is_set():
+                        return
+                delay = 0.0
+                due = self.next_attempt_in()
+                self._wake.wait(30 if due is None else min(30, due))
+                self._wake.clear()
+            except (sqlite3.Error, OSError, ServerError) as e:
+                # Locked or unreachable shared folder, or the feedback server reporting the same:
+                # retry with jittered exponential backoff
+                self._record_failure(e)
+                delay = min(self.max_backoff, max(0.5, delay * 2))
+                self._stop.wait(delay * random.uniform(0.5, 1.0))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='outbox-flusher', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
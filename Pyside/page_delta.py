@@ -0,0 +1,260 @@
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import tempfile
+import zlib
+from pathlib import Path
+
+
+class PageDeltaSync:
+    """Ship SQLite databases through a synced folder as page-level deltas.
+
+    The publisher takes a consistent snapshot with the SQLite backup API,
+    hashes it in fixed-size pages and compares the hashes with the manifest
+    of its previous snapshot. Only pages that changed go into a compact
+    delta file in the shared folder (e.g. OneDrive), so a small edit no
+    longer re-uploads the whole .db. The subscriber applies deltas in order
+    to its own copy, keeping a pristine copy of the last snapshot next to
+    it as the base for the next delta. Both sides can be plain local
+    directories in tests.
+
+    Delta layout: MAGIC, 4-byte header length, JSON header, then for each
+    page a 4-byte page number, 4-byte length and the zlib'd page bytes.
+    """
+
+    MAGIC = b'SQLPGDELTA1\n'
+
+    def __init__(self, shared_dir, state_dir=None):
+        self.shared_dir = Path(shared_dir)
+        self.state_dir = Path(state_dir) if state_dir else self.shared_dir / '.delta_state'
+        self.shared_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def snapshot(db_path, dest_path, pages_per_step=1024):
+        """Copy db_path into dest_path with the online backup API."""
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(dest_path)
+        try:
+            src.backup(dst, pages=pages_per_step)
+        finally:
+            dst.close()
+            src.close()
+
+    @staticmethod
+    def page_hashes(path, page_size):
+        hashes = []
+        with open(path, 'rb') as f:
+            while True:
+                page = f.read(page_size)
+                if not page:
+                    break
+                hashes.append(hashlib.blake2b(page, digest_size=16).hexdigest())
+        return hashes
+
+    @staticmethod
+    def _page_size(path):
+        with open(path, 'rb') as f:
+            header = f.read(100)
+        size = struct.unpack('>H', header[16:18])[0]
+        return 65536 if size == 1 else size
+
+    @staticmethod
+    def _content_id(hashes):
+        return hashlib.sha256(''.join(hashes).encode()).hexdigest()[:32]
+
+    def _manifest_path(self, name):
+        return self.state_dir / f"{name}.publisher.json"
+
+    def _load_json(self, path):
+        if path.exists():
+            with open(path) as f:
+                return json.load(f)
+        return None
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def publish(self, db_path, full=False):
+        """Snapshot db_path and write a delta against the previous snapshot.
+
+        Returns the delta path, or None when nothing changed.
+        """
+        name = Path(db_path).name
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        manifest = None if full else self._load_json(self._manifest_path(name))
+
+        fd, snap_path = tempfile.mkstemp(suffix='.db', dir=self.state_dir)
+        os.close(fd)
+        try:
+            self.snapshot(db_path, snap_path)
+            page_size = self._page_size(snap_path)
+            hashes = self.page_hashes(snap_path, page_size)
+            new_id = self._content_id(hashes)
+
+            if manifest and manifest['page_size'] != page_size:
+                manifest = None  # page size changed (VACUUM), start over with a full delta
+            if manifest and manifest['id'] == new_id:
+                return None
+
+            old_hashes = manifest['hashes'] if manifest else []
+            changed = [i for i, h in enumerate(hashes) if i >= len(old_hashes) or old_hashes[i] != h]
+            seq = (manifest['seq'] + 1) if manifest else self._next_seq(name)
+            header = {
+                'db': name,
+                'seq': seq,
+                'page_size': page_size,
+                'page_count': len(hashes),
+                'base_id': manifest['id'] if manifest else None,
+                'new_id': new_id,
+                'pages': len(changed),
+            }
+
+            delta_path = self.shared_dir / f"{name}.{seq:08d}.delta"
+            tmp_path = delta_path.with_suffix('.partial')
+            header_bytes = json.dumps(header).encode()
+            with open(snap_path, 'rb') as snap, open(tmp_path, 'wb') as out:
+                out.write(self.MAGIC)
+                out.write(struct.pack('>I', len(header_bytes)))
+                out.write(header_bytes)
+                for page_no in changed:
+                    snap.seek(page_no * page_size)
+                    data = zlib.compress(snap.read(page_size))
+                    out.write(struct.pack('>II', page_no, len(data)))
+                    out.write(data)
+            # Rename last so the sync client never uploads a half-written delta
+            os.replace(tmp_path, delta_path)
+
+            self._write_json(self._manifest_path(name), {
+                'id': new_id, 'seq': seq, 'page_size': page_size, 'hashes': hashes,
+            })
+            return delta_path
+        finally:
+            os.remove(snap_path)
+
+    def _next_seq(self, name):
+        seqs = [self._delta_seq(p) for p in self.shared_dir.glob(f"{name}.*.delta")]
+        return max(seqs, default=0) + 1
+
+    @staticmethod
+    def _delta_seq(path):
+        return int(path.name.rsplit('.', 2)[-2])
+
+    @classmethod
+    def read_header(cls, delta_path):
+        with open(delta_path, 'rb') as f:
+            if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError(f"{delta_path} is not a page delta file")
+            (length,) = struct.unpack('>I', f.read(4))
+            return json.loads(f.read(length))
+
+    def apply_delta(self, delta_path, target_path):
+        """Apply one delta and copy the result into target_path with the backup API.
+
+        The pages are patched into a private copy of the last applied
+        snapshot (<target>.delta.base), whose bytes match the publisher's,
+        and checked there. The live database is then updated through the
+        backup API in one write transaction, like SnapshotManager.restore,
+        so connections the app holds open keep working and a WAL-mode target
+        keeps its WAL consistent instead of having it deleted under it.
+        """
+        target_path = Path(target_path)
+        state_path = target_path.with_name(target_path.name + '.delta.json')
+        base_path = target_path.with_name(target_path.name + '.delta.base')
+        state = self._load_json(state_path) or {}
+        header = self.read_header(delta_path)
+
+        if header['base_id'] is not None and header['base_id'] != state.get('id'):
+            raise ValueError(
+                f"{Path(delta_path).name} expects base {header['base_id']}, "
+                f"replica is at {state.get('id')}"
+            )
+
+        fd, work_path = tempfile.mkstemp(suffix='.db', dir=target_path.parent)
+        os.close(fd)
+        try:
+            if header['base_id'] is not None:
+                if not base_path.exists():
+                    # Replicas from before the base copy: fold any WAL into the file first
+                    conn = sqlite3.connect(target_path, timeout=30)
+                    try:
+                        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                    finally:
+                        conn.close()
+                with open(base_path if base_path.exists() else target_path, 'rb') as src, \
+                        open(work_path, 'wb') as dst:
+                    while True:
+                        chunk = src.read(1 << 20)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+
+            page_size = header['page_size']
+            with open(delta_path, 'rb') as delta, open(work_path, 'r+b') as out:
+                delta.seek(len(self.MAGIC))
+                (length,) = struct.unpack('>I', delta.read(4))
+                delta.seek(length, os.SEEK_CUR)
+                for _ in range(header['pages']):
+                    page_no, size = struct.unpack('>II', delta.read(8))
+                    out.seek(page_no * page_size)
+                    out.write(zlib.decompress(delta.read(size)))
+                out.truncate(header['page_count'] * page_size)
+
+            if self._content_id(self.page_hashes(work_path, page_size)) != header['new_id']:
+                raise ValueError(f"{Path(delta_path).name} produced a mismatching database")
+
+            src = sqlite3.connect(work_path)
+            dst = sqlite3.connect(target_path, timeout=30)
+            try:
+                src.backup(dst, pages=-1)
+            finally:
+                dst.close()
+                src.close()
+            os.replace(work_path, base_path)
+        except Exception:
+            if os.path.exists(work_path):
+                os.remove(work_path)
+            raise
+
+        self._write_json(state_path, {'id': header['new_id'], 'seq': header['seq']})
+        return header
+
+    def apply_pending(self, target_path, db_name=None):
+        """Apply, in order, every delta in the shared folder newer than the replica."""
+        target_path = Path(target_path)
+        name = db_name or target_path.name
+        state = self._load_json(target_path.with_name(target_path.name + '.delta.json')) or {}
+        applied = []
+        deltas = sorted(self.shared_dir.glob(f"{name}.*.delta"), key=self._delta_seq)
+
+        # A replica with no usable base starts from the newest full delta
+        if not state.get('id') or not target_path.exists():
+            full = [p for p in deltas if self.read_header(p)['base_id'] is None]
+            if not full:
+                return applied
+            deltas = [p for p in deltas if self._delta_seq(p) >= self._delta_seq(full[-1])]
+
+        for delta_path in deltas:
+            if self._delta_seq(delta_path) <= state.get('seq', 0) and state.get('id'):
+                continue
+            state = {'id': self.apply_delta(delta_path, target_path)['new_id'],
+                     'seq': self._delta_seq(delta_path)}
+            applied.append(delta_path)
+        return applied
+
+    def prune(self, db_name, keep_after_seq):
+        """Remove deltas every subscriber has applied, keeping the latest full one."""
+        deltas = sorted(self.shared_dir.glob(f"{db_name}.*.delta"), key=self._delta_seq)
+        full_seqs = [self._delta_seq(p) for p in deltas if self.read_header(p)['base_id'] is None]
+        floor = min(keep_after_seq, max(full_seqs, default=0) - 1)
+        removed = 0
+        for delta_path in deltas:
+            if self._delta_seq(delta_path) <= floor:
+                delta_path.unlink()
+                removed += 1
+        return removed
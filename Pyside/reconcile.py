@@ -0,0 +1,303 @@
+import hashlib
+import sqlite3
+
+
+def _digest(values):
+    return int.from_bytes(hashlib.blake2b(repr(values).encode(), digest_size=16).digest(), 'big')
+
+
+def _node_hash(left, right):
+    return _digest((left, right))
+
+
+class MerkleReconciler:
+    """Reconcile two diverged copies of a SQLite database with range-hash trees.
+
+    For every table both sides hash their rows into the same set of leaves
+    (primary-key ranges for integer keys, key-hash buckets otherwise) and
+    fold the leaves into a Merkle tree. Only subtrees whose hashes differ
+    are descended into, and only rows inside mismatching leaves are read
+    back, compared and copied. Legacy _sync_* columns are ignored.
+    """
+
+    def __init__(self, primary_path, secondary_path, leaf_size=256):
+        self.primary_path = primary_path
+        self.secondary_path = secondary_path
+        self.leaf_size = leaf_size
+
+    def _connect(self):
+        conn = sqlite3.connect(self.primary_path, timeout=30)
+        conn.isolation_level = None
+        conn.execute("ATTACH DATABASE ? AS peer", (self.secondary_path,))
+        return conn
+
+    @staticmethod
+    def _tables(conn, schema):
+        rows = conn.execute(f'''
+            SELECT name, sql FROM {schema}.sqlite_master
+            WHERE type='table'
+            AND name NOT LIKE 'sqlite_%'
+            AND name NOT LIKE '\\_sync\\_%' ESCAPE '\\'
+            AND name != '_changes'
+        ''').fetchall()
+        return dict(rows)
+
+    @staticmethod
+    def _table_info(conn, schema, table):
+        return conn.execute(f'PRAGMA {schema}.table_info("{table}")').fetchall()
+
+    def _table_layout(self, conn, table):
+        """Return (columns, key_columns, integer_key) for a table present on both sides."""
+        primary_info = self._table_info(conn, 'main', table)
+        peer_columns = {col[1] for col in self._table_info(conn, 'peer', table)}
+        columns = [col[1] for col in primary_info
+                   if col[1] in peer_columns and not col[1].startswith('_sync_')]
+        pk = [col for col in sorted(primary_info, key=lambda c: c[5]) if col[5] > 0]
+        if not pk:
+            return columns, ['rowid'], True
+        if len(pk) == 1 and pk[0][2].upper() == 'INTEGER':
+            return columns, [pk[0][1]], True
+        return columns, [col[1] for col in pk], False
+
+    @staticmethod
+    def _quote(name):
+        return name if name == 'rowid' else f'"{name}"'
+
+    def _select(self, schema, table, columns, keys, where=''):
+        key_sql = ', '.join(self._quote(k) for k in keys)
+        col_sql = ', '.join(self._quote(c) for c in columns)
+        return f'SELECT {key_sql}, {col_sql} FROM {schema}."{table}" {where}'
+
+    def _leaf_plan(self, conn, table, keys, integer_key):
+        counts = [conn.execute(f'SELECT COUNT(*) FROM {s}."{table}"').fetchone()[0] for s in ('main', 'peer')]
+        target_leaves = max(1, max(counts) // self.leaf_size)
+        n_leaves = 1
+        while n_leaves < target_leaves:
+            n_leaves *= 2
+
+        if not integer_key:
+            return {'n_leaves': n_leaves, 'lo': None, 'width': None}
+
+        key = self._quote(keys[0])
+        bounds = [conn.execute(f'SELECT MIN({key}), MAX({key}) FROM {s}."{table}"').fetchone()
+                  for s in ('main', 'peer')]
+        lows = [b[0] for b in bounds if b[0] is not None]
+        highs = [b[1] for b in bounds if b[1] is not None]
+        lo = min(lows) if lows else 0
+        hi = max(highs) if highs else 0
+        width = max(1, -(-(hi - lo + 1) // n_leaves))
+        return {'n_leaves': n_leaves, 'lo': lo, 'width': width}
+
+    @staticmethod
+    def _bucket(key, plan):
+        if plan['width'] is not None:
+            return (key[0] - plan['lo']) // plan['width']
+        return _digest(key) % plan['n_leaves']
+
+    def _leaves(self, conn, schema, table, columns, keys, plan):
+        leaves = [0] * plan['n_leaves']
+        if plan['width'] is not None:
+            # Each key range is serialised by SQLite with a rowid range scan,
+            # so Python only hashes one string per leaf
+            key = self._quote(keys[0])
+            row_text = " || char(31) || ".join(f'quote({self._quote(c)})' for c in [keys[0]] + columns)
+            sql = f'''
+                SELECT group_concat({row_text}, char(30)) FROM {schema}."{table}"
+                WHERE {key} BETWEEN ? AND ?
+            '''
+            for bucket in range(plan['n_leaves']):
+                start = plan['lo'] + bucket * plan['width']
+                text = conn.execute(sql, (start, start + plan['width'] - 1)).fetchone()[0]
+                if text is not None:
+                    leaves[bucket] = _digest(text)
+            return leaves
+
+        n_keys = len(keys)
+        for row in conn.execute(self._select(schema, table, columns, keys)):
+            key = row[:n_keys]
+            leaves[self._bucket(key, plan)] ^= _digest(row)
+        return leaves
+
+    @staticmethod
+    def _build_tree(leaves):
+        levels = [leaves]
+        while len(levels[-1]) > 1:
+            level = levels[-1]
+            levels.append([_node_hash(level[i], level[i + 1]) for i in range(0, len(level), 2)])
+        return levels
+
+    @staticmethod
+    def _mismatched_leaves(tree_a, tree_b):
+        """Walk both trees from the root, descending only where hashes differ."""
+        top = len(tree_a) - 1
+        frontier = [0] if tree_a[top][0] != tree_b[top][0] else []
+        nodes_compared = 1
+        for depth in range(top, 0, -1):
+            below = depth - 1
+            next_frontier = []
+            for index in frontier:
+                for child in (2 * index, 2 * index + 1):
+                    nodes_compared += 1
+                    if tree_a[below][child] != tree_b[below][child]:
+                        next_frontier.append(child)
+            frontier = next_frontier
+        return frontier, nodes_compared
+
+    def _bucket_rows(self, conn, schema, table, columns, keys, plan, buckets):
+        n_keys = len(keys)
+        rows = {}
+        if plan['width'] is not None:
+            key = self._quote(keys[0])
+            sql = self._select(schema, table, columns, keys, f'WHERE {key} BETWEEN ? AND ?')
+            for bucket in buckets:
+                start = plan['lo'] + bucket * plan['width']
+                for row in conn.execute(sql, (start, start + plan['width'] - 1)):
+                    rows[row[:n_keys]] = row[n_keys:]
+        else:
+            wanted = set(buckets)
+            for row in conn.execute(self._select(schema, table, columns, keys)):
+                key = row[:n_keys]
+                if self._bucket(key, plan) in wanted:
+                    rows[key] = row[n_keys:]
+        return rows
+
+    def diff_table(self, conn, table):
+        columns, keys, integer_key = self._table_layout(conn, table)
+        plan = self._leaf_plan(conn, table, keys, integer_key)
+        tree_a = self._build_tree(self._leaves(conn, 'main', table, columns, keys, plan))
+        tree_b = self._build_tree(self._leaves(conn, 'peer', table, columns, keys, plan))
+        buckets, nodes_compared = self._mismatched_leaves(tree_a, tree_b)
+
+        primary_rows = self._bucket_rows(conn, 'main', table, columns, keys, plan, buckets)
+        secondary_rows = self._bucket_rows(conn, 'peer', table, columns, keys, plan, buckets)
+        only_primary = [k for k in primary_rows if k not in secondary_rows]
+        only_secondary = [k for k in secondary_rows if k not in primary_rows]
+        differing = [k for k in primary_rows
+                     if k in secondary_rows and primary_rows[k] != secondary_rows[k]]
+        return {
+            'table': table,
+            'columns': columns,
+            'keys': keys,
+            'leaves': plan['n_leaves'],
+            'nodes_compared': nodes_compared,
+            'mismatched_leaves': len(buckets),
+            'only_primary': only_primary,
+            'only_secondary': only_secondary,
+            'differing': differing,
+            'primary_rows': primary_rows,
+            'secondary_rows': secondary_rows,
+        }
+
+    def _write_rows(self, conn, schema, table, columns, keys, rows):
+        names = list(columns)
+        if keys == ['rowid']:
+            names.insert(0, 'rowid')
+        quoted = ', '.join(self._quote(n) for n in names)
+        sql = (f'INSERT OR REPLACE INTO {schema}."{table}" ({quoted}) '
+               f'VALUES ({", ".join("?" * len(names))})')
+        conn.executemany(sql, [
+            (key + values) if keys == ['rowid'] else values for key, values in rows
+        ])
+
+    def _delete_rows(self, conn, schema, table, keys, row_keys):
+        where = ' AND '.join(f'{self._quote(k)} IS ?' for k in keys)
+        conn.executemany(f'DELETE FROM {schema}."{table}" WHERE {where}', row_keys)
+
+    def reconcile(self, dry_run=True, prefer='primary', mirror=False, progress=None,
+                  should_stop=None):
+        """Compare every table and, unless dry_run, copy only the differing rows.
+
+        Rows present on one side only are copied to the other side; with
+        mirror=True they are instead deleted from the non-preferred side.
+        Rows present on both sides with different values take the version
+        from the preferred side ('primary' or 'secondary').
+        Returns a list of per-table report dicts. progress(report) is called
+        after each table; should_stop is checked between tables, and each
+        table's changes are applied in one transaction.
+        """
+        conn = self._connect()
+        reports = []
+        try:
+            primary_tables = self._tables(conn, 'main')
+            secondary_tables = self._tables(conn, 'peer')
+
+            if not dry_run:
+                # Tables that exist on one side only are created on the other first
+                conn.execute("BEGIN IMMEDIATE")
+                for table, sql in primary_tables.items():
+                    if table not in secondary_tables:
+                        conn.execute(sql.replace('CREATE TABLE ', 'CREATE TABLE peer.', 1))
+                for table, sql in secondary_tables.items():
+                    if table not in primary_tables:
+                        conn.execute(sql.replace('CREATE TABLE ', 'CREATE TABLE main.', 1))
+                conn.execute("COMMIT")
+                tables = sorted(set(primary_tables) | set(secondary_tables))
+            else:
+                tables = sorted(set(primary_tables) & set(secondary_tables))
+                for table in sorted(set(primary_tables) ^ set(secondary_tables)):
+                    side = 'primary' if table in primary_tables else 'secondary'
+                    reports.append({'table': table, 'missing_on': 'secondary' if side == 'primary' else 'primary'})
+
+            for table in tables:
+                if should_stop and should_stop():
+                    break
+                diff = self.diff_table(conn, table)
+                if not dry_run and (diff['only_primary'] or diff['only_secondary'] or diff['differing']):
+                    self._apply(conn, diff, prefer, mirror)
+                reports.append({
+                    'table': table,
+                    'leaves': diff['leaves'],
+                    'nodes_compared': diff['nodes_compared'],
+                    'mismatched_leaves': diff['mismatched_leaves'],
+                    'only_primary': len(diff['only_primary']),
+                    'only_secondary': len(diff['only_secondary']),
+                    'differing': len(diff['differing']),
+                    'rows_read': len(diff['primary_rows']) + len(diff['secondary_rows']),
+                })
+                if progress:
+                    progress(reports[-1])
+        finally:
+            conn.close()
+        return reports
+
+    def _apply(self, conn, diff, prefer, mirror):
+        table, columns, keys = diff['table'], diff['columns'], diff['keys']
+        primary_rows, secondary_rows = diff['primary_rows'], diff['secondary_rows']
+        if prefer == 'primary':
+            winner_rows, target = primary_rows, 'peer'
+            to_target, to_winner = diff['only_primary'], diff['only_secondary']
+            winner = 'main'
+        else:
+            winner_rows, target = secondary_rows, 'main'
+            to_target, to_winner = diff['only_secondary'], diff['only_primary']
+            winner = 'peer'
+        loser_rows = secondary_rows if prefer == 'primary' else primary_rows
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._write_rows(conn, target, table, columns, keys,
+                             [(k, winner_rows[k]) for k in to_target + diff['differing']])
+            if mirror:
+                self._delete_rows(conn, target, table, keys, to_winner)
+            else:
+                self._write_rows(conn, winner, table, columns, keys,
+                                 [(k, loser_rows[k]) for k in to_winner])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def format_report(reports):
+        lines = []
+        for report in reports:
+            if 'missing_on' in report:
+                lines.append(f"{report['table']}: table missing on {report['missing_on']}")
+                continue
+            lines.append(
+                f"{report['table']}: {report['only_primary']} only in primary, "
+                f"{report['only_secondary']} only in secondary, {report['differing']} differing "
+                f"({report['mismatched_leaves']}/{report['leaves']} leaves, "
+                f"{report['nodes_compared']} nodes compared)"
+            )
+        return '\n'.join(lines)
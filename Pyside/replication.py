@@ -0,0 +1,542 @@
+import json
+import sqlite3
+import uuid
+
+
+class ChangeLogReplicator:
+    """Trigger-based change log for replicating SQLite databases.
+
+    AFTER INSERT/UPDATE/DELETE triggers on every user table append to
+    _changes(seq, table, pk, op, row). Each replica keeps a high-watermark
+    per peer in _sync_peers, so a pull only reads changes with a larger seq.
+    Applied changes are logged with their origin replica and never sent
+    back to it, so rows no longer ping-pong between replicas.
+
+    Two replicas can insert different rows under the same key before they
+    see each other. The insert from the replica with the smaller
+    replica_id keeps the key everywhere. Under an integer key the replica
+    that wrote the other row moves it to a fresh key and logs that as a new
+    insert, so both rows survive and the replicas converge. Until it does, its earlier changes
+    to the old key are ignored (see _sync_collisions). Rows that clash on
+    another UNIQUE column follow the same rule, but only the winner is kept.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.isolation_level = None
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    @staticmethod
+    def user_tables(conn):
+        rows = conn.execute('''
+            SELECT name FROM main.sqlite_master
+            WHERE type='table'
+            AND name NOT LIKE 'sqlite_%'
+            AND name NOT LIKE '\\_sync\\_%' ESCAPE '\\'
+            AND name != '_changes'
+        ''').fetchall()
+        return [name for (name,) in rows]
+
+    @staticmethod
+    def table_columns(conn, table):
+        """Return (columns, pk_columns), leaving out legacy _sync_* columns."""
+        info = conn.execute(f'PRAGMA main.table_info("{table}")').fetchall()
+        columns = [col[1] for col in info if not col[1].startswith('_sync_')]
+        pk = [col[1] for col in sorted(info, key=lambda c: c[5]) if col[5] > 0]
+        return columns, pk
+
+    @staticmethod
+    def _row_json(columns, prefix):
+        # json_object can't hold BLOBs, so every value is stored as [type, value]
+        parts = []
+        for col in columns:
+            ref = f'{prefix}."{col}"'
+            parts.append(
+                f"'{col}', json_array(typeof({ref}), "
+                f"CASE WHEN typeof({ref}) = 'blob' THEN hex({ref}) ELSE {ref} END)"
+            )
+        return f"json_object({', '.join(parts)})"
+
+    @staticmethod
+    def _pk_json(pk, prefix):
+        if not pk:
+            return f"json_array({prefix}.rowid)"
+        return "json_array(" + ', '.join(f'{prefix}."{k}"' for k in pk) + ")"
+
+    def install(self, conn=None, seed=True):
+        """Create the log tables and the triggers for every user table.
+
+        Safe to run on every pull: triggers are only recreated when the
+        table's columns changed. Tables seen for the first time are seeded
+        with one 'I' change per existing row so a fresh peer receives the
+        current contents.
+        """
+        own_conn = conn is None
+        conn = conn or self.connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    "table" TEXT NOT NULL,
+                    pk TEXT NOT NULL,
+                    op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+                    row TEXT,
+                    origin TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._sync_state (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    replica_id TEXT NOT NULL,
+                    applying_origin TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._sync_peers (
+                    peer_id TEXT PRIMARY KEY,
+                    last_seq INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._sync_tables (
+                    name TEXT PRIMARY KEY
+                )
+            ''')
+            # How far each peer has pulled from this replica; prune() keeps what the slowest one lacks
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._sync_acks (
+                    peer_id TEXT PRIMARY KEY,
+                    acked_seq INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            # Highest seq prune() dropped; a peer whose watermark is below it missed history
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._sync_pruned (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    upto_seq INTEGER NOT NULL
+                )
+            ''')
+            # Keys where a peer's insert lost a collision; that peer's older changes to the key are stale
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main._sync_collisions (
+                    "table" TEXT NOT NULL,
+                    pk TEXT NOT NULL,
+                    loser TEXT NOT NULL,
+                    winner TEXT NOT NULL,
+                    PRIMARY KEY ("table", pk, loser)
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS main._sync_changes_row ON _changes ("table", pk, op)
+            ''')
+            conn.execute(
+                "INSERT OR IGNORE INTO main._sync_state (id, replica_id) VALUES (1, ?)",
+                (uuid.uuid4().hex,)
+            )
+            # A crash mid-apply must not leave local writes tagged as remote
+            conn.execute("UPDATE main._sync_state SET applying_origin = NULL WHERE applying_origin IS NOT NULL")
+
+            tracked = {name for (name,) in conn.execute("SELECT name FROM main._sync_tables")}
+            for table in self.user_tables(conn):
+                self._create_triggers(conn, table)
+                if table not in tracked:
+                    conn.execute("INSERT INTO main._sync_tables (name) VALUES (?)", (table,))
+                    if seed:
+                        self._seed_table(conn, table)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            if own_conn:
+                conn.close()
+
+    def _create_triggers(self, conn, table):
+        columns, pk = self.table_columns(conn, table)
+        origin = "(SELECT applying_origin FROM _sync_state WHERE id = 1)"
+        existing = dict(conn.execute(
+            "SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger' AND tbl_name = ?", (table,)
+        ).fetchall())
+        for op, event, ref, row in (
+            ('I', 'INSERT', 'NEW', self._row_json(columns, 'NEW')),
+            ('U', 'UPDATE', 'NEW', self._row_json(columns, 'NEW')),
+            ('D', 'DELETE', 'OLD', 'NULL'),
+        ):
+            name = f"_sync_{table}_{event.lower()}"
+            sql = (f'CREATE TRIGGER "{name}" AFTER {event} ON "{table}" '
+                   f'BEGIN INSERT INTO _changes ("table", pk, op, row, origin) '
+                   f"VALUES ('{table}', {self._pk_json(pk, ref)}, '{op}', {row}, {origin}); END")
+            if existing.get(name) == sql:
+                continue
+            # Only a schema change gets here; the trigger then has to follow the new columns
+            conn.execute(f'DROP TRIGGER IF EXISTS main."{name}"')
+            conn.execute(sql)
+
+    def _seed_table(self, conn, table):
+        columns, pk = self.table_columns(conn, table)
+        conn.execute(f'''
+            INSERT INTO main._changes ("table", pk, op, row, origin)
+            SELECT '{table}', {self._pk_json(pk, 't')}, 'I', {self._row_json(columns, 't')}, NULL
+            FROM main."{table}" AS t
+        ''')
+
+    @staticmethod
+    def replica_id(conn, schema='main'):
+        return conn.execute(f"SELECT replica_id FROM {schema}._sync_state WHERE id = 1").fetchone()[0]
+
+    @staticmethod
+    def decode_row(row_json):
+        row = {}
+        for col, (kind, value) in json.loads(row_json).items():
+            row[col] = bytes.fromhex(value) if kind == 'blob' else value
+        return row
+
+    @staticmethod
+    def _integer_key(conn, table):
+        """The column that aliases rowid ('rowid' without a primary key), or None for other keys."""
+        info = conn.execute(f'PRAGMA main.table_info("{table}")').fetchall()
+        pk = [col for col in info if col[5] > 0]
+        if not pk:
+            return 'rowid'
+        if len(pk) == 1 and pk[0][2].upper() == 'INTEGER':
+            return pk[0][1]
+        return None
+
+    @staticmethod
+    def _insert_origin(conn, table, pk_json, local_id):
+        row = conn.execute('''
+            SELECT origin FROM main._changes WHERE "table" = ? AND pk = ? AND op = 'I'
+            ORDER BY seq DESC LIMIT 1
+        ''', (table, pk_json)).fetchone()
+        # Rows without a logged insert (pruned or never synced) count as local
+        return row[0] if row and row[0] else local_id
+
+    def _rekey_local_row(self, conn, table, key, key_value, columns, origin):
+        """Move a local row to a fresh key, logged as a new local insert."""
+        names = [col for col in columns if col != key]
+        quoted = ', '.join(f'"{n}"' for n in names)
+        where = 'rowid = ?' if key == 'rowid' else f'"{key}" = ?'
+        values = conn.execute(f'SELECT {quoted} FROM main."{table}" WHERE {where}', (key_value,)).fetchone()
+        conn.execute("UPDATE main._sync_state SET applying_origin = NULL WHERE id = 1")
+        conn.execute(f'DELETE FROM main."{table}" WHERE {where}', (key_value,))
+        # The old key now belongs to the winning row, so peers must not see this as a delete
+        conn.execute("DELETE FROM main._changes WHERE seq = (SELECT MAX(seq) FROM main._changes)")
+        conn.execute(f'INSERT INTO main."{table}" ({quoted}) VALUES ({", ".join("?" * len(names))})', values)
+        conn.execute("UPDATE main._sync_state SET applying_origin = ? WHERE id = 1", (origin,))
+
+    def _resolve_collision(self, conn, table, pk_json, row, columns, pk, integer_key, origin, local_id):
+        """Decide an incoming insert whose key already holds a different row.
+
+        The insert from the smaller replica_id wins. Returns False when the
+        incoming row loses. A losing local row under an integer key is moved
+        to a fresh key; under any other key the key names the same record,
+        so the winner simply replaces it.
+        """
+        names = [col for col in columns if col in row]
+        where = self._key_where(pk)
+        existing = conn.execute(
+            f'SELECT {", ".join(chr(34) + n + chr(34) for n in names)} FROM main."{table}" WHERE {where}',
+            json.loads(pk_json)
+        ).fetchone()
+        if existing is None or list(existing) == [row[n] for n in names]:
+            return True
+        holder = self._insert_origin(conn, table, pk_json, local_id)
+        if holder == origin:
+            return True  # the same replica re-inserted its own key
+        if origin > holder:
+            conn.execute('''
+                INSERT OR REPLACE INTO main._sync_collisions ("table", pk, loser, winner) VALUES (?, ?, ?, ?)
+            ''', (table, pk_json, origin, holder))
+            return False
+        if holder != local_id:
+            conn.execute('''
+                INSERT OR REPLACE INTO main._sync_collisions ("table", pk, loser, winner) VALUES (?, ?, ?, ?)
+            ''', (table, pk_json, holder, origin))
+        elif integer_key:
+            self._rekey_local_row(conn, table, integer_key, json.loads(pk_json)[0], columns, origin)
+        return True
+
+    def apply_change(self, conn, table, pk_json, op, row_json, columns_cache, origin=None, local_id=None):
+        if table not in columns_cache:
+            columns_cache[table] = self.table_columns(conn, table) + (self._integer_key(conn, table),)
+        columns, pk, integer_key = columns_cache[table]
+        if not columns:
+            return False
+
+        if origin and conn.execute(
+            'SELECT 1 FROM main._sync_collisions WHERE "table" = ? AND pk = ? AND loser = ?',
+            (table, pk_json, origin)
+        ).fetchone():
+            return False  # written before that replica moved its row off this key
+
+        if op == 'D':
+            conn.execute(f'DELETE FROM main."{table}" WHERE {self._key_where(pk)}', json.loads(pk_json))
+            return True
+
+        row = self.decode_row(row_json)
+        if op == 'I' and origin and not self._resolve_collision(
+                conn, table, pk_json, row, columns, pk, integer_key, origin, local_id):
+            return False
+        names = [col for col in columns if col in row]
+        values = [row[col] for col in names]
+        if not pk:
+            names.insert(0, 'rowid')
+            values.insert(0, json.loads(pk_json)[0])
+        quoted = ', '.join(f'"{n}"' if n != 'rowid' else n for n in names)
+        key_values = json.loads(pk_json)
+        where = self._key_where(pk)
+        # Never INSERT OR REPLACE: a clash on another UNIQUE column would make it
+        # delete the local row without firing a trigger, so no peer would ever hear of it
+        for _ in range(len(columns) + 1):
+            try:
+                if conn.execute(f'SELECT 1 FROM main."{table}" WHERE {where}', key_values).fetchone():
+                    settings = [(n, v) for n, v in zip(names, values) if n != 'rowid']
+                    if settings:
+                        assignments = ', '.join(f'"{n}" = ?' for n, _ in settings)
+                        conn.execute(
+                            f'UPDATE main."{table}" SET {assignments} WHERE {where}',
+                            [v for _, v in settings] + key_values
+                        )
+                else:
+                    conn.execute(
+                        f'INSERT INTO main."{table}" ({quoted}) VALUES ({", ".join("?" * len(names))})',
+                        values
+                    )
+                return True
+            except sqlite3.IntegrityError:
+                other = self._unique_clash(conn, table, pk, row, key_values)
+                if other is None:
+                    raise
+                if not self._wins(conn, table, other, origin, local_id):
+                    return False
+                # Deleted through the trigger, so the delete reaches every replica
+                conn.execute(f'DELETE FROM main."{table}" WHERE {where}', json.loads(other))
+        raise sqlite3.IntegrityError(f'{table} {pk_json}: unresolved UNIQUE conflict')
+
+    @staticmethod
+    def _key_where(pk, prefix=''):
+        return ' AND '.join(f'{prefix}"{k}" IS ?' for k in pk) if pk else f'{prefix}rowid = ?'
+
+    def _unique_clash(self, conn, table, pk, row, key_values):
+        """pk json of another local row sharing a UNIQUE value with row, or None."""
+        for index in conn.execute(f'PRAGMA main.index_list("{table}")').fetchall():
+            if not index[2] or index[3] == 'pk':
+                continue
+            columns = [info[2] for info in conn.execute(f'PRAGMA main.index_info("{index[1]}")')]
+            # Expression indexes can't be matched here, and NULLs never clash
+            if None in columns or any(row.get(col) is None for col in columns):
+                continue
+            match = ' AND '.join(f't."{col}" = ?' for col in columns)
+            other = conn.execute(
+                f'SELECT {self._pk_json(pk, "t")} FROM main."{table}" AS t '
+                f'WHERE {match} AND NOT ({self._key_where(pk, "t.")})',
+                [row[col] for col in columns] + key_values
+            ).fetchone()
+            if other:
+                return other[0]
+        return None
+
+    def _wins(self, conn, table, other_pk_json, origin, local_id):
+        """Whether an incoming row beats the local row it clashes with on a UNIQUE column.
+
+        Same rule as for keys: the insert from the smaller replica_id wins.
+        The losing replica deletes its own row once it pulls the winner, so
+        every replica ends up with the winning row only.
+        """
+        holder = self._insert_origin(conn, table, other_pk_json, local_id)
+        return origin is None or origin <= holder
+
+    @staticmethod
+    def create_missing_tables(conn, schema='src'):
+        """Copy table and index definitions that exist only on the attached peer."""
+        local = {name for (name,) in conn.execute("SELECT name FROM main.sqlite_master")}
+        definitions = conn.execute(f'''
+            SELECT name, sql FROM {schema}.sqlite_master
+            WHERE type IN ('table', 'index') AND sql IS NOT NULL
+            AND name NOT LIKE 'sqlite_%'
+            AND name NOT LIKE '\\_sync\\_%' ESCAPE '\\'
+            AND name != '_changes'
+            ORDER BY type DESC
+        ''').fetchall()
+        for name, sql in definitions:
+            if name not in local:
+                conn.execute(sql)
+
+    def pull(self, source_path, batch_size=5000, progress=None, should_stop=None):
+        """Apply the source replica's new changes to this database.
+
+        Returns the number of changes applied. Work is proportional to the
+        number of changes since the last pull, not to table sizes.
+        progress, if given, is called after every batch with per-table
+        {'scanned', 'copied', 'bytes'} totals. should_stop is checked between
+        batches; every batch commits together with the watermark, so a
+        stopped pull leaves a consistent prefix that the next run resumes.
+        """
+        ChangeLogReplicator(source_path).install()
+
+        conn = self.connect()
+        applied = 0
+        stats = {}
+        try:
+            conn.execute("ATTACH DATABASE ? AS src", (source_path,))
+            self.create_missing_tables(conn)
+            self.install(conn)
+            local_id = self.replica_id(conn)
+            peer_id = self.replica_id(conn, 'src')
+            row = conn.execute("SELECT last_seq FROM main._sync_peers WHERE peer_id = ?", (peer_id,)).fetchone()
+            last_seq = row[0] if row else 0
+            columns_cache = {}
+            pruned = conn.execute("SELECT upto_seq FROM src._sync_pruned WHERE id = 1").fetchone()
+            if pruned and last_seq < pruned[0]:
+                # The changes we lack are gone from the peer's log; take its tables instead
+                last_seq, reconciled = self._reconcile(conn, peer_id, local_id, columns_cache, stats)
+                applied += reconciled
+                if progress:
+                    progress({table: dict(values) for table, values in stats.items()})
+
+            while not (should_stop and should_stop()):
+                changes = conn.execute('''
+                    SELECT seq, "table", pk, op, row, origin FROM src._changes
+                    WHERE seq > ? ORDER BY seq LIMIT ?
+                ''', (last_seq, batch_size)).fetchall()
+                if not changes:
+                    break
+
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    current_origin = None
+                    for seq, table, pk_json, op, row_json, origin in changes:
+                        table_stats = stats.setdefault(table, {'scanned': 0, 'copied': 0, 'bytes': 0})
+                        table_stats['scanned'] += 1
+                        origin = origin or peer_id
+                        # Once the peer logs a collision's winning row, its later changes to the key are current
+                        conn.execute('''
+                            DELETE FROM main._sync_collisions WHERE "table" = ? AND pk = ? AND loser = ? AND winner = ?
+                        ''', (table, pk_json, peer_id, origin))
+                        if origin == local_id:
+                            continue  # our own change coming back
+                        if origin != current_origin:
+                            conn.execute("UPDATE main._sync_state SET applying_origin = ? WHERE id = 1", (origin,))
+                            current_origin = origin
+                        if self.apply_change(conn, table, pk_json, op, row_json, columns_cache,
+                                             origin, local_id):
+                            applied += 1
+                            table_stats['copied'] += 1
+                            table_stats['bytes'] += len(pk_json) + len(row_json or '')
+                    last_seq = changes[-1][0]
+                    conn.execute("UPDATE main._sync_state SET applying_origin = NULL WHERE id = 1")
+                    conn.execute('''
+                        INSERT INTO main._sync_peers (peer_id, last_seq) VALUES (?, ?)
+                        ON CONFLICT(peer_id) DO UPDATE SET last_seq = excluded.last_seq
+                    ''', (peer_id, last_seq))
+                    conn.execute('''
+                        INSERT INTO src._sync_acks (peer_id, acked_seq) VALUES (?, ?)
+                        ON CONFLICT(peer_id) DO UPDATE SET acked_seq = excluded.acked_seq
+                    ''', (local_id, last_seq))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                if progress:
+                    progress({table: dict(values) for table, values in stats.items()})
+        finally:
+            conn.close()
+        return applied
+
+    def _reconcile(self, conn, peer_id, local_id, columns_cache, stats):
+        """Apply every row of the attached peer as an insert from it.
+
+        Used when the peer pruned changes this replica never pulled. Rows go
+        through apply_change, so key and UNIQUE collisions resolve as usual.
+        Rows the peer deleted in the pruned history are not removed here.
+        Returns (seq to resume from, rows applied).
+        """
+        applied = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            upto_seq = conn.execute('''
+                SELECT MAX(seq) FROM (
+                    SELECT MAX(seq) AS seq FROM src._changes UNION ALL SELECT upto_seq FROM src._sync_pruned
+                )
+            ''').fetchone()[0]
+            conn.execute("UPDATE main._sync_state SET applying_origin = ? WHERE id = 1", (peer_id,))
+            tables = conn.execute('''
+                SELECT name FROM src._sync_tables WHERE name IN (SELECT name FROM main.sqlite_master WHERE type = 'table')
+            ''').fetchall()
+            for (table,) in tables:
+                _, pk = self.table_columns(conn, table)
+                shared = [col[1] for col in conn.execute(f'PRAGMA src.table_info("{table}")')
+                          if not col[1].startswith('_sync_')]
+                rows = conn.execute(
+                    f'SELECT {self._pk_json(pk, "t")}, {self._row_json(shared, "t")} FROM src."{table}" AS t'
+                ).fetchall()
+                table_stats = stats.setdefault(table, {'scanned': 0, 'copied': 0, 'bytes': 0})
+                for pk_json, row_json in rows:
+                    table_stats['scanned'] += 1
+                    if self.apply_change(conn, table, pk_json, 'I', row_json, columns_cache, peer_id, local_id):
+                        applied += 1
+                        table_stats['copied'] += 1
+                        table_stats['bytes'] += len(pk_json) + len(row_json)
+            conn.execute("UPDATE main._sync_state SET applying_origin = NULL WHERE id = 1")
+            conn.execute('''
+                INSERT INTO main._sync_peers (peer_id, last_seq) VALUES (?, ?)
+                ON CONFLICT(peer_id) DO UPDATE SET last_seq = excluded.last_seq
+            ''', (peer_id, upto_seq))
+            conn.execute('''
+                INSERT INTO src._sync_acks (peer_id, acked_seq) VALUES (?, ?)
+                ON CONFLICT(peer_id) DO UPDATE SET acked_seq = excluded.acked_seq
+            ''', (local_id, upto_seq))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return upto_seq, applied
+
+    def sync_with(self, peer_path, progress=None, should_stop=None):
+        """Two-way sync: pull the peer's changes here, then push ours to the peer.
+
+        progress is called as progress(direction, stats) with direction
+        'pull' or 'push' and the per-table totals from pull(). A second
+        pull picks up rows the peer moved to a new key while applying our
+        changes. Afterwards both logs are pruned.
+        """
+        pull_progress = (lambda stats: progress('pull', stats)) if progress else None
+        pulled = self.pull(peer_path, progress=pull_progress, should_stop=should_stop)
+        pushed = ChangeLogReplicator(peer_path).pull(
+            self.db_path,
+            progress=(lambda stats: progress('push', stats)) if progress else None,
+            should_stop=should_stop
+        )
+        pulled += self.pull(peer_path, progress=pull_progress, should_stop=should_stop)
+        if not (should_stop and should_stop()):
+            self.prune()
+            ChangeLogReplicator(peer_path).prune()
+        return pulled, pushed
+
+    def prune(self):
+        """Drop log entries every known peer has already pulled; returns how many went.
+
+        The pruned seq is recorded, so a peer that shows up later takes the
+        full tables (see _reconcile) instead of silently missing the history.
+        """
+        conn = self.connect()
+        try:
+            upto_seq = conn.execute("SELECT MIN(acked_seq) FROM _sync_acks").fetchone()[0]
+            if not upto_seq:
+                return 0
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute("DELETE FROM _changes WHERE seq <= ?", (upto_seq,))
+            conn.execute('''
+                INSERT INTO _sync_pruned (id, upto_seq) VALUES (1, ?)
+                ON CONFLICT(id) DO UPDATE SET upto_seq = MAX(upto_seq, excluded.upto_seq)
+            ''', (upto_seq,))
+            conn.execute("COMMIT")
+            return cursor.rowcount
+        finally:
+            conn.close()
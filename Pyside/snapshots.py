@@ -0,0 +1,144 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+
+class SnapshotManager:
+    """Compressed point-in-time snapshots of the app databases.
+
+    Snapshots are taken with the SQLite online backup API a few pages at a
+    time, so they work on live WAL databases while readers and writers stay
+    attached. Each snapshot is a directory holding one gzip'd copy per
+    database plus a manifest with checksums; only the newest `keep`
+    snapshots are retained. Restores go back through the backup API, so
+    open connections see the restored contents instead of a swapped file.
+    """
+
+    def __init__(self, snapshot_dir='db_snapshots', keep=10):
+        self.snapshot_dir = Path(snapshot_dir)
+        self.keep = keep
+
+    @staticmethod
+    def _copy(src, dst, pages=256, progress=None, sleep=0.005):
+        # Pinning a read transaction keeps the copy on one snapshot, so other
+        # writers can't force the stepped backup to restart. In WAL mode that
+        # read transaction blocks nobody.
+        src.execute("BEGIN")
+        try:
+            src.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+        finally:
+            src.rollback()
+
+    def take(self, db_paths, label='manual', progress=None, pages=256):
+        """Snapshot every existing file in db_paths and return the snapshot id.
+
+        progress, if given, is called as progress(db_name, remaining, total)
+        after every step of the backup.
+        """
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        snapshot_id = f"{stamp}_{label}"
+        target = self.snapshot_dir / snapshot_id
+        target.mkdir(parents=True)
+
+        manifest = {'id': snapshot_id, 'label': label, 'created': datetime.now().isoformat(),
+                    'databases': {}}
+        for db_path in db_paths:
+            if not os.path.exists(db_path):
+                continue
+            name = Path(db_path).name
+            fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=target)
+            os.close(fd)
+            try:
+                src = sqlite3.connect(db_path, timeout=30)
+                dst = sqlite3.connect(tmp_path)
+                try:
+                    step = (lambda status, remaining, total, name=name:
+                            progress(name, remaining, total)) if progress else None
+                    self._copy(src, dst, pages=pages, progress=step)
+                finally:
+                    dst.close()
+                    src.close()
+
+                digest = hashlib.sha256()
+                with open(tmp_path, 'rb') as raw, gzip.open(target / f"{name}.gz", 'wb', compresslevel=6) as out:
+                    for chunk in iter(lambda: raw.read(1 << 20), b''):
+                        digest.update(chunk)
+                        out.write(chunk)
+                manifest['databases'][name] = {
+                    'source': os.path.abspath(db_path),
+                    'size': os.path.getsize(tmp_path),
+                    'sha256': digest.hexdigest(),
+                }
+            finally:
+                os.remove(tmp_path)
+
+        with open(target / 'manifest.json', 'w') as f:
+            json.dump(manifest, f, indent=2)
+        self.prune()
+        return snapshot_id
+
+    def list_snapshots(self):
+        """Return manifests, newest first."""
+        manifests = []
+        if not self.snapshot_dir.exists():
+            return manifests
+        for path in self.snapshot_dir.glob('*/manifest.json'):
+            with open(path) as f:
+                manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: m['id'], reverse=True)
+
+    def prune(self, keep=None):
+        """Delete all but the newest `keep` snapshots; returns how many were removed."""
+        keep = self.keep if keep is None else keep
+        stale = self.list_snapshots()[keep:]
+        for manifest in stale:
+            shutil.rmtree(self.snapshot_dir / manifest['id'], ignore_errors=True)
+        return len(stale)
+
+    def restore(self, snapshot_id, target_dir=None, db_names=None, progress=None):
+        """Restore databases from a snapshot into their original (or target_dir) paths.
+
+        The snapshot is decompressed to a temp file, checked against its
+        checksum and copied into the live database with the backup API.
+        Returns the restored paths.
+        """
+        source_dir = self.snapshot_dir / snapshot_id
+        with open(source_dir / 'manifest.json') as f:
+            manifest = json.load(f)
+
+        restored = []
+        for name, info in manifest['databases'].items():
+            if db_names and name not in db_names:
+                continue
+            target_path = Path(target_dir) / name if target_dir else Path(info['source'])
+            fd, tmp_path = tempfile.mkstemp(suffix='.db', dir=target_path.parent)
+            digest = hashlib.sha256()
+            try:
+                with os.fdopen(fd, 'wb') as raw, gzip.open(source_dir / f"{name}.gz", 'rb') as packed:
+                    for chunk in iter(lambda: packed.read(1 << 20), b''):
+                        digest.update(chunk)
+                        raw.write(chunk)
+                if digest.hexdigest() != info['sha256']:
+                    raise ValueError(f"Snapshot {snapshot_id}/{name} is corrupt")
+
+                src = sqlite3.connect(tmp_path)
+                dst = sqlite3.connect(target_path, timeout=30)
+                try:
+                    step = (lambda status, remaining, total, name=name:
+                            progress(name, remaining, total)) if progress else None
+                    # One step: the target is rewritten in a single transaction
+                    self._copy(src, dst, pages=-1, progress=step)
+                finally:
+                    dst.close()
+                    src.close()
+            finally:
+                os.remove(tmp_path)
+            restored.append(target_path)
+        return restored
@@ -0,0 +1,314 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+
+class SurveyCycleManager:
+    """Survey cycles for attendance.db and feedback.db.
+
+    Every submission and feedback row carries the period it belongs to, so
+    "once per month" is a (period, username) key instead of a table wipe.
+    Opening a new cycle only rewrites the single-row current_cycle tables.
+    Closed cycles can be archived to gzip'd SQLite snapshots and purged in
+    small index-driven batches, so the shared files never need a VACUUM.
+    """
+
+    def __init__(self, attendance_db='attendance.db', feedback_db='feedback.db',
+                 archive_dir='cycle_archive'):
+        self.attendance_db = attendance_db
+        self.feedback_db = feedback_db
+        self.archive_dir = Path(archive_dir)
+
+    @staticmethod
+    def default_period(when=None):
+        return (when or datetime.now()).strftime('%Y-%m')
+
+    def next_period(self):
+        """The first month, from this one on, that has no cycle yet; the default label for a rollover."""
+        self.current_period()  # makes sure the cycle tables exist
+        existing = {period for period, _, _ in self.list_cycles()}
+        period = self.default_period()
+        while period in existing:
+            year, month = map(int, period.split('-'))
+            period = f"{year + month // 12}-{month % 12 + 1:02d}"
+        return period
+
+    def cycle_exists(self, period):
+        self.current_period()
+        return any(existing == period for existing, _, _ in self.list_cycles())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.attendance_db)
+        conn.isolation_level = None
+        conn.execute("ATTACH DATABASE ? AS fb", (self.feedback_db,))
+        return conn
+
+    @staticmethod
+    def _columns(conn, schema, table):
+        return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+    def _schema_current(self, conn):
+        """True when both databases already have every table, column, trigger and the cycle row."""
+        def names(schema, kind):
+            return {name for (name,) in conn.execute(
+                f"SELECT name FROM {schema}.sqlite_master WHERE type = ?", (kind,))}
+
+        main_tables, fb_tables = names('main', 'table'), names('fb', 'table')
+        if not {'survey_cycles', 'current_cycle', 'submissions'} <= main_tables or 'current_cycle' not in fb_tables:
+            return False
+        if 'period' not in self._columns(conn, 'main', 'submissions') \
+                or 'submissions_stamp_period' not in names('main', 'trigger'):
+            return False
+        if 'feedback_responses' in fb_tables and (
+                'period' not in self._columns(conn, 'fb', 'feedback_responses')
+                or 'idx_feedback_period_manager' not in names('fb', 'index')
+                or 'feedback_stamp_period' not in names('fb', 'trigger')):
+            return False
+        row = conn.execute('''
+            SELECT m.period FROM main.current_cycle m, fb.current_cycle f
+            WHERE m.id = 1 AND f.id = 1 AND m.period = f.period
+            AND m.period IN (SELECT period FROM main.survey_cycles)
+        ''').fetchone()
+        return row is not None
+
+    def ensure_schema(self):
+        """Create or migrate the cycle tables in both databases.
+
+        Every client calls this on start, so the common case is a read that
+        finds everything in place; the write lock on the shared files is
+        only taken when something is actually missing.
+        """
+        conn = self._connect()
+        try:
+            if self._schema_current(conn):
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS main.survey_cycles (
+                    period TEXT PRIMARY KEY,
+                    opened_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    archived_path TEXT
+                )
+            ''')
+            for schema in ('main', 'fb'):
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {schema}.current_cycle (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        period TEXT NOT NULL
+                    )
+                ''')
+
+            row = conn.execute("SELECT period FROM main.current_cycle").fetchone()
+            period = row[0] if row else self.default_period()
+            conn.execute("INSERT OR IGNORE INTO main.survey_cycles (period) VALUES (?)", (period,))
+            for schema in ('main', 'fb'):
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {schema}.current_cycle (id, period) VALUES (1, ?)",
+                    (period,)
+                )
+
+            self._migrate_submissions(conn, period)
+            self._migrate_feedback(conn, period)
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _migrate_submissions(self, conn, period):
+        columns = self._columns(conn, 'main', 'submissions')
+        if columns and 'period' not in columns:
+            # Old layout had username as the only key; keep its rows in the current cycle
+            conn.execute("ALTER TABLE main.submissions RENAME TO submissions_legacy")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS main.submissions (
+                period TEXT,
+                username TEXT NOT NULL,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (period, username)
+            )
+        ''')
+        if columns and 'period' not in columns:
+            conn.execute('''
+                INSERT INTO main.submissions (period, username, timestamp)
+                SELECT ?, username, timestamp FROM main.submissions_legacy
+            ''', (period,))
+            conn.execute("DROP TABLE main.submissions_legacy")
+        # Writers that don't know about cycles are stamped with the current one
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS main.submissions_stamp_period
+            AFTER INSERT ON submissions WHEN NEW.period IS NULL
+            BEGIN
+                UPDATE submissions SET period = (SELECT period FROM current_cycle)
+                WHERE rowid = NEW.rowid;
+            END
+        ''')
+
+    def _migrate_feedback(self, conn, period):
+        columns = self._columns(conn, 'fb', 'feedback_responses')
+        if not columns:
+            return
+        if 'period' not in columns:
+            conn.execute("ALTER TABLE fb.feedback_responses ADD COLUMN period TEXT")
+            conn.execute("UPDATE fb.feedback_responses SET period = ? WHERE period IS NULL", (period,))
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS fb.idx_feedback_period_manager
+            ON feedback_responses (period, manager)
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS fb.feedback_stamp_period
+            AFTER INSERT ON feedback_responses WHEN NEW.period IS NULL
+            BEGIN
+                UPDATE feedback_responses SET period = (SELECT period FROM current_cycle)
+                WHERE rowid = NEW.rowid;
+            END
+        ''')
+
+    def current_period(self):
+        conn = sqlite3.connect(self.attendance_db)
+        try:
+            row = conn.execute("SELECT period FROM current_cycle").fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        finally:
+            conn.close()
+        if row:
+            return row[0]
+        self.ensure_schema()
+        return self.current_period()
+
+    def list_cycles(self):
+        conn = sqlite3.connect(self.attendance_db)
+        try:
+            return conn.execute(
+                "SELECT period, opened_at, archived_path FROM survey_cycles ORDER BY period"
+            ).fetchall()
+        finally:
+            conn.close()
+
+    def open_cycle(self, period=None):
+        """Start a new cycle. Touches two single-row tables, whatever the data size."""
+        self.ensure_schema()
+        period = period or self.default_period()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM main.survey_cycles WHERE period = ?", (period,)).fetchone():
+                raise ValueError(f"Survey cycle {period} already exists")
+            conn.execute("INSERT INTO main.survey_cycles (period) VALUES (?)", (period,))
+            conn.execute("UPDATE main.current_cycle SET period = ? WHERE id = 1", (period,))
+            conn.execute("UPDATE fb.current_cycle SET period = ? WHERE id = 1", (period,))
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return period
+
+    def archive_cycle(self, period, purge=True, batch_size=5000):
+        """Write a closed cycle to a gzip'd SQLite snapshot and optionally purge it."""
+        if period == self.current_period():
+            raise ValueError("Cannot archive the cycle that is still open")
+
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        archive_path = self.archive_dir / f"cycle_{period}.db.gz"
+
+        fd, snapshot_path = tempfile.mkstemp(suffix='.db', dir=self.archive_dir)
+        os.close(fd)
+        try:
+            conn = self._connect()
+            try:
+                conn.execute("ATTACH DATABASE ? AS snap", (snapshot_path,))
+                conn.execute("BEGIN")
+                conn.execute('''
+                    CREATE TABLE snap.submissions AS
+                    SELECT * FROM main.submissions WHERE period = ?
+                ''', (period,))
+                if self._columns(conn, 'fb', 'feedback_responses'):
+                    conn.execute('''
+                        CREATE TABLE snap.feedback_responses AS
+                        SELECT * FROM fb.feedback_responses WHERE period = ?
+                    ''', (period,))
+                conn.execute("COMMIT")
+                conn.execute("DETACH DATABASE snap")
+            finally:
+                conn.close()
+
+            with open(snapshot_path, 'rb') as src, gzip.open(archive_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        finally:
+            os.remove(snapshot_path)
+
+        conn = sqlite3.connect(self.attendance_db)
+        conn.execute("UPDATE survey_cycles SET archived_path = ? WHERE period = ?",
+                     (str(archive_path), period))
+        conn.commit()
+        conn.close()
+
+        if purge:
+            self.purge_cycle(period, batch_size)
+        return archive_path
+
+    def purge_cycle(self, period, batch_size=5000):
+        """Delete one cycle's rows in short batches so readers are never blocked for long."""
+        for db_file, table in ((self.attendance_db, 'submissions'),
+                               (self.feedback_db, 'feedback_responses')):
+            conn = sqlite3.connect(db_file)
+            try:
+                if not self._columns(conn, 'main', table):
+                    continue
+                while True:
+                    cursor = conn.execute(f'''
+                        DELETE FROM {table} WHERE rowid IN (
+                            SELECT rowid FROM {table} WHERE period = ? LIMIT ?
+                        )
+                    ''', (period, batch_size))
+                    conn.commit()
+                    if cursor.rowcount < batch_size:
+                        break
+            finally:
+                conn.close()
+
+    def archive_closed_cycles(self):
+        """Archive every cycle other than the current one that has not been archived yet."""
+        current = self.current_period()
+        archived = []
+        for period, _, archived_path in self.list_cycles():
+            if period != current and not archived_path:
+                archived.append(self.archive_cycle(period))
+        return archived
+
+    @staticmethod
+    def open_archive(archive_path):
+        """Decompress an archived cycle into a temp file and return a read-only connection.
+
+        The temp file is deleted when the connection is closed.
+        """
+        fd, snapshot_path = tempfile.mkstemp(suffix='.db')
+        try:
+            with os.fdopen(fd, 'wb') as dst, gzip.open(archive_path, 'rb') as src:
+                shutil.copyfileobj(src, dst)
+            conn = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True, factory=_ArchiveConnection)
+        except Exception:
+            os.remove(snapshot_path)
+            raise
+        conn.snapshot_path = snapshot_path
+        return conn
+
+
+class _ArchiveConnection(sqlite3.Connection):
+    snapshot_path = None
+
+    def close(self):
+        super().close()
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+        self.snapshot_path = None
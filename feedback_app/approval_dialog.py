@@ -3,7 +3,7 @@ from PyQt5.QtWidgets import (
     QTableWidgetItem, QPushButton, QHBoxLayout, 
     QMessageBox, QHeaderView
 )
-from database import get_pending_approvals, approve_user, disapprove_user
+from database import get_pending_approvals, approve_users, disapprove_users
 
 class ApprovalDialog(QDialog):
     def __init__(self, current_user, is_superuser=False):
@@ -77,8 +77,7 @@ class ApprovalDialog(QDialog):
             QMessageBox.warning(self, 'Error', 'Please select at least one user')
             return
         
-        for user_id in selected:
-            approve_user(user_id)
+        approve_users(selected)
         
         QMessageBox.information(
             self, 'Success', 
@@ -100,8 +99,7 @@ class ApprovalDialog(QDialog):
         )
         
         if reply == QMessageBox.Yes:
-            for user_id in selected:
-                disapprove_user(user_id)
+            disapprove_users(selected)
             
             QMessageBox.information(
                 self, 'Success', 
@@ -188,6 +188,57 @@ def approve_user(user_id):
     temp_conn.close()
     final_conn.close()
 
+def approve_users(user_ids):
+    """ Approve several users at once, moving them to the final database in one transaction """
+    user_ids = [int(user_id) for user_id in user_ids]
+    if not user_ids:
+        return 0
+
+    conn = create_connection('temp_database.db')
+    conn.isolation_level = None
+    cursor = conn.cursor()
+    cursor.execute("ATTACH DATABASE 'final_database.db' AS final")
+    placeholders = ','.join('?' * len(user_ids))
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            f"INSERT INTO final.approved_users (username, password, manager) "
+            f"SELECT username, password, manager FROM main.pending_users "
+            f"WHERE id IN ({placeholders}) ORDER BY id",
+            user_ids
+        )
+        moved = cursor.rowcount
+        cursor.execute(
+            f"DELETE FROM main.pending_users WHERE id IN ({placeholders})",
+            user_ids
+        )
+        cursor.execute("COMMIT")
+    except Error:
+        cursor.execute("ROLLBACK")
+        raise
+    finally:
+        cursor.execute("DETACH DATABASE final")
+        conn.close()
+    return moved
+
+def disapprove_users(user_ids):
+    """ Remove several users from the temporary database in one transaction """
+    user_ids = [int(user_id) for user_id in user_ids]
+    if not user_ids:
+        return 0
+
+    conn = create_connection('temp_database.db')
+    cursor = conn.cursor()
+    placeholders = ','.join('?' * len(user_ids))
+    cursor.execute(
+        f"DELETE FROM pending_users WHERE id IN ({placeholders})",
+        user_ids
+    )
+    removed = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return removed
+
 def validate_login(username, password):
     """ Validate user credentials """
     conn = create_connection('final_database.db')